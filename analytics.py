@@ -0,0 +1,339 @@
+import os
+import sys
+import math
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from log_store import LOG_DIR, get_log_store
+
+# Analytics Configuration
+# Cohort rollups are updated as sessions are logged, so fleet benchmarks are
+# read from fixed-size aggregates instead of scanning the session logs
+ANALYTICS_ENABLED = os.getenv("ECOAGENT_ANALYTICS", "on").lower() not in ("0", "off", "false", "no")
+ANALYTICS_DB_PATH = os.getenv("ECOAGENT_ANALYTICS_DB_PATH", os.path.join(LOG_DIR, "analytics.db"))
+
+# Relative error of sketched percentiles. Stored sketches are bucketed with
+# this value, so changing it needs `python analytics.py rebuild`
+SKETCH_RELATIVE_ACCURACY = 0.01
+# Smaller values are counted as zero
+SKETCH_MIN_VALUE = 1e-3
+
+# Percentiles reported per cohort, and the summary field sketched per metric
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+SKETCH_METRICS = {"daily_kwh": "avg_daily_kwh", "daily_cost": "avg_daily_cost"}
+
+# Cohort every session belongs to, besides its category
+FLEET = "all"
+
+# Wastage periods and how many of the latest buckets are reported
+WASTAGE_PERIODS = {"day": 7, "week": 4}
+
+class QuantileSketch:
+    """Streaming quantile sketch with bounded relative error
+
+    A value v is counted in bucket ceil(log(v) / log(gamma)), so every value
+    in a bucket is within the relative accuracy of the bucket's midpoint and
+    quantiles keep that error however many values are added. The number of
+    buckets grows with the log of the value range rather than the count,
+    and sketches merge by adding bucket counts.
+    """
+
+    ZERO_BUCKET = -2 ** 31
+
+    def __init__(self, counts: Dict[int, int] = None, accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts = Counter(counts or {})
+
+    def bucket(self, value: float) -> int:
+        """Bucket index for a value"""
+        if value < SKETCH_MIN_VALUE:
+            return self.ZERO_BUCKET
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def value(self, bucket: int) -> float:
+        """Representative value of a bucket"""
+        if bucket == self.ZERO_BUCKET:
+            return 0.0
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """Count a value"""
+        self.counts[self.bucket(value)] += count
+
+    def merge(self, other: "QuantileSketch"):
+        """Add another sketch's counts to this one"""
+        self.counts.update(other.counts)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        """Estimated values at each quantile in qs (0-1, ascending) in one pass over the buckets"""
+        total = self.count
+        if not total:
+            return [None] * len(qs)
+        values = []
+        ranks = iter(q * (total - 1) for q in qs)
+        rank = next(ranks)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            while rank is not None and seen > rank:
+                values.append(self.value(bucket))
+                rank = next(ranks, None)
+            if rank is None:
+                break
+        return values + [self.value(max(self.counts))] * (len(qs) - len(values))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0-1), or None for an empty sketch"""
+        return self.quantiles([q])[0]
+
+    def rank(self, value: float) -> Optional[float]:
+        """Estimated fraction of values below `value` (values in its bucket count half)"""
+        total = self.count
+        if not total:
+            return None
+        bucket = self.bucket(value)
+        below = sum(count for other, count in self.counts.items() if other < bucket)
+        return (below + self.counts.get(bucket, 0) / 2) / total
+
+def _period_buckets(timestamp: str) -> Dict[str, str]:
+    """Day and ISO week a session timestamp falls in"""
+    moment = datetime.fromisoformat(timestamp)
+    year, week, _ = moment.isocalendar()
+    return {"day": moment.strftime("%Y-%m-%d"), "week": f"{year}-W{week:02d}"}
+
+class CohortRollups:
+    """Per-cohort counts, sketched percentiles and wastage frequencies in SQLite
+
+    Each logged session adds to its cohort totals, to the sketch buckets of
+    its daily kWh and cost and to the wastage counts of its day and week,
+    all as upserts in one transaction. Reads touch a bounded number of rows
+    (sketch buckets and the latest periods), so they cost the same for ten
+    sessions or ten million. Sessions are cohorted by category, plus FLEET
+    for all of them; wastage is counted by rule id, or by issue text for
+    logs without rule ids.
+    """
+
+    def __init__(self, path: str = ANALYTICS_DB_PATH, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cohorts ("
+                "cohort TEXT PRIMARY KEY, sessions INTEGER NOT NULL, kwh_sum REAL NOT NULL, cost_sum REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sketch_buckets ("
+                "cohort TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (cohort, metric, bucket))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS period_sessions ("
+                "period TEXT NOT NULL, bucket TEXT NOT NULL, sessions INTEGER NOT NULL, PRIMARY KEY (period, bucket))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS wastage_counts ("
+                "period TEXT NOT NULL, bucket TEXT NOT NULL, issue TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (period, bucket, issue))"
+            )
+        return self._conn
+
+    @staticmethod
+    def _deltas(logs: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, List[float]], Counter, Counter, Counter, int]:
+        """Fold session logs into increments for each table"""
+        sketch = QuantileSketch()
+        cohorts = {}
+        buckets = Counter()
+        periods = Counter()
+        wastage = Counter()
+        added = 0
+        for log in logs:
+            summary = log["summary"]
+            names = [FLEET] + ([log["category"]] if log.get("category") else [])
+            for cohort in names:
+                totals = cohorts.setdefault(cohort, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += summary["avg_daily_kwh"]
+                totals[2] += summary["avg_daily_cost"]
+                for metric, field in SKETCH_METRICS.items():
+                    buckets[(cohort, metric, sketch.bucket(summary[field]))] += 1
+            issues = set(log.get("wastage_rules") or log.get("wastage_issues", []))
+            for period, bucket in _period_buckets(log["timestamp"]).items():
+                periods[(period, bucket)] += 1
+                for issue in issues:
+                    wastage[(period, bucket, issue)] += 1
+            added += 1
+        return cohorts, buckets, periods, wastage, added
+
+    def record(self, log: Dict[str, Any]):
+        """Add one logged session to the rollups"""
+        self.record_many([log])
+
+    def record_many(self, logs: Iterable[Dict[str, Any]]) -> int:
+        """Add logged sessions to the rollups in one transaction; returns the number added"""
+        if not self.enabled:
+            return 0
+        cohorts, buckets, periods, wastage, added = self._deltas(logs)
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO cohorts VALUES (?, ?, ?, ?) ON CONFLICT (cohort) DO UPDATE SET "
+                "sessions = sessions + excluded.sessions, kwh_sum = kwh_sum + excluded.kwh_sum, "
+                "cost_sum = cost_sum + excluded.cost_sum",
+                [(cohort, *totals) for cohort, totals in cohorts.items()]
+            )
+            conn.executemany(
+                "INSERT INTO sketch_buckets VALUES (?, ?, ?, ?) ON CONFLICT (cohort, metric, bucket) "
+                "DO UPDATE SET count = count + excluded.count",
+                [(*key, count) for key, count in buckets.items()]
+            )
+            conn.executemany(
+                "INSERT INTO period_sessions VALUES (?, ?, ?) ON CONFLICT (period, bucket) "
+                "DO UPDATE SET sessions = sessions + excluded.sessions",
+                [(*key, count) for key, count in periods.items()]
+            )
+            conn.executemany(
+                "INSERT INTO wastage_counts VALUES (?, ?, ?, ?) ON CONFLICT (period, bucket, issue) "
+                "DO UPDATE SET count = count + excluded.count",
+                [(*key, count) for key, count in wastage.items()]
+            )
+            conn.commit()
+        return added
+
+    def _cohort_totals(self, conn: sqlite3.Connection) -> Dict[str, tuple]:
+        return {row[0]: row[1:] for row in conn.execute("SELECT cohort, sessions, kwh_sum, cost_sum FROM cohorts")}
+
+    def _sketches(self, conn: sqlite3.Connection) -> Dict[Tuple[str, str], QuantileSketch]:
+        sketches = {}
+        for cohort, metric, bucket, count in conn.execute("SELECT cohort, metric, bucket, count FROM sketch_buckets"):
+            sketches.setdefault((cohort, metric), QuantileSketch()).counts[bucket] = count
+        return sketches
+
+    def cohorts(self, daily_kwh: float = None) -> Dict[str, Dict[str, Any]]:
+        """Sessions, share of the fleet, means and percentiles per cohort
+
+        With daily_kwh, each cohort also reports the percentile rank of a
+        household using that much and how far it is from the cohort median.
+        """
+        with self._lock:
+            conn = self._connect()
+            totals = self._cohort_totals(conn)
+            sketches = self._sketches(conn)
+        fleet_sessions = totals.get(FLEET, (0,))[0]
+        cohorts = {}
+        for cohort, (sessions, kwh_sum, cost_sum) in totals.items():
+            stats = {
+                "sessions": sessions,
+                "share": round(sessions / fleet_sessions, 4) if fleet_sessions else 0.0,
+                "mean_daily_kwh": round(kwh_sum / sessions, 2),
+                "mean_daily_cost": round(cost_sum / sessions, 2)
+            }
+            for metric in SKETCH_METRICS:
+                sketch = sketches.get((cohort, metric), QuantileSketch())
+                stats[metric] = {f"p{round(q * 100)}": round(value, 2)
+                                 for q, value in zip(QUANTILES, sketch.quantiles(QUANTILES)) if value is not None}
+            if daily_kwh is not None:
+                sketch = sketches.get((cohort, "daily_kwh"), QuantileSketch())
+                median = sketch.quantile(0.5)
+                stats["household"] = {
+                    "percentile_rank": round(sketch.rank(daily_kwh) * 100, 1),
+                    "vs_median_pct": round((daily_kwh - median) * 100 / median, 1) if median else None
+                }
+            cohorts[cohort] = stats
+        return cohorts
+
+    def wastage_frequency(self, period: str = "week", limit: int = 4) -> List[Dict[str, Any]]:
+        """Wastage issue counts and the share of sessions flagged, for the latest `limit` days or weeks"""
+        with self._lock:
+            conn = self._connect()
+            periods = conn.execute(
+                "SELECT bucket, sessions FROM period_sessions WHERE period = ? ORDER BY bucket DESC LIMIT ?",
+                (period, limit)
+            ).fetchall()
+            counts = conn.execute(
+                "SELECT bucket, issue, count FROM wastage_counts WHERE period = ? AND bucket >= ? ORDER BY count DESC",
+                (period, periods[-1][0])
+            ).fetchall() if periods else []
+        issues = {}
+        for bucket, issue, count in counts:
+            issues.setdefault(bucket, []).append((issue, count))
+        return [
+            {
+                "period": bucket,
+                "sessions": sessions,
+                "issues": {issue: {"count": count, "rate": round(count / sessions, 4)}
+                           for issue, count in issues.get(bucket, [])}
+            }
+            for bucket, sessions in periods
+        ]
+
+    def benchmarks(self) -> Dict[str, Any]:
+        """Fleet and per-category percentiles with recent wastage frequencies"""
+        cohorts = self.cohorts()
+        return {
+            "sessions": cohorts.get(FLEET, {}).get("sessions", 0),
+            "fleet": cohorts.pop(FLEET, None),
+            "categories": cohorts,
+            "wastage": {period: self.wastage_frequency(period, limit) for period, limit in WASTAGE_PERIODS.items()}
+        }
+
+    def reset(self):
+        """Delete every rollup"""
+        with self._lock:
+            conn = self._connect()
+            for table in ("cohorts", "sketch_buckets", "period_sessions", "wastage_counts"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+
+    def rebuild(self, logs: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """Replace the rollups with ones folded from `logs`; returns the number of sessions"""
+        self.reset()
+        added = 0
+        batch = []
+        for log in logs:
+            batch.append(log)
+            if len(batch) >= batch_size:
+                added += self.record_many(batch)
+                batch = []
+        return added + self.record_many(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the sessions and sketch buckets held"""
+        with self._lock:
+            conn = self._connect()
+            sessions = conn.execute("SELECT sessions FROM cohorts WHERE cohort = ?", (FLEET,)).fetchone()
+            buckets = conn.execute("SELECT COUNT(*) FROM sketch_buckets").fetchone()[0]
+        return {"enabled": self.enabled, "sessions": sessions[0] if sessions else 0, "sketch_buckets": buckets}
+
+# Shared rollups, updated by usage_logger and batch analysis
+cohort_rollups = CohortRollups(ANALYTICS_DB_PATH, enabled=ANALYTICS_ENABLED)
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="EcoAgent cohort analytics")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="recompute the rollups from every logged session")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        added = cohort_rollups.rebuild(get_log_store().iter_all())
+        print(f"Rebuilt rollups from {added} sessions into {cohort_rollups.path}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,109 +1,204 @@
 import os
 import json
+import hashlib
+import logging
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
-import random
+import operator
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Annotated, Dict, Iterator, List, Any, Tuple
+
+import numpy as np
+
+from energy_data import APPLIANCE_POWER, ENERGY_COST_PER_KWH, EnergyData, simulate_energy_batch
+from llm_backends import create_llm, llm_identity, LLM_BACKEND
+from llm_cache import llm_cache, make_cache_key
+from analytics import cohort_rollups
+from llm_governor import llm_governor
+from log_store import get_log_store
+from wastage_rules import get_wastage_rules
+from profile_cache import profile_cache, profile_bucket_key, templatize_sections, fill_sections, CACHED_SECTIONS
+from prompt_context import build_prompt, appliance_lines, top_consumers, wastage_context, analysis_context
+from tracing import session_trace, node_span, traced_node, record_llm_call, current_trace
 
 # Load API key
 from dotenv import load_dotenv
 load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-
-# Initialize Gemini Model
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-1.5-flash-latest",
-    temperature=0.3
-)
-
-# Appliance Power Consumption Data (in watts)
-APPLIANCE_POWER = {
-    "fan": 75,
-    "ac": 1500,
-    "lights": 60,
-    "refrigerator": 150,
-    "tv": 120,
-    "washing_machine": 500,
-    "water_heater": 1200,
-    "microwave": 800
+
+# Analytics rollups are secondary, so their failures are logged rather than raised
+logger = logging.getLogger(__name__)
+
+# LLM Model
+# LangChain, LangGraph and the Gemini client take seconds to import, so they
+# are loaded on first use rather than by every process that imports this module.
+# ECOAGENT_LLM_BACKEND=fake swaps in an offline model (see llm_backends.py).
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Return the shared model for the configured backend, creating it on first use
+
+    Assigning app.llm (as the benchmarks do with a fake) replaces it.
+    """
+    model = globals().get("llm")
+    if model is None:
+        with _llm_lock:
+            model = globals().get("llm")
+            if model is None:
+                model = create_llm()
+                globals()["llm"] = model
+    return model
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Return the configured backend, whether the model exists yet, any counters it keeps and the governor's"""
+    model = globals().get("llm")
+    stats = {"backend": LLM_BACKEND if model is None else getattr(model, "model", type(model).__name__),
+             "created": model is not None}
+    if hasattr(model, "stats"):
+        stats.update(model.stats())
+    stats["governor"] = llm_governor.stats()
+    return stats
+
+def __getattr__(name: str) -> Any:
+    # app.llm is created on first access
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Graph execution mode: "sequential" runs one node at a time, "parallel" runs
+# the independent LLM sections concurrently, "single_call" asks for every
+# section in one structured LLM response
+DEFAULT_GRAPH_MODE = os.getenv("ECOAGENT_GRAPH_MODE", "sequential")
+
+# LLM Call Accounting
+# Expected Gemini calls per node for one graph run. Nodes missing from this
+# table (validation, routing, wastage detection, logging) must not call the LLM.
+LLM_CALL_BUDGET = {
+    "usage_pattern_analyzer": 1,
+    "efficient_user": 1,
+    "moderate_user": 1,
+    "excessive_user": 1,
+    "smart_suggestions": 1,
+    "action_plan": 1,
+    "single_call_advisor": 1
 }
 
-# Energy cost per kWh (in rupees)
-ENERGY_COST_PER_KWH = 6.5
+_llm_call_counts = Counter()
+_llm_call_lock = threading.Lock()
+
+def _llm_cache_key(prompt: str) -> str:
+    # Before the model exists the key comes from the configured backend, so a
+    # cache hit neither creates the client nor imports LangChain
+    llm = globals().get("llm")
+    if llm is None:
+        return make_cache_key(*llm_identity(), prompt)
+    return make_cache_key(getattr(llm, "model", type(llm).__name__), getattr(llm, "temperature", None), prompt)
+
+def invoke_llm(prompt: str, node: str):
+    """Send a prompt to the LLM, counting the call against its node
+
+    Responses are served from the shared llm_cache when the same model,
+    temperature and normalized prompt were seen before. Calls to the model go
+    through llm_governor, which applies the rate limit, concurrency cap,
+    deadline, retries and hedging. Each call is recorded by the tracing layer.
+    Callers only read `.content`; a cache hit returns a plain object with just
+    that, so it needs no LangChain import.
+    """
+    with _llm_call_lock:
+        _llm_call_counts[node] += 1
+    
+    start = time.perf_counter()
+    cache_key = _llm_cache_key(prompt)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        record_llm_call(node, time.perf_counter() - start, cached=True)
+        return SimpleNamespace(content=cached)
+    
+    try:
+        response = llm_governor.invoke(get_llm(), prompt)
+    except Exception as e:
+        record_llm_call(node, time.perf_counter() - start, cached=False, error=e)
+        raise
+    record_llm_call(node, time.perf_counter() - start, cached=False, response=response)
+    llm_cache.set(cache_key, response.content)
+    return response
+
+def stream_llm(prompt: str, node: str) -> Iterator[str]:
+    """Stream an LLM response as text chunks, counting the call against its node
+
+    A cached response is yielded as a single chunk; a fresh one is cached once
+    the stream completes. The recorded duration excludes time the consumer
+    spends between chunks.
+    """
+    with _llm_call_lock:
+        _llm_call_counts[node] += 1
+    
+    start = time.perf_counter()
+    cache_key = _llm_cache_key(prompt)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        record_llm_call(node, time.perf_counter() - start, cached=True)
+        yield cached
+        return
+    
+    chunks = []
+    usage = None
+    elapsed = 0.0
+    stream = llm_governor.stream(get_llm(), prompt)
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration:
+            break
+        except Exception as e:
+            record_llm_call(node, elapsed + time.perf_counter() - start, cached=False, error=e)
+            raise
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        if chunk.content:
+            chunks.append(chunk.content)
+            elapsed += time.perf_counter() - start
+            yield chunk.content
+            start = time.perf_counter()
+    record_llm_call(node, elapsed + time.perf_counter() - start, cached=False,
+                    response=SimpleNamespace(usage_metadata=usage))
+    llm_cache.set(cache_key, "".join(chunks))
+
+def get_llm_call_counts() -> Dict[str, int]:
+    """Return LLM calls made per node since the last reset"""
+    with _llm_call_lock:
+        return dict(_llm_call_counts)
+
+def reset_llm_call_counts():
+    """Clear the per-node LLM call counters"""
+    with _llm_call_lock:
+        _llm_call_counts.clear()
+
+def llm_calls_over_budget(counts: Dict[str, int], runs: int = 1) -> Dict[str, int]:
+    """Return the nodes whose call counts exceed LLM_CALL_BUDGET over the given runs"""
+    return {
+        node: calls for node, calls in counts.items()
+        if calls > LLM_CALL_BUDGET.get(node, 0) * runs
+    }
 
 # Simulate User Energy Usage Data
-def simulate_energy_data(days: int = 7) -> Dict[str, Any]:
+def simulate_energy_data(days: int = 7, seed: int = None) -> Dict[str, Any]:
     """Simulate realistic energy usage data for multiple days"""
-    data = {
-        "user_id": str(uuid.uuid4()),
-        "period": f"{days} days",
-        "daily_usage": []
-    }
-    
-    for day in range(days):
-        date = datetime.now() - timedelta(days=days-day-1)
-        daily_data = {
-            "date": date.strftime("%Y-%m-%d"),
-            "appliances": {}
-        }
-        
-        # Simulate usage hours for each appliance
-        for appliance, power in APPLIANCE_POWER.items():
-            if appliance == "refrigerator":
-                # Refrigerator runs 24/7
-                hours = 24
-            elif appliance == "ac":
-                # AC usage varies by season/weather
-                hours = random.uniform(6, 12)
-            elif appliance == "fan":
-                hours = random.uniform(8, 16)
-            elif appliance == "lights":
-                hours = random.uniform(4, 8)
-            elif appliance == "tv":
-                hours = random.uniform(3, 6)
-            elif appliance == "washing_machine":
-                hours = random.uniform(0.5, 1.5) if random.random() > 0.3 else 0
-            elif appliance == "water_heater":
-                hours = random.uniform(1, 3)
-            else:
-                hours = random.uniform(0.5, 2)
-            
-            daily_data["appliances"][appliance] = {
-                "hours": round(hours, 2),
-                "power_watts": power,
-                "energy_kwh": round((hours * power) / 1000, 2),
-                "cost_rupees": round(((hours * power) / 1000) * ENERGY_COST_PER_KWH, 2)
-            }
-        
-        daily_data["total_kwh"] = sum(app["energy_kwh"] for app in daily_data["appliances"].values())
-        daily_data["total_cost"] = sum(app["cost_rupees"] for app in daily_data["appliances"].values())
-        
-        data["daily_usage"].append(daily_data)
-    
-    return data
+    return simulate_energy_batch(1, days, seed=seed).household(0)
 
 # Data Validator
 def data_validator(state: dict) -> dict:
     """Validate and clean energy usage data"""
     try:
-        if not state.get("energy_data"):
-            state["energy_data"] = simulate_energy_data()
+        if state.get("energy_data") is None:
+            state["energy_data"] = simulate_energy_batch(1, 7).energy_data(0)
+        elif isinstance(state["energy_data"], dict):
+            state["energy_data"] = EnergyData.from_dict(state["energy_data"])
         
-        # Calculate totals
-        total_kwh = sum(day["total_kwh"] for day in state["energy_data"]["daily_usage"])
-        total_cost = sum(day["total_cost"] for day in state["energy_data"]["daily_usage"])
-        avg_daily_kwh = total_kwh / len(state["energy_data"]["daily_usage"])
-        avg_daily_cost = total_cost / len(state["energy_data"]["daily_usage"])
-        
-        state["summary"] = {
-            "total_kwh": round(total_kwh, 2),
-            "total_cost": round(total_cost, 2),
-            "avg_daily_kwh": round(avg_daily_kwh, 2),
-            "avg_daily_cost": round(avg_daily_cost, 2),
-            "days_analyzed": len(state["energy_data"]["daily_usage"])
-        }
+        # Totals and per-appliance breakdown are vectorized reductions
+        state["summary"] = state["energy_data"].summary()
+        state["appliance_totals"] = state["energy_data"].appliance_totals()
         
         return state
     except Exception as e:
@@ -111,9 +206,9 @@ def data_validator(state: dict) -> dict:
         return state
 
 # Usage Pattern Analyzer
-def usage_pattern_analyzer(state: dict) -> dict:
-    """Analyze energy usage patterns and identify inefficiencies"""
-    prompt = f"""
+def usage_pattern_prompt(state: dict) -> str:
+    """Build the pattern analysis prompt"""
+    return build_prompt("usage_pattern_analyzer", lambda level: f"""
 You are an expert energy efficiency analyst. Analyze the following energy usage data:
 
 Total Energy Consumption: {state['summary']['total_kwh']} kWh over {state['summary']['days_analyzed']} days
@@ -122,23 +217,8 @@ Total Cost: ₹{state['summary']['total_cost']}
 Average Daily Cost: ₹{state['summary']['avg_daily_cost']}
 
 Appliance-wise analysis:
-"""
-    
-    # Add appliance analysis
-    appliance_totals = {}
-    for day in state["energy_data"]["daily_usage"]:
-        for appliance, data in day["appliances"].items():
-            if appliance not in appliance_totals:
-                appliance_totals[appliance] = {"total_kwh": 0, "total_cost": 0, "avg_hours": 0}
-            appliance_totals[appliance]["total_kwh"] += data["energy_kwh"]
-            appliance_totals[appliance]["total_cost"] += data["cost_rupees"]
-            appliance_totals[appliance]["avg_hours"] += data["hours"]
-    
-    for appliance, totals in appliance_totals.items():
-        totals["avg_hours"] = round(totals["avg_hours"] / state['summary']['days_analyzed'], 2)
-        prompt += f"\n- {appliance.title()}: {totals['total_kwh']} kWh, ₹{totals['total_cost']}, avg {totals['avg_hours']} hours/day"
-    
-    prompt += """
+
+{appliance_lines(state['appliance_totals'], level)}
 
 Analyze this data and provide:
 1. Overall energy consumption assessment
@@ -147,33 +227,44 @@ Analyze this data and provide:
 4. Brief efficiency rating (Excellent/Good/Average/Poor)
 
 Keep the analysis concise and actionable.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def usage_pattern_analyzer(state: dict) -> dict:
+    """Analyze energy usage patterns and identify inefficiencies"""
+    prompt = usage_pattern_prompt(state)
+    response = invoke_llm(prompt, "usage_pattern_analyzer")
     state["pattern_analysis"] = response.content.strip()
-    state["appliance_totals"] = appliance_totals
     return state
 
 # Consumption Router
+def route_consumption(state: dict) -> dict:
+    """Routing step; records the branch chosen by consumption_router without any LLM call"""
+    state["category"] = consumption_router(state)
+    return state
+
+# Average daily kWh limits for each category, based on typical Indian
+# household consumption
+EFFICIENT_MAX_DAILY_KWH = 8
+MODERATE_MAX_DAILY_KWH = 15
+
 def consumption_router(state: dict) -> str:
     """Route based on energy consumption level"""
     avg_daily_kwh = state['summary']['avg_daily_kwh']
     
-    # Classification based on typical Indian household consumption
-    if avg_daily_kwh <= 8:
+    if avg_daily_kwh <= EFFICIENT_MAX_DAILY_KWH:
         return "efficient"
-    elif avg_daily_kwh <= 15:
+    elif avg_daily_kwh <= MODERATE_MAX_DAILY_KWH:
         return "moderate"
     else:
         return "excessive"
 
 # Efficient User Agent
-def efficient_user_agent(state: dict) -> dict:
-    """Handle users with efficient energy consumption"""
-    prompt = f"""
+def efficient_user_prompt(state: dict) -> str:
+    """Build the recommendation prompt for efficient users"""
+    return build_prompt("efficient_user", lambda level: f"""
 Excellent energy management! Your consumption analysis:
 
-{state['pattern_analysis']}
+{analysis_context(state['pattern_analysis'], level)}
 
 Average daily usage: {state['summary']['avg_daily_kwh']} kWh
 Daily cost: ₹{state['summary']['avg_daily_cost']}
@@ -184,20 +275,23 @@ As an efficient energy user:
 3. Recommend one eco-friendly upgrade
 
 Keep it motivational and forward-looking.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def efficient_user_agent(state: dict) -> dict:
+    """Handle users with efficient energy consumption"""
+    prompt = efficient_user_prompt(state)
+    response = invoke_llm(prompt, "efficient_user")
     state["recommendation"] = response.content.strip()
     state["category"] = "efficient"
     return state
 
 # Moderate User Agent
-def moderate_user_agent(state: dict) -> dict:
-    """Handle users with moderate energy consumption"""
-    prompt = f"""
+def moderate_user_prompt(state: dict) -> str:
+    """Build the recommendation prompt for moderate users"""
+    return build_prompt("moderate_user", lambda level: f"""
 Your energy usage shows room for improvement:
 
-{state['pattern_analysis']}
+{analysis_context(state['pattern_analysis'], level)}
 
 Average daily usage: {state['summary']['avg_daily_kwh']} kWh
 Daily cost: ₹{state['summary']['avg_daily_cost']}
@@ -209,20 +303,23 @@ As a moderate energy user:
 4. Estimate potential monthly savings
 
 Be encouraging but actionable.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def moderate_user_agent(state: dict) -> dict:
+    """Handle users with moderate energy consumption"""
+    prompt = moderate_user_prompt(state)
+    response = invoke_llm(prompt, "moderate_user")
     state["recommendation"] = response.content.strip()
     state["category"] = "moderate"
     return state
 
 # Excessive User Agent
-def excessive_user_agent(state: dict) -> dict:
-    """Handle users with excessive energy consumption"""
-    prompt = f"""
+def excessive_user_prompt(state: dict) -> str:
+    """Build the recommendation prompt for high-consumption users"""
+    return build_prompt("excessive_user", lambda level: f"""
 Your energy consumption needs immediate attention:
 
-{state['pattern_analysis']}
+{analysis_context(state['pattern_analysis'], level)}
 
 Average daily usage: {state['summary']['avg_daily_kwh']} kWh
 Daily cost: ₹{state['summary']['avg_daily_cost']}
@@ -235,45 +332,34 @@ As a high-consumption user:
 5. Estimate potential monthly savings with improvements
 
 Be supportive while emphasizing urgency.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def excessive_user_agent(state: dict) -> dict:
+    """Handle users with excessive energy consumption"""
+    prompt = excessive_user_prompt(state)
+    response = invoke_llm(prompt, "excessive_user")
     state["recommendation"] = response.content.strip()
     state["category"] = "excessive"
     return state
 
 # Wastage Detector
 def wastage_detector(state: dict) -> dict:
-    """Detect specific wastage patterns"""
-    wastage_issues = []
-    
-    for appliance, totals in state["appliance_totals"].items():
-        avg_hours = totals["avg_hours"]
-        
-        # Define wastage thresholds
-        if appliance == "ac" and avg_hours > 10:
-            wastage_issues.append(f"AC running {avg_hours} hours/day - consider using timer/thermostat")
-        elif appliance == "lights" and avg_hours > 6:
-            wastage_issues.append(f"Lights on {avg_hours} hours/day - check for unnecessary usage")
-        elif appliance == "fan" and avg_hours > 14:
-            wastage_issues.append(f"Fan running {avg_hours} hours/day - optimize based on occupancy")
-        elif appliance == "tv" and avg_hours > 5:
-            wastage_issues.append(f"TV on {avg_hours} hours/day - consider reducing screen time")
-        elif appliance == "water_heater" and avg_hours > 2.5:
-            wastage_issues.append(f"Water heater on {avg_hours} hours/day - check for leaks/insulation")
+    """Detect specific wastage patterns using the configured rule table"""
+    wastage_issues, wastage_rules = get_wastage_rules().detect(state["energy_data"])
     
     state["wastage_issues"] = wastage_issues
+    state["wastage_rules"] = wastage_rules
     return state
 
 # Smart Suggestions Generator
-def smart_suggestions_generator(state: dict) -> dict:
-    """Generate smart, personalized suggestions"""
-    prompt = f"""
+def smart_suggestions_prompt(state: dict) -> str:
+    """Build the smart suggestions prompt"""
+    return build_prompt("smart_suggestions", lambda level: f"""
 Based on the energy analysis, generate smart suggestions:
 
 Category: {state['category']}
-Wastage Issues: {state.get('wastage_issues', [])}
-Top Energy Consumers: {sorted(state['appliance_totals'].items(), key=lambda x: x[1]['total_kwh'], reverse=True)[:3]}
+Wastage Issues: {wastage_context(state.get('wastage_issues', []), level)}
+Top Energy Consumers: {top_consumers(state['appliance_totals'], level)}
 
 Provide:
 1. 3 immediate actionable tips
@@ -282,38 +368,49 @@ Provide:
 4. Estimated monthly savings potential
 
 Make suggestions specific and practical for Indian households.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def smart_suggestions_generator(state: dict) -> dict:
+    """Generate smart, personalized suggestions"""
+    prompt = smart_suggestions_prompt(state)
+    response = invoke_llm(prompt, "smart_suggestions")
     state["smart_suggestions"] = response.content.strip()
     return state
 
 # Usage Logger
-def usage_logger(state: dict) -> dict:
-    """Log the energy usage analysis session"""
-    log = {
+def session_log(state: dict) -> Dict[str, Any]:
+    """Build the session log record for a finished analysis, with the session's node trace so far"""
+    trace = current_trace()
+    return {
         "id": str(uuid.uuid4()),
         "timestamp": str(datetime.now()),
-        "user_id": state["energy_data"]["user_id"],
-        "analysis_period": state["energy_data"]["period"],
+        "user_id": state["energy_data"].user_id,
+        "analysis_period": state["energy_data"].period,
         "summary": state["summary"],
         "category": state.get("category", ""),
         "wastage_issues": state.get("wastage_issues", []),
+        "wastage_rules": state.get("wastage_rules", []),
         "recommendation": state.get("recommendation", ""),
-        "smart_suggestions": state.get("smart_suggestions", "")
+        "smart_suggestions": state.get("smart_suggestions", ""),
+        "trace": trace.to_dict() if trace else None
     }
-    
-    os.makedirs("energy_logs", exist_ok=True)
-    with open(f"energy_logs/session_{log['id']}.json", "w") as f:
-        json.dump(log, f, indent=2)
+
+def usage_logger(state: dict) -> dict:
+    """Log the energy usage analysis session"""
+    log = session_log(state)
+    get_log_store().append(log)
+    try:
+        cohort_rollups.record(log)
+    except Exception:
+        logger.exception("Cohort rollup failed for session %s", log["id"])
     
     state["log_id"] = log["id"]
     return state
 
 # Action Plan Generator
-def action_plan_generator(state: dict) -> dict:
-    """Generate a comprehensive action plan"""
-    prompt = f"""
+def action_plan_prompt(state: dict) -> str:
+    """Build the 30-day action plan prompt"""
+    return build_prompt("action_plan", lambda level: f"""
 Create a 30-day action plan based on the analysis:
 
 Category: {state['category']}
@@ -328,37 +425,98 @@ Generate:
 5. Motivational milestones
 
 Make it a practical, easy-to-follow plan.
-"""
-    
-    response = llm.invoke(prompt)
+""")
+
+def action_plan_generator(state: dict) -> dict:
+    """Generate a comprehensive action plan"""
+    prompt = action_plan_prompt(state)
+    response = invoke_llm(prompt, "action_plan")
     state["action_plan"] = response.content.strip()
     return state
 
+# Single-Call Advisor
+# Sections requested in the single structured response, each a non-empty string
+SINGLE_CALL_SECTIONS = ["pattern_analysis", "recommendation", "smart_suggestions", "action_plan"]
+
+SINGLE_CALL_RECOMMENDATION_FOCUS = {
+    "efficient": "2 lines of encouragement, 2 advanced tips to maintain efficiency and one eco-friendly upgrade",
+    "moderate": "3 specific areas for improvement, tips to cut consumption by 15-20%, behavioral changes and estimated monthly savings",
+    "excessive": "the environmental and financial impact, 4 immediate action steps, priority appliances, an energy audit recommendation and estimated monthly savings"
+}
+
+def parse_single_call_response(text: str) -> Dict[str, str]:
+    """Parse and validate the JSON object returned by the single-call advisor"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.startswith("json"):
+            text = text[4:]
+    sections = json.loads(text)
+    if not isinstance(sections, dict):
+        raise ValueError("response is not a JSON object")
+    for section in SINGLE_CALL_SECTIONS:
+        if not isinstance(sections.get(section), str) or not sections[section].strip():
+            raise ValueError(f"missing or empty section: {section}")
+    return {section: sections[section].strip() for section in SINGLE_CALL_SECTIONS}
+
+def single_call_prompt(state: dict) -> str:
+    """Build the prompt asking for every advice section as one JSON object"""
+    return build_prompt("single_call_advisor", lambda level: f"""
+You are an expert energy efficiency advisor for Indian households. Using the data below, write all four sections of the report.
+
+Total Energy Consumption: {state['summary']['total_kwh']} kWh over {state['summary']['days_analyzed']} days
+Average Daily Usage: {state['summary']['avg_daily_kwh']} kWh
+Average Daily Cost: ₹{state['summary']['avg_daily_cost']}
+Category: {state['category']}
+Wastage Issues: {wastage_context(state.get('wastage_issues', []), level)}
+
+Appliance-wise analysis:
+
+{appliance_lines(state['appliance_totals'], level)}
+
+Respond with only a JSON object with these string fields:
+"pattern_analysis": overall assessment, top 3 energy-consuming appliances, unusual patterns or wastage, and an efficiency rating (Excellent/Good/Average/Poor)
+"recommendation": {SINGLE_CALL_RECOMMENDATION_FOCUS[state['category']]}
+"smart_suggestions": 3 immediate tips, 2 long-term improvements, 1 behavioral change and estimated monthly savings
+"action_plan": a 30-day plan with week 1-2 actions, week 3-4 implementation, review checkpoints, success metrics and milestones
+""")
+
+def single_call_advisor(state: dict) -> dict:
+    """Generate every advice section with one structured LLM call"""
+    prompt = single_call_prompt(state)
+    response = invoke_llm(prompt, "single_call_advisor")
+    try:
+        state.update(parse_single_call_response(response.content))
+    except ValueError as e:
+        # Drop the rejected response so later runs ask again instead of replaying it from the cache
+        llm_cache.delete(_llm_cache_key(prompt))
+        state["single_call_error"] = f"Single-call response rejected: {str(e)}"
+    return state
+
+def single_call_outcome(state: dict) -> str:
+    """Route to logging only when the structured response was accepted"""
+    return "fallback" if state.get("single_call_error") else "accepted"
+
 # Build EcoAgent Workflow
-def run_eco_agent(user_data: dict = None) -> dict:
-    """Main function to run the EcoAgent workflow"""
-    
-    # Initialize state
-    if user_data is None:
-        user_data = {}
-    
-    # Build the workflow graph
+def build_eco_agent_graph(checkpointer: Any = None):
+    """Build and compile the EcoAgent workflow graph, checkpointing every node if given a checkpointer"""
+    from langgraph.graph import StateGraph, END
     builder = StateGraph(dict)
     
     # Set entry point
     builder.set_entry_point("data_validator")
     
     # Add nodes
-    builder.add_node("data_validator", data_validator)
-    builder.add_node("usage_pattern_analyzer", usage_pattern_analyzer)
-    builder.add_node("consumption_router", usage_pattern_analyzer)  # Reuse for routing
-    builder.add_node("efficient_user", efficient_user_agent)
-    builder.add_node("moderate_user", moderate_user_agent)
-    builder.add_node("excessive_user", excessive_user_agent)
-    builder.add_node("wastage_detector", wastage_detector)
-    builder.add_node("smart_suggestions", smart_suggestions_generator)
-    builder.add_node("usage_logger", usage_logger)
-    builder.add_node("action_plan", action_plan_generator)
+    builder.add_node("data_validator", traced_node("data_validator", data_validator))
+    builder.add_node("usage_pattern_analyzer", traced_node("usage_pattern_analyzer", usage_pattern_analyzer))
+    builder.add_node("consumption_router", traced_node("consumption_router", route_consumption))
+    builder.add_node("efficient_user", traced_node("efficient_user", efficient_user_agent))
+    builder.add_node("moderate_user", traced_node("moderate_user", moderate_user_agent))
+    builder.add_node("excessive_user", traced_node("excessive_user", excessive_user_agent))
+    builder.add_node("wastage_detector", traced_node("wastage_detector", wastage_detector))
+    builder.add_node("smart_suggestions", traced_node("smart_suggestions", smart_suggestions_generator))
+    builder.add_node("action_plan", traced_node("action_plan", action_plan_generator))
+    builder.add_node("usage_logger", traced_node("usage_logger", usage_logger))
     
     # Add edges
     builder.add_edge("data_validator", "usage_pattern_analyzer")
@@ -378,16 +536,353 @@ def run_eco_agent(user_data: dict = None) -> dict:
     
     # Continue the workflow
     builder.add_edge("wastage_detector", "smart_suggestions")
-    builder.add_edge("smart_suggestions", "usage_logger")
-    builder.add_edge("usage_logger", "action_plan")
-    builder.add_edge("action_plan", END)
+    builder.add_edge("smart_suggestions", "action_plan")
+    builder.add_edge("action_plan", "usage_logger")
+    builder.add_edge("usage_logger", END)
+    
+    return builder.compile(checkpointer=checkpointer)
+
+# Category agent dispatch for the parallel graph, where a single node must
+# represent the chosen branch so the join can wait on it
+CATEGORY_AGENTS = {
+    "efficient": efficient_user_agent,
+    "moderate": moderate_user_agent,
+    "excessive": excessive_user_agent
+}
+
+def category_agent(state: dict) -> dict:
+    """Run the recommendation agent for the routed consumption category"""
+    return CATEGORY_AGENTS[state["category"]](state)
+
+def join_results(state: dict) -> dict:
+    """Fan-in point; waits for every parallel branch before logging"""
+    return state
+
+# Parallel branches merge their updates into one state instead of replacing it
+ParallelState = Annotated[dict, operator.or_]
+
+def _branch(node):
+    """Adapt a node for the parallel graph: run it on a copy and return only the keys it changed"""
+    def run(state: dict) -> dict:
+        updated = node(dict(state))
+        return {key: value for key, value in updated.items() if state.get(key) is not value}
+    run.__name__ = node.__name__
+    return run
+
+def build_parallel_eco_agent_graph(checkpointer: Any = None):
+    """Build and compile the workflow with the LLM sections fanned out in parallel
+
+    Routing and wastage detection are deterministic, so once they have run the
+    category recommendation, smart suggestions and action plan depend only on
+    existing state and are issued concurrently. Latency is then bounded by the
+    slowest of the three calls rather than their sum.
+    """
+    from langgraph.graph import StateGraph, END
+    builder = StateGraph(ParallelState)
+    
+    builder.set_entry_point("data_validator")
+    
+    builder.add_node("data_validator", traced_node("data_validator", _branch(data_validator)))
+    builder.add_node("usage_pattern_analyzer", traced_node("usage_pattern_analyzer", _branch(usage_pattern_analyzer)))
+    builder.add_node("consumption_router", traced_node("consumption_router", _branch(route_consumption)))
+    builder.add_node("wastage_detector", traced_node("wastage_detector", _branch(wastage_detector)))
+    builder.add_node("category_agent", traced_node("category_agent", _branch(category_agent)))
+    builder.add_node("smart_suggestions", traced_node("smart_suggestions", _branch(smart_suggestions_generator)))
+    builder.add_node("action_plan", traced_node("action_plan", _branch(action_plan_generator)))
+    builder.add_node("join_results", join_results)
+    builder.add_node("usage_logger", traced_node("usage_logger", _branch(usage_logger)))
+    
+    builder.add_edge("data_validator", "usage_pattern_analyzer")
+    builder.add_edge("usage_pattern_analyzer", "consumption_router")
+    builder.add_edge("consumption_router", "wastage_detector")
+    
+    # Fan out the independent LLM sections
+    builder.add_edge("wastage_detector", "category_agent")
+    builder.add_edge("wastage_detector", "smart_suggestions")
+    builder.add_edge("wastage_detector", "action_plan")
+    
+    # Fan in once all three have finished
+    builder.add_edge(["category_agent", "smart_suggestions", "action_plan"], "join_results")
+    builder.add_edge("join_results", "usage_logger")
+    builder.add_edge("usage_logger", END)
+    
+    return builder.compile(checkpointer=checkpointer)
+
+def build_single_call_eco_agent_graph(checkpointer: Any = None):
+    """Build and compile the workflow that asks for all advice sections in one LLM call
+
+    A rejected response ends the run without logging, and run_eco_agent then
+    falls back to a multi-call graph.
+    """
+    from langgraph.graph import StateGraph, END
+    builder = StateGraph(dict)
+    
+    builder.set_entry_point("data_validator")
+    
+    builder.add_node("data_validator", traced_node("data_validator", data_validator))
+    builder.add_node("consumption_router", traced_node("consumption_router", route_consumption))
+    builder.add_node("wastage_detector", traced_node("wastage_detector", wastage_detector))
+    builder.add_node("single_call_advisor", traced_node("single_call_advisor", single_call_advisor))
+    builder.add_node("usage_logger", traced_node("usage_logger", usage_logger))
+    
+    builder.add_edge("data_validator", "consumption_router")
+    builder.add_edge("consumption_router", "wastage_detector")
+    builder.add_edge("wastage_detector", "single_call_advisor")
+    builder.add_conditional_edges("single_call_advisor", single_call_outcome, {
+        "accepted": "usage_logger",
+        "fallback": END
+    })
+    builder.add_edge("usage_logger", END)
+    
+    return builder.compile(checkpointer=checkpointer)
+
+# Compiled Graph Registry
+# A compiled graph holds no per-run state, so one instance is built per name
+# and shared by every request thread.
+GRAPH_BUILDERS = {
+    "sequential": build_eco_agent_graph,
+    "parallel": build_parallel_eco_agent_graph,
+    "single_call": build_single_call_eco_agent_graph
+}
+
+_compiled_graphs: Dict[Tuple[str, bool], Any] = {}
+_graph_lock = threading.Lock()
+
+def _build_graph(name: str, checkpointed: bool):
+    if not checkpointed:
+        return GRAPH_BUILDERS[name]()
+    from checkpoints import get_checkpointer
+    return GRAPH_BUILDERS[name](get_checkpointer())
+
+def get_eco_agent_graph(name: str = "sequential", checkpointed: bool = False):
+    """Return the compiled workflow graph, building it on first use
+
+    checkpointed selects the variant compiled with the shared checkpoint
+    store, which must be invoked with a thread_id (see _run_graph).
+    """
+    key = (name, checkpointed)
+    graph = _compiled_graphs.get(key)
+    if graph is None:
+        with _graph_lock:
+            graph = _compiled_graphs.get(key)
+            if graph is None:
+                graph = _build_graph(name, checkpointed)
+                _compiled_graphs[key] = graph
+    return graph
+
+def rebuild_eco_agent_graph(name: str = None):
+    """Recompile graphs after their nodes or config change
+
+    With a name, that graph is rebuilt now and returned (its checkpointed
+    variant on next use); without one, every compiled graph is dropped and
+    rebuilt on next use.
+    """
+    with _graph_lock:
+        if name is None:
+            _compiled_graphs.clear()
+            return None
+        _compiled_graphs.pop((name, True), None)
+        graph = _build_graph(name, False)
+        _compiled_graphs[(name, False)] = graph
+        return graph
+
+def warm_up(modes: List[str] = None, create_llm: bool = True):
+    """Do the slow first-use work ahead of the first request
+
+    Compiles the graphs for `modes` (the default mode if not given), which
+    imports LangChain and LangGraph, and creates the Gemini client. Pre-fork
+    servers can call this with create_llm=False before forking, so workers
+    share the imported modules but each opens its own client connections.
+    """
+    for mode in modes or [DEFAULT_GRAPH_MODE]:
+        get_eco_agent_graph(mode)
+    if create_llm:
+        get_llm()
+
+def run_deterministic_stages(state: dict) -> dict:
+    """Run validation, routing and wastage detection, none of which call the LLM"""
+    for name, stage in (("data_validator", data_validator), ("consumption_router", route_consumption),
+                        ("wastage_detector", wastage_detector)):
+        with node_span(name):
+            state = stage(state)
+    return state
+
+# Session Checkpoints
+# Runs given a session id use graphs compiled with the SQLite checkpointer from
+# checkpoints.py, which stores the state after every node under that id.
+# Running a session again resumes from the node that failed, and a finished
+# session is replayed from its final state without calling the LLM. Runs
+# without a session id are not checkpointed, so callers that never retry do
+# not pay for the writes; the web API generates an id for every analysis run
+# whose client sent none.
+class SessionMismatchError(Exception):
+    """Raised when a session id is reused for different usage data"""
+
+def input_digest(state: dict) -> str:
+    """Hash of the usage in an input state, ignoring user ids and dates"""
+    energy_data = state.get("energy_data")
+    if isinstance(energy_data, dict):
+        energy_data = EnergyData.from_dict(energy_data)
+    if not isinstance(energy_data, EnergyData):
+        return ""
+    digest = hashlib.sha256(json.dumps(energy_data.appliances).encode("utf-8"))
+    digest.update(np.ascontiguousarray(energy_data.hours).tobytes())
+    return digest.hexdigest()[:32]
+
+def _run_graph(mode: str, state: dict, session_id: str = None, thread: str = None) -> Tuple[dict, str]:
+    """Run a mode's graph for a session, returning the final state and whether it was new, resumed or replayed"""
+    if session_id is None:
+        return get_eco_agent_graph(mode).invoke(state), "new"
+    
+    graph = get_eco_agent_graph(mode, checkpointed=True)
+    digest = input_digest(state)
+    config = {"configurable": {"thread_id": f"{session_id}:{thread or mode}"}, "metadata": {"input_digest": digest}}
+    if graph.checkpointer is None:
+        return graph.invoke(state, config), "new"
+    
+    snapshot = graph.get_state(config)
+    if snapshot.values and snapshot.metadata.get("input_digest") != digest:
+        raise SessionMismatchError(f"Session {session_id} was started with different usage data")
+    if snapshot.next:
+        return graph.invoke(None, config), "resumed"
+    if snapshot.values:
+        return dict(snapshot.values), "replayed"
+    return graph.invoke(state, config), "new"
+
+def _invoke_graph(state: dict, mode: str, session_id: str = None) -> dict:
+    """Run the graph for a mode, falling back to a multi-call graph if a single call is rejected"""
+    result, status = _run_graph(mode, state, session_id)
+    if mode == "single_call" and result.get("single_call_error"):
+        fallback_mode = DEFAULT_GRAPH_MODE if DEFAULT_GRAPH_MODE != "single_call" else "sequential"
+        fallback, status = _run_graph(fallback_mode, result, session_id, f"{fallback_mode}_fallback")
+        fallback["single_call_error"] = result["single_call_error"]
+        result = fallback
+    if session_id is not None:
+        result["session"] = {"id": session_id, "status": status}
+    return result
+
+def get_checkpoint_stats() -> Dict[str, Any]:
+    """Return the checkpoint store's counts, without importing LangGraph before a session has used it"""
+    graph = next((graph for (_, checkpointed), graph in _compiled_graphs.items() if checkpointed), None)
+    if graph is None:
+        return {"compiled": False}
+    checkpointer = graph.checkpointer
+    return {"enabled": checkpointer is not None, **(checkpointer.stats() if checkpointer else {})}
+
+def get_session(session_id: str) -> Dict[str, Any]:
+    """Return the checkpointed runs of a session: per graph, whether it finished and which nodes are pending"""
+    from checkpoints import get_checkpointer
+    checkpointer = get_checkpointer()
+    runs = {}
+    for thread_id in (checkpointer.threads(f"{session_id}:") if checkpointer else []):
+        thread = thread_id[len(session_id) + 1:]
+        mode = thread[:-len("_fallback")] if thread.endswith("_fallback") else thread
+        if mode not in GRAPH_BUILDERS:
+            continue
+        snapshot = get_eco_agent_graph(mode, checkpointed=True).get_state({"configurable": {"thread_id": thread_id}})
+        runs[thread] = {
+            "status": "interrupted" if snapshot.next else "completed",
+            "next": list(snapshot.next),
+            "updated_at": snapshot.created_at
+        }
+    return {"session_id": session_id, "runs": runs}
+
+def _run_with_profile_cache(user_data: dict, mode: str, session_id: str = None) -> dict:
+    """Serve the LLM sections from the profile bucket cache, running the graph only on a miss"""
+    state = run_deterministic_stages(dict(user_data))
+    bucket_key = profile_bucket_key(state["summary"], state["appliance_totals"], state["category"], state["wastage_issues"])
+    
+    sections = profile_cache.get_json(bucket_key)
+    if sections is not None:
+        state.update(fill_sections(sections, state["summary"]))
+        state = traced_node("usage_logger", usage_logger)(state)
+        if session_id is not None:
+            state["session"] = {"id": session_id, "status": "cached"}
+        return state
+    
+    result = _invoke_graph(state, mode, session_id)
+    profile_cache.set_json(bucket_key, templatize_sections(
+        {section: result[section] for section in CACHED_SECTIONS}, result["summary"]
+    ))
+    return result
+
+def run_eco_agent(user_data: dict = None, mode: str = None, session_id: str = None) -> dict:
+    """Main function to run the EcoAgent workflow
+
+    mode selects the graph ("sequential", "parallel" or "single_call") and
+    defaults to DEFAULT_GRAPH_MODE. When the profile bucket cache is enabled, similar
+    households reuse each other's LLM sections.
+
+    Given a session_id, the run is checkpointed under it and the result
+    reports it in "session" along with whether the run was new, resumed or
+    replayed; an exception carries the id as `session_id` so the caller can
+    offer it for a retry. Without one nothing is checkpointed.
+    """
     
-    # Compile and run the graph
-    graph = builder.compile()
-    result = graph.invoke(user_data)
+    # Initialize state
+    if user_data is None:
+        user_data = {}
+    mode = mode or DEFAULT_GRAPH_MODE
+    
+    try:
+        with session_trace(mode):
+            if profile_cache.enabled:
+                return _run_with_profile_cache(user_data, mode, session_id)
+            
+            # Run the shared compiled graph
+            result = _invoke_graph(user_data, mode, session_id)
+    except Exception as e:
+        if session_id is not None:
+            e.session_id = getattr(e, "session_id", session_id)
+        raise
     
     return result
 
+# Streaming Workflow
+RECOMMENDATION_PROMPTS = {
+    "efficient": (efficient_user_prompt, "efficient_user"),
+    "moderate": (moderate_user_prompt, "moderate_user"),
+    "excessive": (excessive_user_prompt, "excessive_user")
+}
+
+def stream_eco_agent(user_data: dict = None) -> Iterator[Tuple[str, dict]]:
+    """Run the workflow as a stream of (event, payload) pairs
+
+    The deterministic results are emitted first in a "summary" event. Each LLM
+    section then streams as "token" events followed by a "section" event with
+    its full text, and "done" reports the log id once the session is logged.
+    """
+    with session_trace("stream"):
+        yield from _stream_sections(dict(user_data or {}))
+
+def _stream_sections(state: dict) -> Iterator[Tuple[str, dict]]:
+    state = run_deterministic_stages(state)
+    yield "summary", {
+        "summary": state["summary"],
+        "category": state["category"],
+        "wastage_issues": state["wastage_issues"],
+        "appliance_breakdown": state["appliance_totals"]
+    }
+    
+    recommendation_prompt, recommendation_node = RECOMMENDATION_PROMPTS[state["category"]]
+    sections = [
+        ("pattern_analysis", usage_pattern_prompt, "usage_pattern_analyzer"),
+        ("recommendation", recommendation_prompt, recommendation_node),
+        ("smart_suggestions", smart_suggestions_prompt, "smart_suggestions"),
+        ("action_plan", action_plan_prompt, "action_plan")
+    ]
+    for section, build_prompt, node in sections:
+        chunks = []
+        with node_span(node):
+            for text in stream_llm(build_prompt(state), node):
+                chunks.append(text)
+                yield "token", {"section": section, "text": text}
+        state[section] = "".join(chunks).strip()
+        yield "section", {"section": section, "text": state[section]}
+    
+    state = traced_node("usage_logger", usage_logger)(state)
+    yield "done", {"log_id": state["log_id"]}
+
 # Demo function
 def demo_eco_agent():
     """Demonstrate the EcoAgent system"""
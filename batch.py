@@ -0,0 +1,215 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Any, Tuple
+
+import numpy as np
+
+from app import (
+    invoke_llm, session_log, usage_pattern_prompt, smart_suggestions_prompt, action_plan_prompt,
+    RECOMMENDATION_PROMPTS, EFFICIENT_MAX_DAILY_KWH, MODERATE_MAX_DAILY_KWH
+)
+from analytics import cohort_rollups
+from energy_data import APPLIANCE_POWER, EnergyData, period_summaries
+from llm_cache import normalize_prompt
+from log_store import get_log_store
+from wastage_rules import get_wastage_rules
+
+logger = logging.getLogger(__name__)
+
+# Batch Analysis Configuration
+BATCH_LLM_CONCURRENCY = int(os.getenv("ECOAGENT_BATCH_LLM_CONCURRENCY", "8"))
+BATCH_CHUNK_SIZE = int(os.getenv("ECOAGENT_BATCH_CHUNK_SIZE", "200"))
+BATCH_MAX_HOUSEHOLDS = int(os.getenv("ECOAGENT_BATCH_MAX_HOUSEHOLDS", "10000"))
+
+# Every known appliance has a fixed column in the batch matrices
+BATCH_APPLIANCES = list(APPLIANCE_POWER)
+_COLUMNS = {appliance: column for column, appliance in enumerate(BATCH_APPLIANCES)}
+
+# LLM sections that depend only on the deterministic stages
+INDEPENDENT_SECTIONS = [
+    ("pattern_analysis", usage_pattern_prompt, "usage_pattern_analyzer"),
+    ("smart_suggestions", smart_suggestions_prompt, "smart_suggestions"),
+    ("action_plan", action_plan_prompt, "action_plan")
+]
+
+def household_energy_data(household: Dict[str, Any], user_id: str, default_days: int = 7) -> EnergyData:
+    """Build EnergyData from one batch entry of the form {"id", "usage", "days"}"""
+    if not isinstance(household, dict) or not isinstance(household.get("usage"), dict):
+        raise ValueError("No usage data provided")
+    days = int(household.get("days", default_days))
+    if days < 1:
+        raise ValueError("days must be at least 1")
+    return EnergyData.from_usage(household["usage"], days, user_id=str(household.get("id") or user_id))
+
+def run_deterministic_batch(energy_datas: List[EnergyData]) -> List[Dict[str, Any]]:
+    """Validation, routing and wastage detection for many households at once
+
+    Per-appliance totals are gathered into households x appliances matrices,
+    so summaries and categories are array operations over the whole batch;
+    wastage rules run over households grouped by shape. Returns one state
+    per household, as run_deterministic_stages would produce.
+    """
+    # Scatter every household's column totals into the matrices in one assignment
+    rows, columns, sums = [], [], []
+    for row, energy_data in enumerate(energy_datas):
+        rows.extend([row] * len(energy_data.appliances))
+        columns.extend(_COLUMNS[appliance] for appliance in energy_data.appliances)
+        sums.append(np.stack(energy_data.column_totals()))
+    shape = (len(energy_datas), len(BATCH_APPLIANCES))
+    hours, energy, cost = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    if sums:
+        hours[rows, columns], energy[rows, columns], cost[rows, columns] = np.concatenate(sums, axis=1)
+    day_counts = [energy_data.days for energy_data in energy_datas]
+    days = np.array(day_counts, dtype=np.float64)
+
+    # Same arithmetic as EnergyData.summary(), so halfway values land on the
+    # same side in both paths
+    summary_columns = period_summaries(energy, cost, days)
+    avg_daily_kwh = summary_columns["avg_daily_kwh"]
+    summary_columns = {key: values.tolist() for key, values in summary_columns.items()}
+    summary_columns["days_analyzed"] = day_counts
+    summaries = [dict(zip(summary_columns, row)) for row in zip(*summary_columns.values())]
+    avg_hours = np.round(hours / days[:, None], 2)
+    categories = np.select(
+        [avg_daily_kwh <= EFFICIENT_MAX_DAILY_KWH, avg_daily_kwh <= MODERATE_MAX_DAILY_KWH],
+        ["efficient", "moderate"], "excessive"
+    )
+    wastage = get_wastage_rules().detect_many(energy_datas)
+
+    energy, cost, avg_hours = energy.tolist(), cost.tolist(), avg_hours.tolist()
+
+    states = []
+    for row, energy_data in enumerate(energy_datas):
+        columns = [(appliance, _COLUMNS[appliance]) for appliance in energy_data.appliances]
+        states.append({
+            "energy_data": energy_data,
+            "summary": summaries[row],
+            "appliance_totals": {
+                appliance: {
+                    "total_kwh": energy[row][column],
+                    "total_cost": cost[row][column],
+                    "avg_hours": avg_hours[row][column]
+                }
+                for appliance, column in columns
+            },
+            "category": str(categories[row]),
+            "wastage_issues": wastage[row][0],
+            "wastage_rules": wastage[row][1]
+        })
+    return states
+
+def _complete(prompt: str, node: str) -> str:
+    return invoke_llm(prompt, node).content.strip()
+
+class BatchAnalysis:
+    """Analyze many households, sharing LLM calls between identical prompts
+
+    Households are processed in chunks: the deterministic stages run
+    vectorized over a chunk, then every LLM prompt in the chunk is issued
+    through a pool of at most `concurrency` threads. A prompt already sent
+    for another household in the batch reuses that response. Iterating
+    yields (index, household id, state) in input order; a failed household
+    has an "error" key instead of the LLM sections.
+    """
+
+    def __init__(self, households: List[Any], default_days: int = 7,
+                 concurrency: int = BATCH_LLM_CONCURRENCY, chunk_size: int = BATCH_CHUNK_SIZE):
+        self.households = households
+        self.default_days = default_days
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.batch_id = uuid.uuid4().hex[:8]
+        self._responses: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.analyzed = 0
+        self.failed = 0
+        self.prompts = 0
+        self.llm_calls = 0
+
+    def _request(self, executor: ThreadPoolExecutor, prompt: str, node: str) -> Future:
+        """Return the pending response for a prompt, issuing it only if the batch has not already"""
+        key = hashlib.sha256(f"{node}|{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+        with self._lock:
+            self.prompts += 1
+            future = self._responses.get(key)
+            if future is None:
+                future = executor.submit(_complete, prompt, node)
+                self._responses[key] = future
+                self.llm_calls += 1
+            return future
+
+    def __iter__(self) -> Iterator[Tuple[int, Any, Dict[str, Any]]]:
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ecoagent-batch") as executor:
+            for start in range(0, len(self.households), self.chunk_size):
+                yield from self._run_chunk(executor, start, self.households[start:start + self.chunk_size])
+
+    def _run_chunk(self, executor: ThreadPoolExecutor, start: int, chunk: List[Any]) -> Iterator[Tuple[int, Any, Dict[str, Any]]]:
+        states = {}
+        energy_datas = {}
+        for index, household in enumerate(chunk, start):
+            try:
+                energy_datas[index] = household_energy_data(household, f"batch_{self.batch_id}_{index}", self.default_days)
+            except (TypeError, ValueError) as e:
+                states[index] = {"error": f"Data validation error: {str(e)}"}
+        states.update(zip(energy_datas, run_deterministic_batch(list(energy_datas.values()))))
+
+        pending = {
+            index: {section: self._request(executor, build_prompt(states[index]), node)
+                    for section, build_prompt, node in INDEPENDENT_SECTIONS}
+            for index in energy_datas
+        }
+        # The recommendation prompt quotes the pattern analysis, so it is issued second
+        for index, sections in pending.items():
+            state = states[index]
+            try:
+                state["pattern_analysis"] = sections.pop("pattern_analysis").result()
+            except Exception as e:
+                state["error"] = f"LLM error: {str(e)}"
+                continue
+            build_prompt, node = RECOMMENDATION_PROMPTS[state["category"]]
+            sections["recommendation"] = self._request(executor, build_prompt(state), node)
+
+        logs = []
+        for index, sections in pending.items():
+            state = states[index]
+            if "error" in state:
+                continue
+            try:
+                for section, future in sections.items():
+                    state[section] = future.result()
+            except Exception as e:
+                state["error"] = f"LLM error: {str(e)}"
+                continue
+            log = session_log(state)
+            state["log_id"] = log["id"]
+            logs.append(log)
+        get_log_store().import_logs(logs)
+        try:
+            cohort_rollups.record_many(logs)
+        except Exception:
+            logger.exception("Cohort rollup failed for %d batch sessions", len(logs))
+
+        for index, household in enumerate(chunk, start):
+            state = states[index]
+            with self._lock:
+                if "error" in state:
+                    self.failed += 1
+                else:
+                    self.analyzed += 1
+            yield index, household.get("id") if isinstance(household, dict) else None, state
+
+    def stats(self) -> Dict[str, Any]:
+        """Return household counts and how many LLM calls prompt deduplication saved"""
+        with self._lock:
+            return {
+                "households": len(self.households),
+                "analyzed": self.analyzed,
+                "failed": self.failed,
+                "prompts": self.prompts,
+                "llm_calls": self.llm_calls,
+                "deduplicated": self.prompts - self.llm_calls
+            }
@@ -0,0 +1,941 @@
+"""Benchmarks for the EcoAgent pipeline
+
+Run with: python benchmark.py [--json PATH] [--compare BASELINE] [--threshold RATIO]
+                              [graph] [llm_calls] [graph_modes] [llm_cache] [profile_cache]
+                              [single_call] [stream] [log_store] [simulate] [validator]
+                              [usage] [batch] [wastage] [meter] [incremental] [startup]
+                              [fake_llm] [stages] [e2e] [http] [tracing]
+                              [governor] [prompts] [checkpoints]
+                              [analytics]
+
+--json writes every result to a file; --compare reads such a file and
+reports timings that got slower (or throughputs that dropped) by more than
+--threshold, exiting non-zero if any did.
+
+The Gemini model is replaced with the offline FakeLLM backend, so the numbers
+measure graph and node overhead plus a simulated LLM latency where noted.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+import batch
+import prompt_context
+import tracing
+from analytics import CohortRollups, QUANTILES
+from connect import create_energy_data_from_usage
+from llm_backends import FakeLLM
+from llm_cache import llm_cache
+from llm_governor import LLMGovernor
+from loadtest import LOAD_ENDPOINTS, percentile, run_local_load
+from log_store import JSONDirectoryLogStore, SQLiteLogStore
+from energy_data import APPLIANCE_POWER, EnergyData, simulate_energy_batch
+from incremental import IncrementalAnalyzer, UserStateStore
+from meter_ingest import MeterAggregator, ingest_stream
+from profile_cache import profile_cache
+from prompt_context import PROMPT_TOKEN_BUDGET, estimate_tokens
+from wastage_rules import DEFAULT_WASTAGE_RULES, WastageRules, load_wastage_rules
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    """Average wall time of fn() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def _latency_percentiles(fn, iterations: int) -> dict:
+    """p50/p95/p99 wall time of fn() in milliseconds"""
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {f"p{round(q * 100)}_ms": round(percentile(durations, q) * 1000, 3) for q in (0.50, 0.95, 0.99)}
+
+
+def benchmark_graph(iterations: int = 50) -> dict:
+    """Compare compiling the graph per request with reusing the shared graph"""
+    energy_data = app.simulate_energy_data(7)
+
+    def compile_per_request():
+        app.build_eco_agent_graph().invoke({"energy_data": energy_data})
+
+    def shared_graph():
+        app.run_eco_agent({"energy_data": energy_data})
+
+    app.rebuild_eco_agent_graph()
+    app.get_eco_agent_graph()
+    return {
+        "compile_per_request_ms": round(_time_per_call(compile_per_request, iterations), 3),
+        "shared_graph_ms": round(_time_per_call(shared_graph, iterations), 3),
+        "compile_only_ms": round(_time_per_call(app.build_eco_agent_graph, iterations), 3),
+    }
+
+
+# Usage profiles (hours/day) that land in each consumption category
+CATEGORY_PROFILES = {
+    "efficient": {"fan": 8, "lights": 5, "refrigerator": 24, "tv": 3},
+    "moderate": {"fan": 8, "lights": 5, "refrigerator": 24, "tv": 3, "ac": 4},
+    "excessive": {"fan": 8, "lights": 5, "refrigerator": 24, "tv": 3, "ac": 10},
+}
+
+
+def benchmark_llm_calls() -> dict:
+    """Run one session per category and mode, failing if any node exceeds its LLM call budget"""
+    calls = {}
+    for mode in app.GRAPH_BUILDERS:
+        for category, usage in CATEGORY_PROFILES.items():
+            app.reset_llm_call_counts()
+            result = app.run_eco_agent({"energy_data": create_energy_data_from_usage(usage, 7)}, mode=mode)
+            counts = app.get_llm_call_counts()
+            over_budget = app.llm_calls_over_budget(counts)
+            if result["category"] != category or over_budget:
+                raise AssertionError(f"{mode}/{category}: unexpected LLM calls {over_budget or counts}")
+            calls[f"{mode}/{category}"] = sum(counts.values())
+    return calls
+
+
+def benchmark_graph_modes(latency: float = 0.05, iterations: int = 5) -> dict:
+    """End-to-end latency of each graph mode with a fixed per-call LLM delay"""
+    energy_data = app.simulate_energy_data(7)
+    app.llm.latency = latency
+    try:
+        return {
+            f"{mode}_ms": round(_time_per_call(
+                lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode), iterations), 1)
+            for mode in app.GRAPH_BUILDERS
+        }
+    finally:
+        app.llm.latency = 0.0
+
+
+def benchmark_llm_cache(latency: float = 0.05) -> dict:
+    """Latency of a cold session versus an identical repeat served from the LLM cache"""
+    energy_data = create_energy_data_from_usage(CATEGORY_PROFILES["moderate"], 7)
+    app.llm.latency = latency
+    llm_cache.enabled = True
+    llm_cache.clear()
+    try:
+        cold = _time_per_call(lambda: app.run_eco_agent({"energy_data": energy_data}), 1)
+        warm = _time_per_call(lambda: app.run_eco_agent({"energy_data": energy_data}), 1)
+        return {"cold_ms": round(cold, 1), "warm_ms": round(warm, 1), "stats": llm_cache.stats()}
+    finally:
+        app.llm.latency = 0.0
+        llm_cache.enabled = False
+
+
+
+def benchmark_profile_cache(households: int = 300, jitter: float = 0.2) -> dict:
+    """LLM calls for households jittered around the category profiles, with and without bucketing"""
+    rng = random.Random(42)
+    payloads = []
+    for _ in range(households):
+        usage = rng.choice(list(CATEGORY_PROFILES.values()))
+        payloads.append({
+            appliance: max(0.0, round(hours + rng.uniform(-jitter, jitter), 2)) if appliance != "refrigerator" else hours
+            for appliance, hours in usage.items()
+        })
+
+    results = {}
+    for enabled in (False, True):
+        profile_cache.enabled = enabled
+        profile_cache.clear()
+        app.reset_llm_call_counts()
+        start = time.perf_counter()
+        for usage in payloads:
+            app.run_eco_agent({"energy_data": create_energy_data_from_usage(usage, 7)})
+        results["bucketed" if enabled else "exact"] = {
+            "llm_calls": sum(app.get_llm_call_counts().values()),
+            "ms_per_household": round((time.perf_counter() - start) * 1000 / households, 3),
+        }
+    results["bucketed"]["stats"] = profile_cache.stats()
+    profile_cache.enabled = False
+    return results
+
+
+
+def benchmark_single_call(latency: float = 0.05) -> dict:
+    """Prompt tokens and wall time of the multi-call graph versus single-call mode"""
+    energy_data = create_energy_data_from_usage(CATEGORY_PROFILES["excessive"], 7)
+    app.llm.latency = latency
+    results = {}
+    try:
+        for mode in ("sequential", "single_call"):
+            app.llm.prompts = []
+            elapsed = _time_per_call(lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode), 1)
+            result = app.run_eco_agent({"energy_data": energy_data}, mode=mode)
+            if result.get("single_call_error"):
+                raise AssertionError(result["single_call_error"])
+            prompts = app.llm.prompts[:len(app.llm.prompts) // 2]
+            results[mode] = {
+                "llm_calls": len(prompts),
+                "prompt_tokens": sum(estimate_tokens(prompt) for prompt in prompts),
+                "wall_ms": round(elapsed, 1),
+            }
+    finally:
+        app.llm.latency = 0.0
+    return results
+
+
+
+def benchmark_stream(latency: float = 0.05) -> dict:
+    """Time to first event and to completion for the streaming workflow"""
+    energy_data = create_energy_data_from_usage(CATEGORY_PROFILES["moderate"], 7)
+    app.llm.latency = latency
+    try:
+        start = time.perf_counter()
+        first_event = first_token = None
+        for event, _ in app.stream_eco_agent({"energy_data": energy_data}):
+            elapsed = (time.perf_counter() - start) * 1000
+            first_event = first_event if first_event is not None else elapsed
+            if event == "token" and first_token is None:
+                first_token = elapsed
+        return {
+            "first_event_ms": round(first_event, 1),
+            "first_token_ms": round(first_token, 1),
+            "complete_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    finally:
+        app.llm.latency = 0.0
+
+
+
+def benchmark_log_store(sessions: int = 5000, users: int = 100, iterations: int = 20) -> dict:
+    """Latest-10 and per-user query time for the JSON directory and SQLite log stores"""
+    logs = [
+        {
+            "id": str(uuid.uuid4()),
+            "timestamp": f"2026-01-01 00:00:{index:06d}",
+            "user_id": f"user_{index % users}",
+            "summary": {"avg_daily_kwh": 10.0},
+            "category": "moderate",
+        }
+        for index in range(sessions)
+    ]
+    json_store = JSONDirectoryLogStore("bench_logs")
+    for log in logs:
+        json_store.append(log)
+    sqlite_store = SQLiteLogStore("bench_logs/sessions.db")
+    sqlite_store.import_logs(logs)
+
+    results = {"sessions": sessions}
+    for name, store in (("json", json_store), ("sqlite", sqlite_store)):
+        results[name] = {
+            "latest_ms": round(_time_per_call(lambda: store.latest(10), iterations), 3),
+            "per_user_ms": round(_time_per_call(lambda: store.latest(10, "user_7"), iterations), 3),
+        }
+    return results
+
+
+
+def benchmark_simulate(households: int = 2000, days: int = 365) -> dict:
+    """Vectorized fleet simulation versus building the nested dict format"""
+    start = time.perf_counter()
+    batch = simulate_energy_batch(households, days, seed=1)
+    batch_ms = (time.perf_counter() - start) * 1000
+    sample = 20
+    dict_ms = _time_per_call(lambda: batch.household(0), sample)
+    return {
+        "households": households,
+        "days": days,
+        "batch_ms": round(batch_ms, 1),
+        "household_days_per_s": round(households * days / (batch_ms / 1000)),
+        "hours_array_mb": round(batch.hours.nbytes / 1e6, 1),
+        "dict_ms_per_household": round(dict_ms, 2),
+        "dict_ms_projected_fleet": round(dict_ms * households),
+    }
+
+
+
+def benchmark_validator(day_counts=(7, 90, 365), iterations: int = 50) -> dict:
+    """data_validator time for columnar EnergyData versus legacy nested-dict input"""
+    results = {}
+    for days in day_counts:
+        energy_data = simulate_energy_batch(1, days, seed=days).energy_data(0)
+        legacy = energy_data.to_dict()
+        results[f"{days}_days"] = {
+            "columnar_ms": round(_time_per_call(lambda: app.data_validator({"energy_data": energy_data}), iterations), 3),
+            "from_dict_ms": round(_time_per_call(lambda: app.data_validator({"energy_data": legacy}), iterations), 3),
+        }
+    return results
+
+
+def benchmark_usage(day_counts=(7, 365, 3650), iterations: int = 50) -> dict:
+    """Build and validation time and array memory for a usage profile as the period grows"""
+    usage = CATEGORY_PROFILES["moderate"]
+    results = {}
+    for days in day_counts:
+        energy_data = create_energy_data_from_usage(usage, days)
+        arrays = (energy_data.hours, energy_data.energy_kwh, energy_data.cost_rupees)
+        results[f"{days}_days"] = {
+            "build_ms": round(_time_per_call(lambda: create_energy_data_from_usage(usage, days), iterations), 3),
+            "validate_ms": round(_time_per_call(lambda: app.data_validator({"energy_data": energy_data}), iterations), 3),
+            "array_bytes": sum(array.base.nbytes if array.base is not None else array.nbytes for array in arrays),
+        }
+    return results
+
+
+def benchmark_batch(households: int = 1000, latency: float = 0.02, sample: int = 20) -> dict:
+    """Batch analysis with vectorized stages and deduplicated LLM calls versus one graph run per household"""
+    rng = random.Random(7)
+    payloads = []
+    for index in range(households):
+        usage = rng.choice(list(CATEGORY_PROFILES.values()))
+        payloads.append({
+            "id": f"household_{index}",
+            "usage": {appliance: max(0.0, hours + rng.choice((-0.5, 0.0, 0.5))) for appliance, hours in usage.items()},
+        })
+
+    energy_datas = [batch.household_energy_data(payload, payload["id"]) for payload in payloads]
+    vectorized_ms = _time_per_call(lambda: batch.run_deterministic_batch(energy_datas), 5)
+    per_household_ms = _time_per_call(
+        lambda: [app.run_deterministic_stages({"energy_data": energy_data}) for energy_data in energy_datas], 5
+    )
+
+    app.llm.latency = latency
+    try:
+        single_ms = _time_per_call(
+            lambda: app.run_eco_agent({"energy_data": create_energy_data_from_usage(rng.choice(payloads)["usage"], 7)}),
+            sample
+        )
+        analysis = batch.BatchAnalysis(payloads)
+        start = time.perf_counter()
+        failed = [state["error"] for _, _, state in analysis if "error" in state]
+        batch_ms = (time.perf_counter() - start) * 1000
+    finally:
+        app.llm.latency = 0.0
+    if failed:
+        raise AssertionError(failed[0])
+    return {
+        "households": households,
+        "deterministic_vectorized_ms": round(vectorized_ms, 1),
+        "deterministic_per_household_ms": round(per_household_ms, 1),
+        "per_household_projected_ms": round(single_ms * households),
+        "batch_ms": round(batch_ms),
+        "stats": analysis.stats(),
+    }
+
+
+def benchmark_wastage(households: int = 5000, days: int = 365, iterations: int = 3) -> dict:
+    """Household-days per second for the built-in and example wastage rule sets"""
+    fleet = simulate_energy_batch(households, days, seed=3)
+    energy, cost = fleet.energy_kwh, fleet.cost_rupees
+    sample = [fleet.energy_data(index) for index in range(50)]
+    results = {"households": households, "days": days}
+    rule_sets = {
+        "builtin": WastageRules(DEFAULT_WASTAGE_RULES),
+        "example": load_wastage_rules(os.path.join(os.path.dirname(os.path.abspath(__file__)), "wastage_rules.example.json")),
+    }
+    for name, rules in rule_sets.items():
+        batch_ms = _time_per_call(lambda: rules.evaluate(fleet.hours, energy, cost, fleet.appliances), iterations)
+        per_household_ms = _time_per_call(lambda: [rules.detect(energy_data) for energy_data in sample], 1) / len(sample)
+        results[name] = {
+            "rules": len(rules.rules),
+            "batch_ms": round(batch_ms, 1),
+            "household_days_per_s": round(households * days / (batch_ms / 1000)),
+            "per_household_detect_ms": round(per_household_ms, 3),
+        }
+    return results
+
+
+def _meter_csv_lines(users: int, days: int):
+    """Yield CSV lines of 15-minute readings for every user and appliance, without building a list"""
+    yield "user_id,timestamp,appliance,kwh\n"
+    start = datetime(2024, 1, 1)
+    for interval in range(days * 96):
+        timestamp = (start + timedelta(minutes=15 * interval)).isoformat()
+        for user in range(users):
+            for appliance, watts in APPLIANCE_POWER.items():
+                yield f"meter_{user},{timestamp},{appliance},{watts / 4000:.5f}\n"
+
+
+def benchmark_meter(users: int = 10, day_counts=(7, 28)) -> dict:
+    """Readings per second and peak memory when folding 15-minute readings into daily aggregates"""
+    results = {}
+    for days in day_counts:
+        aggregator = MeterAggregator()
+        start = time.perf_counter()
+        counts = ingest_stream(_meter_csv_lines(users, days), "csv", aggregator)
+        elapsed = time.perf_counter() - start
+        # Traced separately, since tracing slows every allocation
+        tracemalloc.start()
+        ingest_stream(_meter_csv_lines(users, days), "csv", MeterAggregator())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        analyze_ms = _time_per_call(lambda: app.run_deterministic_stages({"energy_data": aggregator.energy_data("meter_0")}), 20)
+        results[f"{days}_days"] = {
+            "readings": counts["accepted"],
+            "readings_per_s": round(counts["accepted"] / elapsed),
+            "peak_memory_kb": round(peak / 1024),
+            "deterministic_stages_ms": round(analyze_ms, 3),
+        }
+    return results
+
+
+def benchmark_incremental(history_days: int = 365, appends: int = 30, latency: float = 0.02) -> dict:
+    """Daily updates appended incrementally versus re-analyzing the full history each day"""
+    rng = random.Random(11)
+    profile = CATEGORY_PROFILES["moderate"]
+    daily = [{appliance: max(0.0, hours + rng.uniform(-0.5, 0.5)) for appliance, hours in profile.items()}
+             for _ in range(history_days + appends)]
+    history = {appliance: [day[appliance] for day in daily[:history_days]] for appliance in profile}
+
+    analyzer = IncrementalAnalyzer(UserStateStore(os.path.join(os.getcwd(), "user_state.db")))
+    results = {"history_days": history_days, "appends": appends}
+    app.llm.latency = latency
+    try:
+        analyzer.append("bench_user", history, history_days)
+        app.reset_llm_call_counts()
+        start = time.perf_counter()
+        for day in daily[history_days:]:
+            analyzer.append("bench_user", {appliance: [hours] for appliance, hours in day.items()}, 1)
+        results["incremental"] = {
+            "ms_per_day": round((time.perf_counter() - start) * 1000 / appends, 2),
+            "llm_calls": sum(app.get_llm_call_counts().values()),
+        }
+
+        app.reset_llm_call_counts()
+        start = time.perf_counter()
+        for end in range(history_days + 1, history_days + appends + 1):
+            usage = {appliance: [day[appliance] for day in daily[:end]] for appliance in profile}
+            app.run_eco_agent({"energy_data": EnergyData.from_usage(usage, end, "bench_user")}, "sequential")
+        results["full_rerun"] = {
+            "ms_per_day": round((time.perf_counter() - start) * 1000 / appends, 2),
+            "llm_calls": sum(app.get_llm_call_counts().values()),
+        }
+    finally:
+        app.llm.latency = 0.0
+    results["stats"] = analyzer.stats()
+    return results
+
+
+# Modules that must not be loaded just by importing the web app
+LAZY_MODULES = ("langgraph", "langchain_core", "langchain_google_genai", "google.genai")
+
+
+def _import_report(module: str) -> dict:
+    """Import a module in a fresh interpreter; return wall time, slowest imports and lazy modules loaded"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"lazy = sorted({{name.split('.')[0] for name in sys.modules if name.startswith({LAZY_MODULES!r})}})\n"
+        "print(json.dumps({'ms': elapsed * 1000, 'lazy_loaded': lazy}))\n"
+    )
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    env.pop("ECOAGENT_WARMUP", None)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                               capture_output=True, text=True, env=env, check=True)
+    # -X importtime writes "self | cumulative | name" lines to stderr, with
+    # names indented two spaces per nesting level; keep the module's direct imports
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2][1:]
+            if name.startswith("  ") and not name.startswith("   "):
+                cumulative[name.strip()] = int(parts[1]) / 1000
+    report = json.loads(completed.stdout.splitlines()[-1])
+    report["slowest_imports_ms"] = {name: round(ms, 1) for name, ms in sorted(cumulative.items(), key=lambda item: -item[1])[:5]}
+    report["ms"] = round(report["ms"], 1)
+    return report
+
+
+def _cache_hit_report() -> dict:
+    """Serve a warm LLM cache hit in a fresh interpreter on the Gemini backend; return lazy modules loaded"""
+    code = (
+        "import json, sys, time\n"
+        "import app\n"
+        "from llm_backends import llm_identity\n"
+        "from llm_cache import llm_cache, make_cache_key\n"
+        "prompt = 'Analyze this data'\n"
+        "llm_cache.set(make_cache_key(*llm_identity(), prompt), 'cached')\n"
+        "start = time.perf_counter()\n"
+        "response = app.invoke_llm(prompt, 'usage_pattern_analyzer')\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"lazy = sorted({{name.split('.')[0] for name in sys.modules if name.startswith({LAZY_MODULES!r})}})\n"
+        "print(json.dumps({'ms': elapsed * 1000, 'hit': response.content == 'cached', 'lazy_loaded': lazy}))\n"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__)),
+               "ECOAGENT_LLM_BACKEND": "gemini", "ECOAGENT_LLM_CACHE": "on",
+               "ECOAGENT_LLM_CACHE_PATH": os.path.join(directory, "llm_responses.db")}
+        env.pop("ECOAGENT_WARMUP", None)
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                   env=env, cwd=directory, check=True)
+    report = json.loads(completed.stdout.splitlines()[-1])
+    report["ms"] = round(report["ms"], 3)
+    return report
+
+
+def benchmark_startup(iterations: int = 3) -> dict:
+    """Import time of the web app in a fresh interpreter, failing if the LLM stack loads eagerly or on a cache hit"""
+    results = {}
+    for module in ("app", "connect"):
+        reports = [_import_report(module) for _ in range(iterations)]
+        if reports[0]["lazy_loaded"]:
+            raise AssertionError(f"import {module} loaded {reports[0]['lazy_loaded']} eagerly")
+        results[module] = {
+            "best_ms": min(report["ms"] for report in reports),
+            "slowest_imports_ms": reports[-1]["slowest_imports_ms"],
+        }
+    cache_hit = _cache_hit_report()
+    if not cache_hit["hit"] or cache_hit["lazy_loaded"]:
+        raise AssertionError(f"a warm LLM cache hit loaded {cache_hit['lazy_loaded']} (hit: {cache_hit['hit']})")
+    results["cache_hit_ms"] = cache_hit["ms"]
+    app.rebuild_eco_agent_graph()
+    start = time.perf_counter()
+    app.warm_up(list(app.GRAPH_BUILDERS), create_llm=False)
+    results["warm_up_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return results
+
+
+def benchmark_fake_llm(sessions: int = 64, latency: str = "lognormal:0.05:0.5",
+                       failure_rate: float = 0.05, concurrency_levels=(1, 8, 32)) -> dict:
+    """Session throughput by concurrency under a latency distribution, and failures surviving retries at a set failure rate"""
+    payloads = [{"energy_data": create_energy_data_from_usage(usage, 7)}
+                for usage in list(CATEGORY_PROFILES.values()) * (sessions // len(CATEGORY_PROFILES) + 1)][:sessions]
+    model = app.llm
+    results = {"sessions": sessions, "latency": latency}
+    try:
+        app.llm = FakeLLM(latency, seed=1)
+        for workers in concurrency_levels:
+            durations = []
+
+            def run(payload):
+                start = time.perf_counter()
+                app.run_eco_agent(dict(payload), "sequential")
+                durations.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(run, payloads))
+            elapsed = time.perf_counter() - start
+            durations.sort()
+            results[f"{workers}_workers"] = {
+                "sessions_per_s": round(sessions / elapsed, 1),
+                "p50_ms": round(durations[len(durations) // 2] * 1000, 1),
+                "p95_ms": round(durations[int(len(durations) * 0.95)] * 1000, 1),
+            }
+
+        app.llm = FakeLLM(0.0, failure_rate=failure_rate, seed=1)
+        failed = 0
+        for payload in payloads:
+            try:
+                app.run_eco_agent(dict(payload), "sequential")
+            except Exception:
+                failed += 1
+        results["failures"] = {"failure_rate": failure_rate, "failed_sessions": failed, **app.llm.stats()}
+    finally:
+        app.llm = model
+    return results
+
+
+def benchmark_stages(day_counts=(7, 30, 365), iterations: int = 100) -> dict:
+    """Per-call latency of data preparation and the deterministic stages as the period grows"""
+    usage = CATEGORY_PROFILES["excessive"]
+    results = {}
+    for days in day_counts:
+        energy_data = simulate_energy_batch(1, days, seed=days).energy_data(0)
+        state = app.data_validator({"energy_data": energy_data})
+        results[f"{days}_days"] = {
+            "simulate_energy_data": _latency_percentiles(lambda: app.simulate_energy_data(days), iterations),
+            "create_energy_data_from_usage": _latency_percentiles(lambda: create_energy_data_from_usage(usage, days), iterations),
+            "data_validator": _latency_percentiles(lambda: app.data_validator({"energy_data": energy_data}), iterations),
+            "wastage_detector": _latency_percentiles(lambda: app.wastage_detector(dict(state)), iterations),
+        }
+    return results
+
+
+def benchmark_e2e(latency: str = "lognormal:0.05:0.5", iterations: int = 30) -> dict:
+    """run_eco_agent latency per graph mode, alone and with a distribution of LLM delays"""
+    energy_data = app.simulate_energy_data(7)
+    results = {"llm_latency": latency}
+    # Graph compilation is a one-off cost, measured by the graph and startup benchmarks
+    app.warm_up(list(app.GRAPH_BUILDERS), create_llm=False)
+    try:
+        for mode in app.GRAPH_BUILDERS:
+            run = lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode)
+            app.llm.latency = 0.0
+            overhead = _latency_percentiles(run, iterations)
+            app.llm.latency = latency
+            results[mode] = {"graph_overhead": overhead, "with_llm": _latency_percentiles(run, iterations)}
+    finally:
+        app.llm.latency = 0.0
+    return results
+
+
+def benchmark_http(duration: float = 5.0, concurrency: int = 8, latency: str = "lognormal:0.05:0.5") -> dict:
+    """Requests per second and latency percentiles for the API over HTTP, against an in-process server"""
+    result = run_local_load(list(LOAD_ENDPOINTS), latency, concurrency=concurrency, duration=duration)
+    return {"concurrency": concurrency, "llm_latency": latency, "endpoints": result["endpoints"], "total": result["total"]}
+
+
+def benchmark_tracing(iterations: int = 50) -> dict:
+    """Graph overhead per mode with and without tracing, and the spans each traced session logs"""
+    energy_data = app.simulate_energy_data(7)
+    app.warm_up(list(app.GRAPH_BUILDERS), create_llm=False)
+    app.llm.latency = 0.0
+    results = {}
+    try:
+        for mode in app.GRAPH_BUILDERS:
+            run = lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode)
+            tracing.TRACING_ENABLED = False
+            untraced = _latency_percentiles(run, iterations)
+            tracing.TRACING_ENABLED = True
+            traced = _latency_percentiles(run, iterations)
+            trace = app.get_log_store().latest(1)[0]["trace"]
+            results[mode] = {
+                "untraced": untraced,
+                "traced": traced,
+                "overhead_p50_ms": round(traced["p50_ms"] - untraced["p50_ms"], 3),
+                "spans": len(trace["nodes"]),
+                "traced_llm_calls": trace["llm_calls"],
+                "prompt_tokens": trace["prompt_tokens"]
+            }
+    finally:
+        tracing.TRACING_ENABLED = True
+    results["metrics_render_ms"] = round(_time_per_call(tracing.metrics.render, iterations), 3)
+    return results
+
+
+def benchmark_governor(calls: int = 400, workers: int = 16, latency: str = "lognormal:0.05:0.8",
+                       failure_rate: float = 0.05, rate_limit: float = 50.0) -> dict:
+    """Tail latency and errors for direct LLM calls versus retries and hedging, and rate limit accuracy"""
+    prompts = [f"Analyze this data: household {i}" for i in range(calls)]
+
+    def measure(governor, model):
+        durations, errors = [], 0
+
+        def call(prompt):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                governor.invoke(model, prompt) if governor else model.invoke(prompt)
+            except Exception:
+                errors += 1
+            durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(call, prompts))
+        elapsed = time.perf_counter() - start
+        durations.sort()
+        result = {
+            "calls_per_s": round(calls / elapsed, 1),
+            "p50_ms": round(percentile(durations, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(durations, 0.99) * 1000, 1),
+            "errors": errors
+        }
+        if governor:
+            result["governor"] = governor.stats()
+        return result
+
+    policies = {
+        "direct": None,
+        "retries": LLMGovernor(max_in_flight=workers * 2, attempt_timeout=1.0, retries=2, backoff=0.02),
+        "retries_hedged": LLMGovernor(max_in_flight=workers * 2, attempt_timeout=1.0, retries=2, backoff=0.02, hedge="p95")
+    }
+    results = {"latency": latency, "failure_rate": failure_rate, "workers": workers}
+    for name, governor in policies.items():
+        results[name] = measure(governor, FakeLLM(latency, failure_rate=failure_rate, seed=1))
+
+    limited = LLMGovernor(rate=rate_limit, burst=1, max_in_flight=workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda prompt: limited.invoke(FakeLLM(), prompt), prompts[:100]))
+    results["rate_limit"] = {"limit_per_s": rate_limit, "achieved_per_s": round(100 / (time.perf_counter() - start), 1)}
+    return results
+
+
+# A pattern analysis of the length and shape Gemini returns, quoted by the
+# recommendation prompts
+SAMPLE_PATTERN_ANALYSIS = """**Overall Assessment:** Consumption of 22.7 kWh/day is well above the typical 8-15 kWh/day for an Indian household, and the monthly bill of about ₹4,400 reflects this.
+
+**Top 3 Energy Consumers:**
+1. **Air conditioner** - 408.5 kWh (60% of total). Running it over 9 hours a day is the single largest cost.
+2. **Refrigerator** - 108.0 kWh. Continuous operation is expected, but an older model may be drawing more than necessary.
+3. **Water heater** - 74.3 kWh. Over 2 hours a day suggests it is left on after use.
+
+**Unusual Patterns or Wastage:**
+- The fan runs nearly 12 hours a day, often alongside the AC.
+- Lights average almost 6 hours a day, which points to rooms left lit when empty.
+- Microwave use is higher than typical for reheating.
+
+**Efficiency Rating:** Poor. Cooling dominates consumption, and several appliances run longer than needed.
+
+Focus first on AC set points and timers, then on the water heater schedule."""
+
+
+def benchmark_prompts(day_counts=(7, 365)) -> dict:
+    """Estimated prompt tokens per node with verbose versus compacted context, against each node's budget"""
+    results = {}
+    try:
+        for category, usage in CATEGORY_PROFILES.items():
+            for days in day_counts:
+                state = app.run_deterministic_stages({"energy_data": create_energy_data_from_usage(usage, days)})
+                state["pattern_analysis"] = SAMPLE_PATTERN_ANALYSIS
+                recommendation_prompt, recommendation_node = app.RECOMMENDATION_PROMPTS[state["category"]]
+                builders = {
+                    "usage_pattern_analyzer": app.usage_pattern_prompt,
+                    recommendation_node: recommendation_prompt,
+                    "smart_suggestions": app.smart_suggestions_prompt,
+                    "action_plan": app.action_plan_prompt,
+                    "single_call_advisor": app.single_call_prompt,
+                }
+                nodes = {}
+                for node, build in builders.items():
+                    prompt_context.PROMPT_COMPACTION = False
+                    before = estimate_tokens(build(state))
+                    prompt_context.PROMPT_COMPACTION = True
+                    after = estimate_tokens(build(state))
+                    nodes[node] = {"before": before, "after": after, "budget": PROMPT_TOKEN_BUDGET[node]}
+                multi_call = [node for node in nodes if node != "single_call_advisor"]
+                before = sum(nodes[node]["before"] for node in multi_call)
+                after = sum(nodes[node]["after"] for node in multi_call)
+                nodes["session"] = {"before": before, "after": after, "saved_pct": round((before - after) * 100 / before, 1)}
+                results[f"{category}/{days}_days"] = nodes
+    finally:
+        prompt_context.PROMPT_COMPACTION = True
+    return results
+
+
+class _FailingLLM:
+    """Wraps a model so that call number `fail_at` raises, as a provider outage mid-session would"""
+
+    def __init__(self, model, fail_at: int):
+        self.model = model
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("Simulated LLM outage")
+        return self.model.invoke(prompt)
+
+
+def benchmark_checkpoints(latency: float = 0.05, iterations: int = 30) -> dict:
+    """Graph overhead of runs without and with a session id, and the LLM calls a failed session repeats on retry"""
+    energy_data = app.simulate_energy_data(7)
+    model, retries = app.llm, app.llm_governor.retries
+    results = {}
+    try:
+        for mode in app.GRAPH_BUILDERS:
+            run = lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode)
+            app.llm.latency = 0.0
+            plain = _latency_percentiles(run, iterations)
+            checkpointed = _latency_percentiles(
+                lambda: app.run_eco_agent({"energy_data": energy_data}, mode=mode, session_id=uuid.uuid4().hex),
+                iterations
+            )
+
+            # Fail the session's last LLM call, then retry it as a new session and as a resumed one
+            app.llm.latency = latency
+            app.llm_governor.retries = 0
+            app.llm = _FailingLLM(model, fail_at=0)
+            run()
+            calls = app.llm.calls
+            retry = {"session_llm_calls": calls}
+            for name in ("restart", "resume"):
+                session_id = uuid.uuid4().hex
+                app.llm = _FailingLLM(model, fail_at=calls)
+                try:
+                    app.run_eco_agent({"energy_data": energy_data}, mode=mode, session_id=session_id)
+                except RuntimeError:
+                    pass
+                app.llm.fail_at = 0
+                app.llm.calls = 0
+                start = time.perf_counter()
+                app.run_eco_agent({"energy_data": energy_data}, mode=mode,
+                                  session_id=session_id if name == "resume" else uuid.uuid4().hex)
+                retry[name] = {"llm_calls": app.llm.calls, "wall_ms": round((time.perf_counter() - start) * 1000, 1)}
+            start = time.perf_counter()
+            app.run_eco_agent({"energy_data": energy_data}, mode=mode, session_id=session_id)
+            retry["replay_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            app.llm = model
+            app.llm_governor.retries = retries
+            app.llm.latency = 0.0
+            results[mode] = {
+                "uncheckpointed": plain,
+                "checkpointed": checkpointed,
+                "overhead_p50_ms": round(checkpointed["p50_ms"] - plain["p50_ms"], 3),
+                "retry_after_failure": retry
+            }
+        results["store"] = app.get_checkpoint_stats()
+    finally:
+        app.llm = model
+        app.llm.latency = 0.0
+        app.llm_governor.retries = retries
+    return results
+
+
+def _synthetic_session_logs(sessions: int, seed: int = 0) -> list:
+    """Session logs with lognormal daily kWh spread over 60 days, categorized as the router would"""
+    rng = random.Random(seed)
+    rules = [rule["id"] for rule in DEFAULT_WASTAGE_RULES]
+    start = datetime(2026, 1, 1)
+    logs = []
+    for index in range(sessions):
+        daily_kwh = round(rng.lognormvariate(2.3, 0.6), 2)
+        category = ("efficient" if daily_kwh <= app.EFFICIENT_MAX_DAILY_KWH
+                    else "moderate" if daily_kwh <= app.MODERATE_MAX_DAILY_KWH else "excessive")
+        logs.append({
+            "id": str(uuid.uuid4()),
+            "timestamp": str(start + timedelta(seconds=index * 60 * 86400 / sessions)),
+            "user_id": f"user_{index}",
+            "summary": {"avg_daily_kwh": daily_kwh, "avg_daily_cost": round(daily_kwh * 6.5, 2)},
+            "category": category,
+            "wastage_rules": rng.sample(rules, rng.randint(0, 2)),
+        })
+    return logs
+
+
+def benchmark_analytics(session_counts=(1000, 20000), iterations: int = 20) -> dict:
+    """Rollup update cost, and benchmark query time from rollups versus scanning the logs as history grows"""
+    results = {}
+    for sessions in session_counts:
+        logs = _synthetic_session_logs(sessions)
+        rollups = CohortRollups(f"bench_analytics_{sessions}.db")
+        start = time.perf_counter()
+        for log in logs[:500]:
+            rollups.record(log)
+        record_ms = (time.perf_counter() - start) * 1000 / 500
+        rollups.record_many(logs[500:])
+        store = SQLiteLogStore(f"bench_analytics_{sessions}_logs.db")
+        store.import_logs(logs)
+
+        def scan():
+            kwh = sorted(log["summary"]["avg_daily_kwh"] for log in store.iter_all())
+            return [percentile(kwh, q) for q in QUANTILES]
+
+        exact = scan()
+        sketched = rollups.cohorts()["all"]["daily_kwh"]
+        results[f"{sessions}_sessions"] = {
+            "record_ms": round(record_ms, 3),
+            "benchmarks_ms": round(_time_per_call(rollups.benchmarks, iterations), 3),
+            "compare_ms": round(_time_per_call(lambda: rollups.cohorts(12.0), iterations), 3),
+            "log_scan_ms": round(_time_per_call(scan, max(iterations // 4, 1)), 3),
+            "max_relative_error": round(max(abs(sketched[f"p{round(q * 100)}"] - value) / value
+                                            for q, value in zip(QUANTILES, exact)), 4),
+            "sketch_buckets": rollups.stats()["sketch_buckets"]
+        }
+    return results
+
+
+BENCHMARKS = {
+    "graph": benchmark_graph,
+    "llm_calls": benchmark_llm_calls,
+    "graph_modes": benchmark_graph_modes,
+    "llm_cache": benchmark_llm_cache,
+    "profile_cache": benchmark_profile_cache,
+    "single_call": benchmark_single_call,
+    "stream": benchmark_stream,
+    "log_store": benchmark_log_store,
+    "simulate": benchmark_simulate,
+    "validator": benchmark_validator,
+    "usage": benchmark_usage,
+    "batch": benchmark_batch,
+    "wastage": benchmark_wastage,
+    "meter": benchmark_meter,
+    "incremental": benchmark_incremental,
+    "startup": benchmark_startup,
+    "fake_llm": benchmark_fake_llm,
+    "stages": benchmark_stages,
+    "e2e": benchmark_e2e,
+    "http": benchmark_http,
+    "tracing": benchmark_tracing,
+    "governor": benchmark_governor,
+    "prompts": benchmark_prompts,
+    "checkpoints": benchmark_checkpoints,
+    "analytics": benchmark_analytics,
+}
+
+
+def _flatten(result, prefix: str = "") -> dict:
+    """Numeric leaves of a nested result as {"a.b.c": value}"""
+    if isinstance(result, dict):
+        flat = {}
+        for key, value in result.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        return flat
+    if isinstance(result, (int, float)) and not isinstance(result, bool):
+        return {prefix[:-1]: result}
+    return {}
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.2) -> list:
+    """Describe timings that rose, or throughputs that fell, by more than `threshold` versus a baseline"""
+    before, after = _flatten(baseline), _flatten(current)
+    regressions = []
+    for metric, value in after.items():
+        previous = before.get(metric)
+        if not previous:
+            continue
+        change = (value - previous) / previous
+        if metric.endswith("_ms") and change > threshold or metric.endswith(("_per_s", "rps")) and change < -threshold:
+            regressions.append(f"{metric}: {previous} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the EcoAgent pipeline")
+    parser.add_argument("names", nargs="*", metavar="benchmark", help=f"Any of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    output = os.path.abspath(args.json) if args.json else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    app.llm = FakeLLM(record_prompts=True)
+    # Benchmarks other than llm_cache measure uncached execution
+    llm_cache.enabled = False
+    # Keep session logs written by usage_logger out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="ecoagent_bench_"))
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name]()
+        print(f"{name}: {results[name]}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+    if baseline is not None:
+        regressions = compare_results({name: baseline[name] for name in results if name in baseline}, results, args.threshold)
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} versus {args.compare}")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,283 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    get_checkpoint_id, get_checkpoint_metadata, writes_sort_key
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from energy_data import EnergyData
+
+# Graph Checkpoint Configuration
+# This module imports LangGraph, so app.py only loads it when a graph is compiled
+CHECKPOINTING = os.getenv("ECOAGENT_CHECKPOINTING", "on").lower() not in ("0", "off", "false", "no")
+CHECKPOINT_PATH = os.getenv("ECOAGENT_CHECKPOINT_PATH", "energy_cache/checkpoints.db")
+
+# Seconds a session's checkpoints are kept after its last write
+CHECKPOINT_TTL = float(os.getenv("ECOAGENT_CHECKPOINT_TTL", "86400"))
+
+# Expired sessions are swept every this many checkpoint writes
+CHECKPOINT_SWEEP_INTERVAL = 500
+
+_ENERGY_DATA_TAG = "__energy_data__"
+
+def _encode(value: Any) -> Any:
+    """Replace EnergyData inside a state with a tagged dict of its fields and raw float64 matrices"""
+    if isinstance(value, EnergyData):
+        shape = list(value.hours.shape)
+        return {_ENERGY_DATA_TAG: {
+            "user_id": value.user_id, "period": value.period, "dates": value.dates,
+            "appliances": value.appliances, "shape": shape,
+            "hours": np.ascontiguousarray(value.hours).tobytes(),
+            "energy_kwh": np.ascontiguousarray(value.energy_kwh).tobytes(),
+            "cost_rupees": np.ascontiguousarray(value.cost_rupees).tobytes()
+        }}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_encode(item) for item in value)
+    return value
+
+def _decode(value: Any) -> Any:
+    """Rebuild EnergyData from the tagged dicts written by _encode"""
+    if isinstance(value, dict):
+        fields = value.get(_ENERGY_DATA_TAG)
+        if fields is not None and len(value) == 1:
+            shape = tuple(fields["shape"])
+            matrices = [np.frombuffer(fields[name], dtype=np.float64).reshape(shape)
+                        for name in ("hours", "energy_kwh", "cost_rupees")]
+            return EnergyData(fields["user_id"], fields["dates"], fields["appliances"], *matrices, period=fields["period"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_decode(item) for item in value)
+    return value
+
+class StateSerializer(JsonPlusSerializer):
+    """LangGraph's serializer, extended to round-trip EnergyData exactly"""
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return super().dumps_typed(_encode(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return _decode(super().loads_typed(data))
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpoint store in a local SQLite database
+
+    Like the other SQLite stores, the database is opened on first use and
+    a single connection is shared between threads behind a lock. Each
+    checkpoint is stored whole, with its channel values, next to the
+    pending writes of the step that follows it. Threads not written to for
+    `ttl` seconds are deleted.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH, ttl: float = CHECKPOINT_TTL):
+        super().__init__(serde=StateSerializer())
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, "
+                "parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL, "
+                "metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS writes ("
+                "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, "
+                "task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT NOT NULL, "
+                "value BLOB NOT NULL, task_path TEXT NOT NULL, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated_at)")
+        return self._conn
+
+    def _tuple(self, conn: sqlite3.Connection, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        writes.sort(key=lambda write: writes_sort_key(write[5], write[0], write[1]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                             "checkpoint_id": parent_id}} if parent_id else None),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, _, channel, value_type, value, _ in writes]
+        )
+
+    def get_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
+        """Return the checkpoint named by config, or the thread's latest one"""
+        configurable = config["configurable"]
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        params = [configurable["thread_id"], configurable.get("checkpoint_ns", "")]
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(query, params).fetchone()
+            return self._tuple(conn, row) if row else None
+
+    def list(self, config: Optional[Dict[str, Any]], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Yield checkpoints newest first, optionally for one thread, before a checkpoint or matching metadata"""
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints WHERE 1 = 1")
+        params = []
+        if config:
+            configurable = config["configurable"]
+            query += " AND thread_id = ?"
+            params.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params.append(get_checkpoint_id(before))
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(query, params).fetchall()
+            tuples = []
+            for row in rows:
+                if limit is not None and len(tuples) >= limit:
+                    break
+                checkpoint = self._tuple(conn, row)
+                if filter and any(checkpoint.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                tuples.append(checkpoint)
+        yield from tuples
+
+    def put(self, config: Dict[str, Any], checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> Dict[str, Any]:
+        """Store a checkpoint with its channel values"""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        type_, value = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_value = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                 type_, value, metadata_type, metadata_value, time.time())
+            )
+            conn.commit()
+            self._puts += 1
+            sweep = self._puts % CHECKPOINT_SWEEP_INTERVAL == 0
+        if sweep:
+            self.delete_expired()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: Dict[str, Any], writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """Store the writes a task made after a checkpoint
+
+        Special writes (errors, interrupts) replace earlier ones from the same
+        task; ordinary writes are kept from the first attempt.
+        """
+        configurable = config["configurable"]
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, index)
+            rows.append((idx < 0, (configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                                   configurable["checkpoint_id"], task_id, idx, channel,
+                                   *self.serde.dumps_typed(value), task_path)))
+        with self._lock:
+            conn = self._connect()
+            for replace, row in rows:
+                conn.execute(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint and write of a thread"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            conn.commit()
+
+    def delete_expired(self) -> int:
+        """Delete threads not written to within the TTL; returns how many were removed"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            conn = self._connect()
+            expired = [row[0] for row in conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?", (cutoff,)
+            )]
+            for thread_id in expired:
+                conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            conn.commit()
+        return len(expired)
+
+    def threads(self, prefix: str) -> List[str]:
+        """Return the thread ids starting with prefix"""
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            return [row[0] for row in self._connect().execute(
+                "SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id LIKE ? ESCAPE '\\'", (pattern,)
+            )]
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Same scheme as LangGraph's own savers: an increasing counter plus a random tiebreak
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def stats(self) -> Dict[str, Any]:
+        """Return stored thread and checkpoint counts"""
+        with self._lock:
+            threads, checkpoints = self._connect().execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+            ).fetchone()
+        return {"threads": threads, "checkpoints": checkpoints, "ttl_s": self.ttl}
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer() -> Optional[SQLiteCheckpointSaver]:
+    """Return the shared checkpoint store, or None when checkpointing is off"""
+    global _checkpointer
+    if not CHECKPOINTING:
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SQLiteCheckpointSaver()
+    return _checkpointer
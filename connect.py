@@ -1,12 +1,39 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
+import io
 import os
 import json
+import uuid
+import hashlib
 from datetime import datetime
-from app import run_eco_agent, simulate_energy_data, APPLIANCE_POWER, ENERGY_COST_PER_KWH
+from app import (run_eco_agent, stream_eco_agent, warm_up, get_llm_stats, get_session, get_checkpoint_stats,
+                 SessionMismatchError, APPLIANCE_POWER, ENERGY_COST_PER_KWH)
+from analytics import cohort_rollups
+from batch import BatchAnalysis, BATCH_MAX_HOUSEHOLDS
+from energy_data import EnergyData, simulate_energy_batch
+from jobs import job_queue, QueueFullError, SingleFlight
+from llm_cache import llm_cache
+from log_store import get_log_store
+from meter_ingest import meter_aggregator, ingest_stream
+from incremental import incremental_analyzer
+from profile_cache import profile_cache
+from tracing import metrics
 app = Flask(__name__)
 CORS(app)
 
+# Identical analysis requests in flight at the same time share one graph run
+analysis_flight = SingleFlight()
+
+# Most session logs returned by one /api/logs request
+LOGS_MAX_LIMIT = 1000
+
+# Startup warm-up: "full" compiles the graph and creates the LLM client at
+# import, "preload" only compiles the graph (for servers that import the app
+# once and then fork workers); by default both wait for the first analysis
+APP_WARMUP = os.getenv("ECOAGENT_WARMUP", "off").lower()
+if APP_WARMUP in ("full", "preload"):
+    warm_up(create_llm=APP_WARMUP == "full")
+
 @app.route('/')
 def index():
     """Serve the main web interface"""
@@ -30,90 +57,291 @@ def analyze_usage():
             return jsonify({'error': 'No usage data provided'}), 400
         
         usage_data = data['usage']
-        days = data.get('days', 7)
-        
-        # Create energy data structure
+        days = request_days(data)
         energy_data = create_energy_data_from_usage(usage_data, days)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    try:
+        # Run the EcoAgent analysis, coalescing identical concurrent requests.
+        # Every run is checkpointed under a session_id, the client's or one the
+        # server generates; sending it again after a failure resumes the run
+        response = coalesced_analysis(energy_data, usage_data, days, data.get('session_id'))
         
-        # Run the EcoAgent analysis
-        result = run_eco_agent({'energy_data': energy_data})
+        return jsonify(response)
         
-        # Format response for frontend
-        response = {
-            'success': True,
-            'analysis': {
-                'summary': result['summary'],
-                'category': result['category'],
-                'pattern_analysis': result['pattern_analysis'],
-                'recommendation': result['recommendation'],
-                'wastage_issues': result.get('wastage_issues', []),
-                'smart_suggestions': result['smart_suggestions'],
-                'action_plan': result['action_plan'],
-                'appliance_breakdown': result['appliance_totals']
-            }
-        }
+    except SessionMismatchError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e), 'session_id': getattr(e, 'session_id', None)}), 500
+
+def analyze_energy_data(energy_data, session_id=None):
+    """Run the EcoAgent analysis and format the response for the frontend"""
+    return format_analysis(run_eco_agent({'energy_data': energy_data}, session_id=session_id))
+
+def format_analysis(result):
+    """Format a finished workflow state for the frontend"""
+    return {
+        'success': True,
+        'analysis': {
+            'summary': result['summary'],
+            'category': result['category'],
+            'pattern_analysis': result['pattern_analysis'],
+            'recommendation': result['recommendation'],
+            'wastage_issues': result.get('wastage_issues', []),
+            'smart_suggestions': result['smart_suggestions'],
+            'action_plan': result['action_plan'],
+            'appliance_breakdown': result['appliance_totals']
+        },
+        'session': result.get('session')
+    }
+
+def analysis_request_key(usage_data, days):
+    """Canonical hash of an analysis request, ignoring key order, int/float spelling and unknown appliances"""
+    canonical = {
+        'usage': {
+            appliance: [float(value) for value in hours] if isinstance(hours, list) else float(hours)
+            for appliance, hours in usage_data.items() if appliance in APPLIANCE_POWER
+        },
+        'days': int(days)
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()
+
+def coalesced_analysis(energy_data, usage_data, days, session_id=None):
+    """Analyze usage, sharing one graph execution among identical concurrent requests for the same session
+
+    energy_data is built from usage_data by the caller, so invalid input is
+    rejected before a request joins or starts a flight. Without a session_id
+    the flight generates one, so requests sharing it share the session too.
+    """
+    key = analysis_request_key(usage_data, days)
+    return analysis_flight.do(
+        f"{key}:{session_id}" if session_id else key,
+        lambda: analyze_energy_data(energy_data, session_id or uuid.uuid4().hex)
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_analysis_job():
+    """Queue an analysis and return its job id immediately"""
+    try:
+        data = request.get_json()
         
-        return jsonify(response)
+        if not data or 'usage' not in data:
+            return jsonify({'error': 'No usage data provided'}), 400
+        
+        try:
+            days = request_days(data)
+            energy_data = create_energy_data_from_usage(data['usage'], days)
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        job = job_queue.submit(coalesced_analysis, energy_data, data['usage'], days, data.get('session_id'))
+        
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.id}',
+            'events_url': f'/api/jobs/{job.id}/events'
+        }), 202
         
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def create_energy_data_from_usage(usage_data, days):
-    """Create energy data structure from user input"""
-    energy_data = {
-        'user_id': f"user_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-        'period': f"{days} days",
-        'daily_usage': []
-    }
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Get a job's status and result; ?wait=N long-polls up to N seconds for completion"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
     
-    for day in range(days):
-        date = datetime.now().strftime('%Y-%m-%d')
-        daily_data = {
-            'date': date,
-            'appliances': {}
-        }
-        
-        total_kwh = 0
-        total_cost = 0
-        
-        for appliance, hours in usage_data.items():
-            if appliance in APPLIANCE_POWER:
-                power = APPLIANCE_POWER[appliance]
-                energy_kwh = (hours * power) / 1000
-                cost = energy_kwh * ENERGY_COST_PER_KWH
-                
-                daily_data['appliances'][appliance] = {
-                    'hours': hours,
-                    'power_watts': power,
-                    'energy_kwh': energy_kwh,
-                    'cost_rupees': cost
-                }
-                
-                total_kwh += energy_kwh
-                total_cost += cost
-        
-        daily_data['total_kwh'] = total_kwh
-        daily_data['total_cost'] = total_cost
-        energy_data['daily_usage'].append(daily_data)
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0:
+        job.done.wait(wait)
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_analysis_job(job_id):
+    """Subscribe to a job over Server-Sent Events until it finishes"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    
+    def events():
+        yield f"event: status\ndata: {json.dumps({'job_id': job.id, 'status': job.status})}\n\n"
+        while not job.done.wait(15):
+            yield ": keep-alive\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_usage_stream():
+    """Analyze user energy usage, streaming results as Server-Sent Events"""
+    data = request.get_json()
+    
+    if not data or 'usage' not in data:
+        return jsonify({'error': 'No usage data provided'}), 400
+    
+    try:
+        energy_data = create_energy_data_from_usage(data['usage'], request_days(data))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def events():
+        try:
+            for event, payload in stream_eco_agent({'energy_data': energy_data}):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_usage_batch():
+    """Analyze many households, streaming one NDJSON line per household and a final summary line"""
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('households'), list):
+        return jsonify({'error': 'No households provided'}), 400
+    if len(data['households']) > BATCH_MAX_HOUSEHOLDS:
+        return jsonify({'error': f'At most {BATCH_MAX_HOUSEHOLDS} households per batch'}), 413
+    
+    batch = BatchAnalysis(data['households'], default_days=data.get('days', 7))
+    
+    def lines():
+        try:
+            for index, household_id, result in batch:
+                if 'error' in result:
+                    record = {'index': index, 'id': household_id, 'success': False, 'error': result['error']}
+                else:
+                    record = {'index': index, 'id': household_id, **format_analysis(result)}
+                yield json.dumps(record) + '\n'
+            yield json.dumps({'done': True, **batch.stats()}) + '\n'
+        except Exception as e:
+            yield json.dumps({'done': False, 'error': str(e)}) + '\n'
     
-    return energy_data
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+@app.route('/api/meter/readings', methods=['POST'])
+def upload_meter_readings():
+    """Stream interval meter readings (CSV or NDJSON) into the per-user daily aggregates"""
+    try:
+        reading_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        
+        # Parse the body as it arrives instead of buffering the upload
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        result = ingest_stream(stream, reading_format)
+        
+        return jsonify({'success': True, **result})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/meter/<user_id>/analyze', methods=['POST'])
+def analyze_meter_user(user_id):
+    """Analyze a user's aggregated meter readings; ?days=N limits it to the latest N days"""
+    try:
+        days = request.args.get('days', type=int)
+        if days is not None and days < 1:
+            return jsonify({'error': 'days must be at least 1'}), 400
+        
+        energy_data = meter_aggregator.energy_data(user_id, days)
+        
+        if energy_data is None:
+            return jsonify({'error': 'No meter readings for this user'}), 404
+        
+        return jsonify(analyze_energy_data(energy_data))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/<user_id>/days', methods=['POST'])
+def append_user_days(user_id):
+    """Add new days of usage for a user and refresh their analysis incrementally"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('usage'), dict):
+            return jsonify({'error': 'No usage data provided'}), 400
+        
+        days = int(data.get('days', 1))
+        if days < 1:
+            return jsonify({'error': 'days must be at least 1'}), 400
+        
+        result = incremental_analyzer.append(user_id, data['usage'], days)
+        
+        return jsonify({**format_analysis(result), 'incremental': result['incremental']})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/<user_id>/days', methods=['DELETE'])
+def reset_user_days(user_id):
+    """Forget a user's accumulated incremental analysis"""
+    try:
+        if not incremental_analyzer.reset(user_id):
+            return jsonify({'error': 'No accumulated state for this user'}), 404
+        
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def request_days(data, default=7):
+    """Return the days field of a request body, raising ValueError unless it is a positive integer"""
+    days = data.get('days', default)
+    if isinstance(days, bool) or not isinstance(days, int) or days < 1:
+        raise ValueError('days must be a positive integer')
+    return days
+
+def create_energy_data_from_usage(usage_data, days):
+    """Create energy data from user input
+
+    Each appliance maps to hours per day, either one value repeated for every
+    day or a list with one value per day.
+    """
+    return EnergyData.from_usage(
+        usage_data, days, user_id=f"user_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    )
 
 @app.route('/api/simulate', methods=['POST'])
 def simulate_usage():
     """Generate simulated energy usage data"""
     try:
         data = request.get_json()
-        days = data.get('days', 7) if data else 7
+        days = request_days(data or {})
         
         # Generate simulated data
-        simulated_data = simulate_energy_data(days)
-        
+        simulated_data = simulate_energy_batch(1, days).energy_data(0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    try:
         # Run analysis on simulated data
         result = run_eco_agent({'energy_data': simulated_data})
         
         response = {
             'success': True,
-            'simulated_data': simulated_data,
+            'simulated_data': simulated_data.to_dict(),
             'analysis': {
                 'summary': result['summary'],
                 'category': result['category'],
@@ -132,28 +360,49 @@ def simulate_usage():
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    """Get recent analysis logs"""
+    """Get recent analysis logs, optionally for one user"""
     try:
-        logs_dir = 'energy_logs'
-        if not os.path.exists(logs_dir):
-            return jsonify({'logs': []})
-        
-        log_files = []
-        for filename in os.listdir(logs_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(logs_dir, filename)
-                with open(filepath, 'r') as f:
-                    log_data = json.load(f)
-                    log_files.append(log_data)
-        
-        # Sort by timestamp (most recent first)
-        log_files.sort(key=lambda x: x['timestamp'], reverse=True)
+        limit = request.args.get('limit', 10, type=int)
+        user_id = request.args.get('user_id')
+        if not 1 <= limit <= LOGS_MAX_LIMIT:
+            return jsonify({'error': f'limit must be between 1 and {LOGS_MAX_LIMIT}'}), 400
         
-        return jsonify({'logs': log_files[:10]})  # Return last 10 logs
+        return jsonify({'logs': get_log_store().latest(limit, user_id)})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Get runtime statistics for caches and other shared components"""
+    return jsonify({
+        'llm': get_llm_stats(),
+        'llm_cache': llm_cache.stats(),
+        'profile_cache': profile_cache.stats(),
+        'jobs': job_queue.stats(),
+        'meter': meter_aggregator.stats(),
+        'incremental': incremental_analyzer.stats(),
+        'coalescing': analysis_flight.stats(),
+        'checkpoints': get_checkpoint_stats(),
+        'analytics': cohort_rollups.stats()
+    })
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_analysis_session(session_id):
+    """Get the checkpointed graph runs of an analysis session and whether each finished"""
+    try:
+        session = get_session(session_id)
+        if not session['runs']:
+            return jsonify({'error': 'Unknown session id'}), 404
+        return jsonify(session)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Export per-node timing, token, cost and error metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/tips', methods=['GET'])
 def get_energy_tips():
     """Get general energy saving tips"""
@@ -194,7 +443,7 @@ def get_energy_tips():
 
 @app.route('/api/benchmarks', methods=['GET'])
 def get_benchmarks():
-    """Get energy consumption benchmarks"""
+    """Get energy consumption benchmarks: reference ranges plus percentiles and wastage rates from analyzed households"""
     benchmarks = {
         'household_types': {
             'small_apartment': {
@@ -222,8 +471,32 @@ def get_benchmarks():
         }
     }
     
+    try:
+        benchmarks['households'] = cohort_rollups.benchmarks()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
     return jsonify({'benchmarks': benchmarks})
 
+@app.route('/api/cohorts/compare', methods=['GET'])
+def compare_cohorts():
+    """Compare categories side by side; ?daily_kwh=N ranks a household within each, ?category=c marks its own"""
+    try:
+        daily_kwh = request.args.get('daily_kwh', type=float)
+        category = request.args.get('category')
+        if daily_kwh is not None and daily_kwh < 0:
+            return jsonify({'error': 'daily_kwh must not be negative'}), 400
+        
+        cohorts = cohort_rollups.cohorts(daily_kwh)
+        if category is not None and category not in cohorts:
+            return jsonify({'error': f'No sessions in cohort {category}'}), 404
+        if category is not None:
+            cohorts[category]["selected"] = True
+        
+        return jsonify({'cohorts': cohorts, 'daily_kwh': daily_kwh, 'category': category})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Create necessary directories
     os.makedirs('energy_logs', exist_ok=True)
@@ -260,10 +533,20 @@ if __name__ == '__main__':
                 <ul class="list-disc list-inside space-y-2 text-gray-700">
                     <li><code>/api/appliances</code> - Get appliance data</li>
                     <li><code>/api/analyze</code> - Analyze energy usage (POST)</li>
+                    <li><code>/api/analyze/stream</code> - Analyze energy usage as a Server-Sent Events stream (POST)</li>
+                    <li><code>/api/analyze/batch</code> - Analyze many households, streamed as NDJSON (POST)</li>
+                    <li><code>/api/sessions/&lt;session_id&gt;</code> - Get an analysis session's checkpointed progress; send its id back to <code>/api/analyze</code> to resume</li>
+                    <li><code>/api/jobs</code> - Queue an analysis and poll <code>/api/jobs/&lt;id&gt;</code> for the result (POST)</li>
+                    <li><code>/api/meter/readings</code> - Upload interval meter readings as CSV or NDJSON (POST)</li>
+                    <li><code>/api/meter/&lt;user_id&gt;/analyze</code> - Analyze a user's aggregated meter readings (POST)</li>
+                    <li><code>/api/users/&lt;user_id&gt;/days</code> - Add new days and refresh a user's analysis incrementally (POST, DELETE to reset)</li>
                     <li><code>/api/simulate</code> - Generate simulated data (POST)</li>
                     <li><code>/api/logs</code> - Get recent analysis logs</li>
+                    <li><code>/api/stats</code> - Get cache and runtime statistics</li>
+                    <li><code>/metrics</code> - Per-node timing, token and cost metrics for Prometheus</li>
                     <li><code>/api/tips</code> - Get energy saving tips</li>
-                    <li><code>/api/benchmarks</code> - Get consumption benchmarks</li>
+                    <li><code>/api/benchmarks</code> - Get consumption benchmarks, including percentiles from analyzed households</li>
+                    <li><code>/api/cohorts/compare</code> - Compare categories; <code>?daily_kwh=N</code> ranks a household within each</li>
                 </ul>
                 <p class="text-gray-600 mt-4">
                     For the full web interface, please use the standalone HTML file provided.
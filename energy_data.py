@@ -0,0 +1,309 @@
+import uuid
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+# Appliance Power Consumption Data (in watts)
+APPLIANCE_POWER = {
+    "fan": 75,
+    "ac": 1500,
+    "lights": 60,
+    "refrigerator": 150,
+    "tv": 120,
+    "washing_machine": 500,
+    "water_heater": 1200,
+    "microwave": 800
+}
+
+# Energy cost per kWh (in rupees)
+ENERGY_COST_PER_KWH = 6.5
+
+# Simulated Daily Usage Distributions (hours/day)
+# Each appliance is used on a day with probability "p_use"; when used, its
+# hours are uniform between "low" and "high".
+APPLIANCE_USAGE_DISTRIBUTIONS = {
+    "fan": {"low": 8, "high": 16, "p_use": 1.0},
+    "ac": {"low": 6, "high": 12, "p_use": 1.0},  # varies by season/weather
+    "lights": {"low": 4, "high": 8, "p_use": 1.0},
+    "refrigerator": {"low": 24, "high": 24, "p_use": 1.0},  # runs 24/7
+    "tv": {"low": 3, "high": 6, "p_use": 1.0},
+    "washing_machine": {"low": 0.5, "high": 1.5, "p_use": 0.7},
+    "water_heater": {"low": 1, "high": 3, "p_use": 1.0},
+    "microwave": {"low": 0.5, "high": 2, "p_use": 1.0}
+}
+
+def _check_days(days: Any):
+    """Raise ValueError unless days is a whole number of at least 1"""
+    if isinstance(days, bool) or not isinstance(days, (int, np.integer)):
+        raise ValueError("days must be an integer")
+    if days < 1:
+        raise ValueError("days must be at least 1")
+
+def _date_range(days: int, end_date: datetime = None) -> List[str]:
+    """ISO dates for the days up to end_date (today by default), oldest first"""
+    end = np.datetime64((end_date or datetime.now()).date(), "D")
+    return np.arange(end - days + 1, end + 1).astype(str).tolist()
+
+def _column_sums(matrix: np.ndarray) -> np.ndarray:
+    """Sum a days x appliances matrix over days
+
+    Matrices broadcast from a single daily profile repeat one row with a zero
+    stride, so their sums are a multiply rather than a pass over every day.
+    """
+    if matrix.shape[0] and matrix.strides[0] == 0:
+        return matrix[0] * matrix.shape[0]
+    return matrix.sum(axis=0)
+
+def _row_sums(matrix: np.ndarray) -> np.ndarray:
+    """Sum each row of a households x appliances matrix in ascending order
+
+    A sequential sum over sorted values does not depend on column order, and
+    zero columns (appliances a household lacks) add nothing, so a household
+    totals the same alone or inside a batch.
+    """
+    if not matrix.shape[1]:
+        return np.zeros(matrix.shape[0])
+    return np.add.accumulate(np.sort(matrix, axis=1), axis=1)[:, -1]
+
+def period_summaries(energy_totals: np.ndarray, cost_totals: np.ndarray, days: np.ndarray) -> Dict[str, np.ndarray]:
+    """Summary figures for many households from households x appliances kWh and cost totals, as arrays"""
+    # Rounded well below display precision first so totals summed in a
+    # different order (running totals) display the same
+    total_kwh = np.round(_row_sums(np.asarray(energy_totals, dtype=np.float64)), 6)
+    total_cost = np.round(_row_sums(np.asarray(cost_totals, dtype=np.float64)), 6)
+    days = np.asarray(days)
+    return {
+        "total_kwh": np.round(total_kwh, 2),
+        "total_cost": np.round(total_cost, 2),
+        "avg_daily_kwh": np.round(total_kwh / days, 2),
+        "avg_daily_cost": np.round(total_cost / days, 2),
+        "days_analyzed": days
+    }
+
+def period_summary(energy_totals: np.ndarray, cost_totals: np.ndarray, days: int) -> Dict[str, Any]:
+    """Summary figures from per-appliance kWh and cost totals over a number of days"""
+    summaries = period_summaries(np.reshape(energy_totals, (1, -1)), np.reshape(cost_totals, (1, -1)), [days])
+    summary = {key: values.tolist()[0] for key, values in summaries.items()}
+    summary["days_analyzed"] = days
+    return summary
+
+def appliance_summary(appliances: List[str], hours_totals: np.ndarray, energy_totals: np.ndarray,
+                      cost_totals: np.ndarray, days: int) -> Dict[str, Dict[str, float]]:
+    """Per-appliance figures from hours, kWh and cost totals over a number of days"""
+    total_kwh = np.asarray(energy_totals).tolist()
+    total_cost = np.asarray(cost_totals).tolist()
+    avg_hours = np.round(np.asarray(hours_totals) / days, 2).tolist()
+    return {
+        appliance: {
+            "total_kwh": total_kwh[column],
+            "total_cost": total_cost[column],
+            "avg_hours": avg_hours[column]
+        }
+        for column, appliance in enumerate(appliances)
+    }
+
+class EnergyData:
+    """Usage history for one household as days x appliances matrices
+
+    hours, energy_kwh and cost_rupees are float64 arrays of shape
+    (days, appliances), so summaries are single reductions instead of walks
+    over nested per-day dicts. A repeated daily profile is stored as a
+    read-only broadcast view, so its size does not grow with the number of
+    days. The nested dict format is only produced by to_dict() at the JSON
+    boundary.
+    """
+
+    __slots__ = ("user_id", "period", "dates", "appliances", "hours", "energy_kwh", "cost_rupees")
+
+    def __init__(self, user_id: str, dates: List[str], appliances: List[str], hours: np.ndarray,
+                 energy_kwh: np.ndarray = None, cost_rupees: np.ndarray = None, period: str = None):
+        self.user_id = user_id
+        self.dates = list(dates)
+        self.appliances = list(appliances)
+        self.hours = np.asarray(hours, dtype=np.float64)
+        power = np.array([APPLIANCE_POWER[appliance] for appliance in self.appliances], dtype=np.float64)
+        self.energy_kwh = self.hours * power / 1000 if energy_kwh is None else np.asarray(energy_kwh, dtype=np.float64)
+        self.cost_rupees = self.energy_kwh * ENERGY_COST_PER_KWH if cost_rupees is None else np.asarray(cost_rupees, dtype=np.float64)
+        self.period = period or f"{len(self.dates)} days"
+
+    @property
+    def days(self) -> int:
+        return len(self.dates)
+
+    def __len__(self) -> int:
+        return self.days
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EnergyData":
+        """Build from the nested {"daily_usage": [{"appliances": {...}}]} format"""
+        daily_usage = data["daily_usage"]
+        appliances = []
+        for day in daily_usage:
+            for appliance in day["appliances"]:
+                if appliance not in appliances:
+                    appliances.append(appliance)
+        columns = {appliance: column for column, appliance in enumerate(appliances)}
+
+        shape = (len(daily_usage), len(appliances))
+        hours, energy, cost = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        for row, day in enumerate(daily_usage):
+            for appliance, usage in day["appliances"].items():
+                column = columns[appliance]
+                hours[row, column] = usage["hours"]
+                energy[row, column] = usage["energy_kwh"]
+                cost[row, column] = usage["cost_rupees"]
+
+        return cls(data["user_id"], [day.get("date") for day in daily_usage], appliances,
+                   hours, energy, cost, period=data.get("period"))
+
+    @classmethod
+    def from_usage(cls, usage: Dict[str, Any], days: int, user_id: str, end_date: datetime = None) -> "EnergyData":
+        """Build from hours per appliance, either one daily value or a list of per-day values
+
+        A profile of single values is computed once and broadcast across the
+        days. Dates run up to end_date (today by default), oldest first.
+        Appliances without a known power rating are ignored. Raises
+        ValueError unless days is an integer of at least 1.
+        """
+        _check_days(days)
+        usage = {appliance: hours for appliance, hours in usage.items() if appliance in APPLIANCE_POWER}
+        appliances = list(usage)
+        power = np.array([APPLIANCE_POWER[appliance] for appliance in appliances], dtype=np.float64)
+        dates = _date_range(days, end_date)
+
+        if all(np.ndim(hours) == 0 for hours in usage.values()):
+            profile = np.array([float(hours) for hours in usage.values()], dtype=np.float64)
+            energy = profile * power / 1000
+            cost = energy * ENERGY_COST_PER_KWH
+            shape = (days, len(appliances))
+            return cls(user_id, dates, appliances, np.broadcast_to(profile, shape),
+                       np.broadcast_to(energy, shape), np.broadcast_to(cost, shape))
+
+        hours = np.empty((days, len(appliances)), dtype=np.float64)
+        for column, (appliance, values) in enumerate(usage.items()):
+            values = np.asarray(values, dtype=np.float64)
+            if values.ndim and values.shape != (days,):
+                raise ValueError(f"Usage for {appliance} has {values.size} daily values, expected {days}")
+            hours[:, column] = values
+        return cls(user_id, dates, appliances, hours)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the nested per-day dict format"""
+        hours = self.hours.tolist()
+        energy = self.energy_kwh.tolist()
+        cost = self.cost_rupees.tolist()
+        daily_usage = []
+        for row, date in enumerate(self.dates):
+            daily_usage.append({
+                "date": date,
+                "appliances": {
+                    appliance: {
+                        "hours": hours[row][column],
+                        "power_watts": APPLIANCE_POWER[appliance],
+                        "energy_kwh": energy[row][column],
+                        "cost_rupees": cost[row][column]
+                    }
+                    for column, appliance in enumerate(self.appliances)
+                },
+                "total_kwh": sum(energy[row]),
+                "total_cost": sum(cost[row])
+            })
+
+        return {
+            "user_id": self.user_id,
+            "period": self.period,
+            "daily_usage": daily_usage
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Total and average daily consumption and cost"""
+        return period_summary(_column_sums(self.energy_kwh), _column_sums(self.cost_rupees), self.days)
+
+    def column_totals(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-appliance hours, kWh and cost summed over every day"""
+        return _column_sums(self.hours), _column_sums(self.energy_kwh), _column_sums(self.cost_rupees)
+
+    def appliance_totals(self) -> Dict[str, Dict[str, float]]:
+        """Per-appliance total kWh, total cost and average daily hours"""
+        return appliance_summary(self.appliances, *self.column_totals(), self.days)
+
+class SimulatedBatch:
+    """Columnar simulated usage for many households
+
+    hours is a float32 array of shape (households, days, appliances), rounded
+    to two decimals like the dict format. Energy and cost are derived on
+    demand; energy_data() extracts one household and household() or
+    to_dicts() build the nested dict format.
+    """
+
+    __slots__ = ("user_ids", "dates", "appliances", "power_watts", "hours")
+
+    def __init__(self, user_ids: List[str], dates: List[str], appliances: List[str], hours: np.ndarray):
+        self.user_ids = user_ids
+        self.dates = dates
+        self.appliances = appliances
+        self.power_watts = np.array([APPLIANCE_POWER[appliance] for appliance in appliances], dtype=np.float32)
+        self.hours = hours
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def energy_kwh(self) -> np.ndarray:
+        """Energy per household, day and appliance (kWh)"""
+        return np.round(self.hours * self.power_watts / 1000, 2)
+
+    @property
+    def cost_rupees(self) -> np.ndarray:
+        """Cost per household, day and appliance (rupees)"""
+        return np.round(self.hours * self.power_watts / 1000 * ENERGY_COST_PER_KWH, 2)
+
+    def energy_data(self, index: int) -> EnergyData:
+        """Return one household as EnergyData, with per-entry values rounded like the dict format"""
+        hours = self.hours[index].astype(np.float64)
+        power = self.power_watts.astype(np.float64)
+        return EnergyData(
+            self.user_ids[index], self.dates, self.appliances, np.round(hours, 2),
+            np.round(hours * power / 1000, 2),
+            np.round(hours * power / 1000 * ENERGY_COST_PER_KWH, 2)
+        )
+
+    def household(self, index: int) -> Dict[str, Any]:
+        """Return one household in the dict format produced by simulate_energy_data"""
+        return self.energy_data(index).to_dict()
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Return every household in the dict format"""
+        return [self.household(index) for index in range(len(self))]
+
+def simulate_energy_batch(households: int, days: int = 7, seed: Optional[int] = None,
+                          distributions: Dict[str, Dict[str, float]] = None,
+                          end_date: datetime = None) -> SimulatedBatch:
+    """Simulate usage for many households in one vectorized pass
+
+    The same seed always produces the same hours. Days run up to end_date
+    (today by default), oldest first. days is checked as in
+    EnergyData.from_usage.
+    """
+    _check_days(days)
+    distributions = distributions or APPLIANCE_USAGE_DISTRIBUTIONS
+    appliances = list(distributions)
+    low = np.array([distributions[appliance]["low"] for appliance in appliances], dtype=np.float32)
+    high = np.array([distributions[appliance]["high"] for appliance in appliances], dtype=np.float32)
+    p_use = np.array([distributions[appliance].get("p_use", 1.0) for appliance in appliances], dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    shape = (households, days, len(appliances))
+    hours = low + rng.random(shape, dtype=np.float32) * (high - low)
+    hours *= rng.random(shape, dtype=np.float32) < p_use
+    hours = np.round(hours, 2)
+
+    dates = _date_range(days, end_date)
+    if seed is None:
+        user_ids = [str(uuid.uuid4()) for _ in range(households)]
+    else:
+        id_rng = np.random.default_rng([seed, 1])
+        user_ids = [str(uuid.UUID(bytes=id_rng.bytes(16), version=4)) for _ in range(households)]
+
+    return SimulatedBatch(user_ids, dates, appliances, hours)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from app import (
+    usage_pattern_analyzer, category_agent, smart_suggestions_generator, action_plan_generator,
+    usage_logger, consumption_router
+)
+from energy_data import EnergyData, period_summary, appliance_summary
+from wastage_rules import get_wastage_rules
+from tracing import session_trace, traced_node
+
+# Incremental Analysis Configuration
+USER_STATE_PATH = os.getenv("ECOAGENT_USER_STATE_PATH", "energy_cache/user_state.db")
+
+# Relative change in average daily kWh since the last LLM run that triggers
+# a new one even when the category and wastage issues are unchanged
+INCREMENTAL_DRIFT = float(os.getenv("ECOAGENT_INCREMENTAL_DRIFT", "0.1"))
+
+# LLM nodes re-run when a user's analysis is refreshed, in graph order and
+# traced under their graph node names
+LLM_NODES = [
+    ("usage_pattern_analyzer", usage_pattern_analyzer),
+    ("category_agent", category_agent),
+    ("smart_suggestions", smart_suggestions_generator),
+    ("action_plan", action_plan_generator)
+]
+LLM_SECTIONS = ["pattern_analysis", "recommendation", "smart_suggestions", "action_plan"]
+
+class UserStateStore:
+    """SQLite-backed JSON state per user
+
+    Like ResponseCache, the database is opened on first use and a single
+    connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                "user_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a user's state, or None for an unknown user"""
+        with self._lock:
+            row = self._connect().execute("SELECT state FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, user_id: str, state: Dict[str, Any]):
+        """Store a user's state, replacing any previous one"""
+        value = json.dumps(state)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO user_state (user_id, state, updated_at) VALUES (?, ?, ?)",
+                (user_id, value, time.time())
+            )
+            conn.commit()
+
+    def delete(self, user_id: str) -> bool:
+        """Forget a user's state; returns False if there was none"""
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,)).rowcount
+            conn.commit()
+        return bool(deleted)
+
+    def count(self) -> int:
+        """Return the number of users with stored state"""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM user_state").fetchone()[0]
+
+def _aligned(energy_data: EnergyData, appliances: List[str]) -> List[np.ndarray]:
+    """The hours, kWh and cost matrices of energy_data with columns in `appliances` order"""
+    columns = [appliances.index(appliance) for appliance in energy_data.appliances]
+    matrices = []
+    for matrix in (energy_data.hours, energy_data.energy_kwh, energy_data.cost_rupees):
+        aligned = np.zeros((energy_data.days, len(appliances)))
+        aligned[:, columns] = matrix
+        matrices.append(aligned)
+    return matrices
+
+def _rerun_reason(previous: Optional[Dict[str, Any]], category: str, wastage_rules: List[str],
+                  avg_daily_kwh: float, drift: float) -> Optional[str]:
+    """Why the LLM sections must be regenerated, or None if the stored ones still apply"""
+    if previous is None or not previous.get("sections"):
+        return "first_analysis"
+    if category != previous["category"]:
+        return "category_changed"
+    if sorted(wastage_rules) != sorted(previous["wastage_rules"]):
+        return "wastage_changed"
+    analyzed = previous["analyzed_avg_daily_kwh"]
+    if abs(avg_daily_kwh - analyzed) > drift * max(abs(analyzed), 1e-9):
+        return "drift"
+    return None
+
+class IncrementalAnalyzer:
+    """Per-user analysis that folds in new days instead of re-analyzing the full history
+
+    Each user's state holds per-appliance running totals, the wastage rule
+    accumulator, the last category and wastage rules, and the last LLM
+    sections. Appending days costs O(days added x appliances) regardless of
+    history length. The LLM nodes re-run only when the category or the set
+    of wastage rules that fire changes, or average daily kWh has drifted by
+    more than `drift` (relative) since they last ran; otherwise the stored
+    sections are reused.
+    """
+
+    def __init__(self, store: UserStateStore, drift: float = INCREMENTAL_DRIFT):
+        self.store = store
+        self.drift = drift
+        # Striped locks serialize appends per user without a lock per user
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._stats_lock = threading.Lock()
+        self.appends = 0
+        self.llm_runs = 0
+        self.llm_reused = 0
+
+    def _lock_for(self, user_id: str) -> threading.Lock:
+        return self._locks[zlib.crc32(user_id.encode("utf-8")) % len(self._locks)]
+
+    def append(self, user_id: str, usage: Dict[str, Any], days: int = 1) -> Dict[str, Any]:
+        """Add `days` new days of usage for a user and return the refreshed analysis state
+
+        usage maps appliances to hours per day, as EnergyData.from_usage
+        accepts. New days follow the last stored day; a new user's end today.
+        The state has an "incremental" entry saying whether the LLM sections
+        were reused and, if not, why they were regenerated.
+        """
+        with self._lock_for(user_id), session_trace("incremental"):
+            previous = self.store.get(user_id)
+            end_date = None
+            if previous is not None:
+                last_date = date.fromisoformat(previous["last_date"])
+                end_date = datetime.combine(last_date + timedelta(days=days), datetime.min.time())
+            energy_data = EnergyData.from_usage(usage, days, user_id=user_id, end_date=end_date)
+
+            appliances = list(previous["appliances"]) if previous else []
+            appliances.extend(appliance for appliance in energy_data.appliances if appliance not in appliances)
+            hours, energy, cost = _aligned(energy_data, appliances)
+
+            # Running totals, padded for appliances seen for the first time
+            totals = {}
+            for name, matrix in (("hours", hours), ("energy_kwh", energy), ("cost_rupees", cost)):
+                stored = np.zeros(len(appliances))
+                if previous:
+                    stored[:len(previous["totals"][name])] = previous["totals"][name]
+                totals[name] = stored + matrix.sum(axis=0)
+            total_days = (previous["days"] if previous else 0) + days
+
+            rules = get_wastage_rules()
+            rule_state = rules.accumulate(previous["rule_state"] if previous else None, appliances, hours, energy, cost)
+            summary = period_summary(totals["energy_kwh"], totals["cost_rupees"], total_days)
+            wastage_issues, wastage_rules = rules.detect_accumulated(
+                rule_state, appliances, totals["hours"], totals["energy_kwh"], totals["cost_rupees"], total_days
+            )
+
+            # The logged energy data covers only the new days, labelled with the full period
+            state = {
+                "energy_data": EnergyData(user_id, energy_data.dates, appliances, hours, energy, cost,
+                                          period=f"{total_days} days"),
+                "summary": summary,
+                "appliance_totals": appliance_summary(appliances, totals["hours"], totals["energy_kwh"],
+                                                      totals["cost_rupees"], total_days),
+                "wastage_issues": wastage_issues,
+                "wastage_rules": wastage_rules
+            }
+            state["category"] = consumption_router(state)
+
+            reason = _rerun_reason(previous, state["category"], wastage_rules, summary["avg_daily_kwh"], self.drift)
+            if reason is None:
+                state.update(previous["sections"])
+                analyzed_avg_daily_kwh = previous["analyzed_avg_daily_kwh"]
+            else:
+                for name, node in LLM_NODES:
+                    state = traced_node(name, node)(state)
+                analyzed_avg_daily_kwh = summary["avg_daily_kwh"]
+            state = traced_node("usage_logger", usage_logger)(state)
+
+            self.store.set(user_id, {
+                "appliances": appliances,
+                "days": total_days,
+                "last_date": energy_data.dates[-1],
+                "totals": {name: values.tolist() for name, values in totals.items()},
+                "rule_state": rule_state,
+                "category": state["category"],
+                "wastage_rules": wastage_rules,
+                "sections": {section: state[section] for section in LLM_SECTIONS},
+                "analyzed_avg_daily_kwh": analyzed_avg_daily_kwh
+            })
+
+        with self._stats_lock:
+            self.appends += 1
+            if reason is None:
+                self.llm_reused += 1
+            else:
+                self.llm_runs += 1
+        state["incremental"] = {
+            "llm_reused": reason is None,
+            "reason": reason,
+            "days_added": days,
+            "days_total": total_days
+        }
+        return state
+
+    def reset(self, user_id: str) -> bool:
+        """Forget a user's accumulated state; returns False if there was none"""
+        with self._lock_for(user_id):
+            return self.store.delete(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return append counts and how often the LLM sections were reused"""
+        with self._stats_lock:
+            return {
+                "users": self.store.count(),
+                "appends": self.appends,
+                "llm_runs": self.llm_runs,
+                "llm_reused": self.llm_reused,
+                "drift": self.drift
+            }
+
+# Shared incremental analyzer for per-user day uploads
+incremental_analyzer = IncrementalAnalyzer(UserStateStore(USER_STATE_PATH))
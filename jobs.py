@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Any, Optional
+
+from tracing import job_queue_wait, metrics
+
+# Job Queue Configuration
+JOB_WORKERS = int(os.getenv("ECOAGENT_JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("ECOAGENT_JOB_QUEUE_DEPTH", "100"))
+JOB_RETENTION = int(os.getenv("ECOAGENT_JOB_RETENTION", "1000"))
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+class Job:
+    """One queued unit of work and its timing"""
+
+    def __init__(self, fn: Callable[..., Any], args: tuple):
+        self.id = str(uuid.uuid4())
+        self.fn = fn
+        self.args = args
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.session_id = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the job status, timings in milliseconds and result or error, with the session to resume a failed run"""
+        now = time.time()
+        started = self.started_at or now
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "queue_wait_ms": round((started - self.submitted_at) * 1000, 1),
+            "run_ms": round(((self.finished_at or now) - started) * 1000, 1) if self.started_at else None,
+            "total_ms": round(((self.finished_at or now) - self.submitted_at) * 1000, 1)
+        }
+        if self.status == "succeeded":
+            job["result"] = self.result
+        elif self.status == "failed":
+            job["error"] = self.error
+            if self.session_id is not None:
+                job["session_id"] = self.session_id
+        return job
+
+class JobQueue:
+    """Bounded queue of jobs executed by a fixed pool of worker threads
+
+    The worker count caps how many jobs (and so LLM sessions) run at once,
+    independent of how many HTTP threads accept requests. Submitting to a
+    full queue raises QueueFullError instead of blocking.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_DEPTH, retention: int = JOB_RETENTION):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ecoagent-job-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn: Callable[..., Any], *args) -> Job:
+        """Queue fn(*args) and return its job immediately"""
+        self._start_workers()
+        job = Job(fn, args)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs beyond the retention limit,
+            # passing over queued or running jobs however old they are
+            excess = len(self._jobs) - self.retention
+            if excess > 0:
+                finished = (job_id for job_id, old in self._jobs.items() if old.done.is_set())
+                for job_id in list(islice(finished, excess)):
+                    del self._jobs[job_id]
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self.rejected += 1
+            raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            job.status = "running"
+            with self._lock:
+                self.running += 1
+            wait = job.started_at - job.submitted_at
+            metrics.observe("ecoagent_job_queue_wait_seconds", {}, wait)
+            job_queue_wait.set(wait)
+            try:
+                job.result = job.fn(*job.args)
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                job.session_id = getattr(e, "session_id", None)
+                job.status = "failed"
+            job_queue_wait.set(None)
+            job.finished_at = time.time()
+            with self._lock:
+                self.running -= 1
+                if job.status == "succeeded":
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                self._wait_total += job.started_at - job.submitted_at
+                self._run_total += job.finished_at - job.started_at
+            job.done.set()
+            self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, worker usage and average job timings"""
+        with self._lock:
+            finished = self.succeeded + self.failed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queue.qsize(),
+                "running": self.running,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": round(self._wait_total * 1000 / finished, 1) if finished else 0.0,
+                "avg_run_ms": round(self._run_total * 1000 / finished, 1) if finished else 0.0
+            }
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive the same result or exception. Nothing is cached
+    once the call completes.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args) -> Any:
+        """Return fn(*args), sharing one execution among concurrent callers with the same key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = fn(*args)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return executions run, executions saved by coalescing and keys in flight"""
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights)
+            }
+
+# Shared analysis job queue
+job_queue = JobQueue()
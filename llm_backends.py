@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple, Union
+
+# LLM Backend Configuration
+# A backend is any chat model with invoke(prompt) returning a message with
+# .content and stream(prompt) yielding chunks with .content, as LangChain's
+# chat models do. "gemini" is the real model; "fake" answers offline.
+LLM_BACKEND = os.getenv("ECOAGENT_LLM_BACKEND", "gemini")
+LLM_MODEL = "models/gemini-1.5-flash-latest"
+LLM_TEMPERATURE = 0.3
+
+# Fake Backend Configuration
+# Latency is in seconds: a number, or "uniform:low:high", "normal:mean:stdev",
+# "lognormal:median:sigma" or "exponential:mean"
+FAKE_LLM_LATENCY = os.getenv("ECOAGENT_FAKE_LLM_LATENCY", "0")
+FAKE_LLM_FAILURE_RATE = float(os.getenv("ECOAGENT_FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_SEED = os.getenv("ECOAGENT_FAKE_LLM_SEED")
+FAKE_LLM_TEMPLATES_PATH = os.getenv("ECOAGENT_FAKE_LLM_TEMPLATES", "")
+
+# Canned responses per prompt kind; a prompt always gets the same variant.
+# Placeholders are filled from figures quoted in the prompt.
+DEFAULT_FAKE_TEMPLATES = {
+    "pattern_analysis": [
+        "Average use is {avg_daily_kwh} kWh/day (₹{avg_daily_cost}/day). {top_appliance} is the largest consumer. Efficiency rating: Average.",
+        "The household uses {avg_daily_kwh} kWh/day, led by {top_appliance}. No unusual spikes beyond the listed appliances. Efficiency rating: Good."
+    ],
+    "recommendation": [
+        "As a {category} user at {avg_daily_kwh} kWh/day: cut the longest-running appliance first, then review standby loads.",
+        "For a {category} profile: schedule heavy appliances off-peak to bring ₹{avg_daily_cost}/day down."
+    ],
+    "smart_suggestions": [
+        "Immediate: reduce {top_appliance} hours, switch off idle lights, unplug standby devices. Long term: LED lighting and 5-star appliances. Habit: run full loads only. Estimated savings: 10% a month."
+    ],
+    "action_plan": [
+        "Week 1-2: track daily kWh against {avg_daily_kwh}. Week 3-4: apply timers and set points. Review weekly; target a 10% reduction."
+    ],
+    "generic": [
+        "Offline response."
+    ]
+}
+
+# Markers identifying each prompt kind, checked in order
+PROMPT_KINDS = [
+    ("single_call", '"pattern_analysis"'),
+    ("action_plan", "30-day action plan"),
+    ("smart_suggestions", "generate smart suggestions"),
+    ("recommendation", "Excellent energy management"),
+    ("recommendation", "room for improvement"),
+    ("recommendation", "needs immediate attention"),
+    ("pattern_analysis", "Analyze this data")
+]
+
+_PROMPT_FIELDS = {
+    "avg_daily_kwh": re.compile(r"(?:Average Daily Usage|Current Usage): ([\d.]+) kWh", re.IGNORECASE),
+    "avg_daily_cost": re.compile(r"(?:Average Daily Cost|Current Cost|Daily Cost): ₹([\d.]+)", re.IGNORECASE),
+    "category": re.compile(r"Category: (\w+)|As an? ([\w-]+) (?:energy )?user"),
+    "top_appliance": re.compile(r"Top Energy Consumers: (?:\[\('(\w+)'|(\w+) [\d.]+ kWh)")
+}
+# Appliance rows, skipping the "- N others" row of a compacted list
+_APPLIANCE_LINE = re.compile(r"^- ([^:\n\d][^:\n]*): ([\d.]+) kWh", re.MULTILINE)
+
+class FakeLLMError(Exception):
+    """Simulated transient failure raised by the fake backend"""
+
+class _PromptFields(dict):
+    def __missing__(self, key: str) -> str:
+        return "n/a"
+
+def prompt_kind(prompt: str) -> str:
+    """Return the kind of a prompt: an advice section name, single_call or generic"""
+    for kind, marker in PROMPT_KINDS:
+        if marker in prompt:
+            return kind
+    return "generic"
+
+def parse_latency(spec: Union[str, float]) -> Callable[[random.Random], float]:
+    """Build a latency sampler, in seconds, from a fixed delay or a "distribution:params" spec"""
+    if isinstance(spec, (int, float)) or ":" not in str(spec):
+        delay = max(float(spec), 0.0)
+        return lambda rng: delay
+    name, *params = str(spec).split(":")
+    params = [float(param) for param in params]
+    samplers = {
+        "uniform": lambda rng: rng.uniform(*params),
+        "normal": lambda rng: rng.gauss(*params),
+        "lognormal": lambda rng: params[0] * rng.lognormvariate(0.0, params[1]),
+        "exponential": lambda rng: rng.expovariate(1 / params[0])
+    }
+    expected = {"uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+    if name not in samplers or len(params) != expected[name]:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    sampler = samplers[name]
+    return lambda rng: max(sampler(rng), 0.0)
+
+def load_fake_templates(path: str) -> Dict[str, List[str]]:
+    """Load response templates from a JSON file of kind -> template or list of templates
+
+    Kinds missing from the file keep the built-in templates.
+    """
+    templates = dict(DEFAULT_FAKE_TEMPLATES)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for kind, variants in json.load(f).items():
+                templates[kind] = [variants] if isinstance(variants, str) else list(variants)
+    return templates
+
+class FakeLLM:
+    """Offline chat model returning templated answers after a simulated delay
+
+    Responses depend only on the prompt, so caching and deduplication behave
+    as they would with the real model. Latency is drawn per call from a
+    distribution, and a share of calls (`failure_rate`) raise FakeLLMError
+    after their delay. A seed makes the delays and failures reproducible for
+    a single-threaded run.
+    """
+
+    model = "fake"
+    temperature = None
+
+    def __init__(self, latency: Union[str, float] = 0.0, failure_rate: float = 0.0,
+                 templates: Dict[str, List[str]] = None, seed: Optional[int] = None, record_prompts: bool = False):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.templates = templates or DEFAULT_FAKE_TEMPLATES
+        self.prompts = [] if record_prompts else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self._delay_total = 0.0
+
+    @property
+    def latency(self) -> Union[str, float]:
+        return self._latency_spec
+
+    @latency.setter
+    def latency(self, spec: Union[str, float]):
+        self._latency = parse_latency(spec)
+        self._latency_spec = spec
+
+    def _render(self, kind: str, prompt: str, fields: Dict[str, str]) -> str:
+        variants = self.templates.get(kind) or self.templates.get("generic") or DEFAULT_FAKE_TEMPLATES["generic"]
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        return variants[digest[0] % len(variants)].format_map(fields)
+
+    def respond(self, prompt: str) -> str:
+        """Return the templated answer for a prompt, without delay or failures"""
+        fields = _PromptFields()
+        for field, pattern in _PROMPT_FIELDS.items():
+            match = pattern.search(prompt)
+            if match:
+                fields[field] = next(group for group in match.groups() if group)
+        appliances = [(float(kwh), name.strip()) for name, kwh in _APPLIANCE_LINE.findall(prompt)]
+        if appliances:
+            fields["top_appliance"] = max(appliances)[1].lower()
+        fields["top_appliance"] = fields["top_appliance"].replace("_", " ")
+
+        kind = prompt_kind(prompt)
+        if kind == "single_call":
+            sections = ("pattern_analysis", "recommendation", "smart_suggestions", "action_plan")
+            return json.dumps({section: self._render(section, prompt, fields) for section in sections}, ensure_ascii=False)
+        return self._render(kind, prompt, fields)
+
+    def _begin(self, prompt: str) -> float:
+        """Count the call and draw its delay; raises FakeLLMError (after the delay) for a simulated failure"""
+        with self._lock:
+            if self.prompts is not None:
+                self.prompts.append(prompt)
+            delay = self._latency(self._rng)
+            failed = self._rng.random() < self.failure_rate
+            self.calls += 1
+            self.failures += failed
+            self._delay_total += delay
+        if failed:
+            time.sleep(delay)
+            raise FakeLLMError("Simulated LLM failure (503 Service Unavailable)")
+        return delay
+
+    def _message(self, prompt: str, content: str) -> SimpleNamespace:
+        # Rough token counts (about four characters per token), in the shape
+        # LangChain reports usage
+        return SimpleNamespace(content=content, usage_metadata={
+            "input_tokens": max(1, len(prompt) // 4),
+            "output_tokens": max(1, len(content) // 4)
+        })
+
+    def invoke(self, prompt: str) -> SimpleNamespace:
+        """Return the answer to a prompt after a simulated delay"""
+        delay = self._begin(prompt)
+        if delay:
+            time.sleep(delay)
+        return self._message(prompt, self.respond(prompt))
+
+    def stream(self, prompt: str) -> Iterator[SimpleNamespace]:
+        """Yield the answer word by word, spreading the simulated delay over the chunks"""
+        delay = self._begin(prompt)
+        words = self.respond(prompt).split(" ")
+        for index, word in enumerate(words):
+            if delay:
+                time.sleep(delay / len(words))
+            yield SimpleNamespace(content=word if index == 0 else " " + word)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call and failure counts and the average simulated delay"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "latency": self.latency,
+                "failure_rate": self.failure_rate,
+                "avg_latency_ms": round(self._delay_total * 1000 / self.calls, 1) if self.calls else 0.0
+            }
+
+def create_gemini_llm():
+    """Create the Gemini chat model, importing LangChain's Google integration on first use"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    if os.getenv("GEMINI_API_KEY"):
+        os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=LLM_TEMPERATURE)
+
+def create_fake_llm() -> FakeLLM:
+    """Create the offline fake configured by the ECOAGENT_FAKE_LLM_* settings"""
+    return FakeLLM(
+        FAKE_LLM_LATENCY,
+        failure_rate=FAKE_LLM_FAILURE_RATE,
+        templates=load_fake_templates(FAKE_LLM_TEMPLATES_PATH),
+        seed=int(FAKE_LLM_SEED) if FAKE_LLM_SEED else None
+    )
+
+LLM_BACKENDS = {
+    "gemini": create_gemini_llm,
+    "fake": create_fake_llm
+}
+
+# Model name and temperature of each backend's model, known without creating it
+LLM_IDENTITIES = {
+    "gemini": (LLM_MODEL, LLM_TEMPERATURE),
+    "fake": (FakeLLM.model, FakeLLM.temperature)
+}
+
+def llm_identity(backend: str = None) -> Tuple[str, Any]:
+    """Return the (model, temperature) a backend's model will have, without creating it"""
+    backend = backend or LLM_BACKEND
+    if backend not in LLM_IDENTITIES:
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    return LLM_IDENTITIES[backend]
+
+def create_llm(backend: str = None):
+    """Create the chat model for a backend name, the configured one by default"""
+    backend = backend or LLM_BACKEND
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    return LLM_BACKENDS[backend]()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+# Cache Configuration
+LLM_CACHE_ENABLED = os.getenv("ECOAGENT_LLM_CACHE", "on").lower() not in ("0", "off", "false", "no")
+LLM_CACHE_PATH = os.getenv("ECOAGENT_LLM_CACHE_PATH", "energy_cache/llm_responses.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("ECOAGENT_LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("ECOAGENT_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    lines = (" ".join(line.split()) for line in prompt.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+def make_cache_key(model: str, temperature: Any, prompt: str) -> str:
+    """Build a cache key from the model settings and a hash of the normalized prompt"""
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model}|{temperature}|{prompt_hash}"
+
+class ResponseCache:
+    """SQLite-backed string cache with least-recently-used eviction and a TTL
+
+    The database is opened on first use, so constructing a cache has no
+    filesystem side effects. A single connection is shared between threads
+    and guarded by a lock.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 7 * 24 * 3600, enabled: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            conn.commit()
+
+    def delete(self, key: str):
+        """Remove one entry, if present"""
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+
+    def get_json(self, key: str) -> Optional[Any]:
+        """Return a cached JSON value, or None on a miss"""
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value: Any):
+        """Store a JSON-serializable value"""
+        self.set(key, json.dumps(value))
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            if self.enabled:
+                conn = self._connect()
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            entries = 0
+            if self.enabled:
+                entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Shared LLM response cache
+llm_cache = ResponseCache(
+    LLM_CACHE_PATH,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    enabled=LLM_CACHE_ENABLED
+)
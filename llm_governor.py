@@ -0,0 +1,281 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, Optional
+
+from tracing import metrics
+
+# LLM Governor Configuration
+# Requests per second across all sessions (0 = unlimited) and the burst the
+# token bucket allows above that rate
+LLM_RATE_LIMIT = float(os.getenv("ECOAGENT_LLM_RATE_LIMIT", "0"))
+LLM_RATE_BURST = int(os.getenv("ECOAGENT_LLM_RATE_BURST", "10"))
+
+# Requests allowed in flight at once, hedges and abandoned attempts included
+LLM_MAX_IN_FLIGHT = int(os.getenv("ECOAGENT_LLM_MAX_IN_FLIGHT", "16"))
+
+# Seconds allowed per attempt, and for a whole call including retries
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("ECOAGENT_LLM_ATTEMPT_TIMEOUT", "30"))
+LLM_DEADLINE = float(os.getenv("ECOAGENT_LLM_DEADLINE", "90"))
+
+# Retries after a failed or timed-out attempt, with full-jitter exponential
+# backoff starting at LLM_RETRY_BACKOFF seconds
+LLM_RETRIES = int(os.getenv("ECOAGENT_LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("ECOAGENT_LLM_RETRY_BACKOFF", "0.5"))
+
+# Hedging: "off", a delay in seconds, or "p95" to send a second request once
+# the first has taken longer than 95% of recent calls
+LLM_HEDGE = os.getenv("ECOAGENT_LLM_HEDGE", "off")
+
+# Recent call latencies kept for the p95 hedge delay, and the fewest needed
+# before hedging starts
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call misses its deadline, including while waiting for capacity"""
+
+class TokenBucket:
+    """Token-bucket rate limiter shared between threads"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _wait_time(self) -> float:
+        """Take a token if one is available (returning 0), else return seconds until one is"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a token, waiting up to `timeout` seconds; returns False if none arrived in time"""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self._wait_time()
+            if delay == 0.0:
+                return True
+            if deadline is not None and time.monotonic() + delay > deadline:
+                return False
+            time.sleep(delay)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available now"""
+        return self.rate <= 0 or self._wait_time() == 0.0
+
+class LLMGovernor:
+    """Rate limit, concurrency cap, deadlines, retries and hedging around a chat model
+
+    Attempts run on a worker pool so a caller can stop waiting at its
+    deadline. A timed-out request cannot be cancelled and keeps its
+    in-flight slot until it returns, so a stalled provider cannot be flooded
+    with replacements. A hedge is a second request sent once the first has
+    run past the hedge delay; whichever answers first wins. Hedges are only
+    sent when a slot and a rate-limit token are free at that moment.
+    """
+
+    def __init__(self, rate: float = LLM_RATE_LIMIT, burst: int = LLM_RATE_BURST,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT, attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+                 deadline: float = LLM_DEADLINE, retries: int = LLM_RETRIES,
+                 backoff: float = LLM_RETRY_BACKOFF, hedge: str = LLM_HEDGE):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = str(hedge).lower()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.in_flight = 0
+        self._wait_total = 0.0
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds before a hedge is sent, or None when hedging is off or lacks latency samples"""
+        if self.hedge in ("", "off", "0", "false", "no"):
+            return None
+        if self.hedge != "p95":
+            return float(self.hedge)
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+    def _acquire(self, deadline: float) -> bool:
+        """Wait for a rate-limit token and an in-flight slot before `deadline`"""
+        start = time.monotonic()
+        acquired = (self.bucket.acquire(deadline - start)
+                    and self._slots.acquire(timeout=max(deadline - time.monotonic(), 0.0)))
+        self._count("_wait_total", time.monotonic() - start)
+        return acquired
+
+    def _submit(self, fn, *args):
+        """Run fn on the worker pool in an already acquired slot, releasing it when fn returns"""
+        self._count("attempts")
+        self._count("in_flight")
+
+        def run():
+            start = time.monotonic()
+            try:
+                result = fn(*args)
+                with self._lock:
+                    self._latencies.append(time.monotonic() - start)
+                return result
+            finally:
+                self._count("in_flight", -1)
+                self._slots.release()
+        return self._executor.submit(run)
+
+    def _attempt(self, model: Any, prompt: str, deadline: float) -> Any:
+        """One attempt, plus a hedge if it runs past the hedge delay; raises on failure or timeout"""
+        if not self._acquire(deadline):
+            raise LLMTimeoutError("Timed out waiting for LLM capacity")
+        attempt_deadline = min(deadline, time.monotonic() + self.attempt_timeout)
+        pending = {self._submit(model.invoke, prompt)}
+        hedge_delay = self.hedge_delay()
+        hedge = None
+        if hedge_delay is not None:
+            done, pending = wait(pending, timeout=min(hedge_delay, max(attempt_deadline - time.monotonic(), 0.0)))
+            if done:
+                return done.pop().result()
+            if time.monotonic() < attempt_deadline and self.bucket.try_acquire() and self._slots.acquire(blocking=False):
+                hedge = self._submit(model.invoke, prompt)
+                pending.add(hedge)
+                self._count("hedges")
+                metrics.inc("ecoagent_llm_hedges_total", {})
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(attempt_deadline - time.monotonic(), 0.0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            future = done.pop()
+            try:
+                result = future.result()
+            except Exception as e:
+                # Wait for the other request, if any, before giving up
+                error = e
+                continue
+            if future is hedge:
+                self._count("hedge_wins")
+            return result
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        metrics.inc("ecoagent_llm_timeouts_total", {})
+        raise LLMTimeoutError(f"LLM request timed out after {self.attempt_timeout:g}s")
+
+    def _backoff(self, retry: int, deadline: float) -> bool:
+        """Sleep a full-jitter backoff before retry number `retry`; False if it would pass the deadline"""
+        delay = self._rng.uniform(0, self.backoff * 2 ** retry)
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def invoke(self, model: Any, prompt: str) -> Any:
+        """Call model.invoke(prompt) under the rate limit, concurrency cap, deadline and retry policy
+
+        Raises the last attempt's error, or LLMTimeoutError, once retries or
+        the deadline run out.
+        """
+        self._count("calls")
+        deadline = time.monotonic() + self.deadline
+        for retry in range(self.retries + 1):
+            try:
+                return self._attempt(model, prompt, deadline)
+            except Exception as e:
+                error = e
+            if retry == self.retries or not self._backoff(retry, deadline):
+                break
+            self._count("retried")
+            metrics.inc("ecoagent_llm_retries_total", {})
+        self._count("failures")
+        raise error
+
+    def stream(self, model: Any, prompt: str) -> Iterator[Any]:
+        """Yield model.stream(prompt) chunks under the rate limit and concurrency cap
+
+        Failures before the first chunk are retried like invoke(); once text
+        has been yielded a failure is raised, since the caller has already
+        used it. Streams are not hedged and run on the caller's thread, so
+        the deadline bounds waiting for capacity and retries but not the
+        stream itself.
+        """
+        self._count("calls")
+        deadline = time.monotonic() + self.deadline
+        for retry in range(self.retries + 1):
+            if not self._acquire(deadline):
+                error = LLMTimeoutError("Timed out waiting for LLM capacity")
+                break
+            self._count("attempts")
+            self._count("in_flight")
+            started = False
+            try:
+                for chunk in model.stream(prompt):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    self._count("failures")
+                    raise
+                error = e
+            finally:
+                self._count("in_flight", -1)
+                self._slots.release()
+            if retry == self.retries or not self._backoff(retry, deadline):
+                break
+            self._count("retried")
+            metrics.inc("ecoagent_llm_retries_total", {})
+        self._count("failures")
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call, retry, hedge and timeout counts and the current limits"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retried,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "rate_limit": self.bucket.rate,
+                "hedge": self.hedge,
+                "avg_wait_ms": round(self._wait_total * 1000 / self.calls, 2) if self.calls else 0.0
+            }
+
+# Shared governor for every LLM call the graphs make
+llm_governor = LLMGovernor()
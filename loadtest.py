@@ -0,0 +1,207 @@
+"""HTTP load generator for the EcoAgent API
+
+Run with: python loadtest.py [--url URL] [--endpoints analyze,simulate,logs]
+                             [--concurrency N] [--duration SECONDS | --requests N]
+                             [--llm-latency SPEC] [--json PATH]
+
+Without --url an in-process server is started with the offline FakeLLM
+backend, so a run needs no network access or API key. Each worker thread
+sends requests back to back, cycling through the endpoints; results give
+requests per second and p50/p95/p99 latency per endpoint.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+# Usage profiles requests are drawn from, jittered so only some repeat
+LOAD_USAGE_PROFILES = [
+    {"fan": 8, "lights": 5, "refrigerator": 24, "tv": 3},
+    {"fan": 8, "lights": 5, "refrigerator": 24, "tv": 3, "ac": 4},
+    {"fan": 10, "lights": 6, "refrigerator": 24, "tv": 5, "ac": 10, "water_heater": 2}
+]
+
+def _analyze_request(rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    usage = rng.choice(LOAD_USAGE_PROFILES)
+    return "POST", "/api/analyze", {
+        "usage": {appliance: max(0.0, hours + rng.choice((-1, -0.5, 0, 0.5, 1))) for appliance, hours in usage.items()},
+        "days": rng.choice((7, 30))
+    }
+
+def _simulate_request(rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    return "POST", "/api/simulate", {"days": rng.choice((7, 30))}
+
+def _logs_request(rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    return "GET", "/api/logs?limit=10", None
+
+LOAD_ENDPOINTS: Dict[str, Callable[[random.Random], Tuple[str, str, Optional[Dict[str, Any]]]]] = {
+    "analyze": _analyze_request,
+    "simulate": _simulate_request,
+    "logs": _logs_request
+}
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..1) of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+def latency_summary(durations: List[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """Request count, errors, throughput and p50/p95/p99/max latency in milliseconds"""
+    durations = sorted(durations)
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "rps": round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 1),
+        "max_ms": round(durations[-1] * 1000, 1) if durations else 0.0
+    }
+
+def _send(base_url: str, method: str, path: str, body: Optional[Dict[str, Any]], timeout: float) -> int:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def run_load(base_url: str, endpoints: List[str], concurrency: int = 8, duration: float = 10.0,
+             requests: Optional[int] = None, timeout: float = 60.0, seed: int = 0) -> Dict[str, Any]:
+    """Send requests from `concurrency` threads until `duration` seconds pass or `requests` are sent
+
+    A response other than 2xx, or a connection error or timeout, counts as
+    an error; its latency is still recorded.
+    """
+    unknown = [name for name in endpoints if name not in LOAD_ENDPOINTS]
+    if unknown:
+        raise ValueError(f"Unknown endpoints: {', '.join(unknown)}")
+
+    durations = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    lock = threading.Lock()
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    def work(worker: int):
+        nonlocal sent
+        rng = random.Random(seed * 1000 + worker)
+        turn = worker
+        while time.perf_counter() < deadline:
+            with lock:
+                if requests is not None and sent >= requests:
+                    return
+                sent += 1
+            name = endpoints[turn % len(endpoints)]
+            turn += 1
+            method, path, body = LOAD_ENDPOINTS[name](rng)
+            start = time.perf_counter()
+            try:
+                ok = 200 <= _send(base_url, method, path, body, timeout) < 300
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                durations[name].append(elapsed)
+                errors[name] += not ok
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(worker,), daemon=True) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "config": {"url": base_url, "endpoints": endpoints, "concurrency": concurrency,
+                   "duration_s": duration, "requests": requests},
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {name: latency_summary(durations[name], elapsed, errors[name]) for name in endpoints},
+        "total": latency_summary([d for name in endpoints for d in durations[name]], elapsed, sum(errors.values()))
+    }
+
+class LocalServer:
+    """The Flask app served on a free localhost port from a background thread"""
+
+    def __init__(self):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        import connect
+
+        class QuietHandler(WSGIRequestHandler):
+            # Per-request access logging would dominate a load test's output
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self._server = make_server("127.0.0.1", 0, connect.app, threaded=True, request_handler=QuietHandler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "LocalServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._thread.join()
+
+def run_local_load(endpoints: List[str], llm_latency: str = "lognormal:0.05:0.5", **options) -> Dict[str, Any]:
+    """run_load() against an in-process server using the offline fake LLM"""
+    import app
+    from llm_backends import FakeLLM
+    previous = app.__dict__.get("llm")
+    app.llm = FakeLLM(llm_latency)
+    try:
+        with LocalServer() as server:
+            result = run_load(server.url, endpoints, **options)
+            result["config"]["llm_latency"] = llm_latency
+            return result
+    finally:
+        if previous is None:
+            del app.llm
+        else:
+            app.llm = previous
+
+def main(argv: List[str]):
+    parser = argparse.ArgumentParser(description="Load test the EcoAgent HTTP API")
+    parser.add_argument("--url", help="Base URL of a running server; omit to start one in-process")
+    parser.add_argument("--endpoints", default=",".join(LOAD_ENDPOINTS), help="Comma-separated endpoints to exercise")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--llm-latency", default="lognormal:0.05:0.5", help="Fake LLM latency for the in-process server")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    options = {"concurrency": args.concurrency, "duration": args.duration, "requests": args.requests, "timeout": args.timeout}
+    output = os.path.abspath(args.json) if args.json else None
+    if args.url:
+        result = run_load(args.url.rstrip("/"), endpoints, **options)
+    else:
+        # Keep session logs and caches written by the server out of the working tree
+        os.chdir(tempfile.mkdtemp(prefix="ecoagent_load_"))
+        result = run_local_load(endpoints, args.llm_latency, **options)
+    result["timestamp"] = datetime.now().isoformat()
+
+    print(json.dumps(result, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
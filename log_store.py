@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+
+# Log Backend Configuration
+LOG_BACKEND = os.getenv("ECOAGENT_LOG_BACKEND", "sqlite")
+LOG_DIR = os.getenv("ECOAGENT_LOG_DIR", "energy_logs")
+LOG_DB_PATH = os.getenv("ECOAGENT_LOG_DB_PATH", os.path.join(LOG_DIR, "sessions.db"))
+
+class JSONDirectoryLogStore:
+    """Session logs as one pretty-printed JSON file each
+
+    Queries open and sort every file, so they grow with the number of
+    sessions. Kept for compatibility and as the migration source.
+    """
+
+    def __init__(self, directory: str = LOG_DIR):
+        self.directory = directory
+
+    def append(self, log: Dict[str, Any]):
+        """Write one session log"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"session_{log['id']}.json"), "w") as f:
+            json.dump(log, f, indent=2)
+
+    def import_logs(self, logs: Iterable[Dict[str, Any]]) -> int:
+        """Write many session logs; returns the number written"""
+        added = 0
+        for log in logs:
+            self.append(log)
+            added += 1
+        return added
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Yield every session log in directory order"""
+        if not os.path.exists(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                with open(os.path.join(self.directory, filename), "r") as f:
+                    yield json.load(f)
+
+    def latest(self, limit: int = 10, user_id: str = None) -> List[Dict[str, Any]]:
+        """Return the most recent session logs, optionally for one user"""
+        logs = [log for log in self.iter_all() if user_id is None or log.get("user_id") == user_id]
+        logs.sort(key=lambda x: x["timestamp"], reverse=True)
+        return logs[:limit]
+
+    def count(self) -> int:
+        """Return the number of stored sessions"""
+        return sum(1 for _ in self.iter_all())
+
+class SQLiteLogStore:
+    """Session logs in SQLite, indexed on timestamp and (user_id, timestamp)
+
+    "Latest N" and per-user queries walk an index instead of reading every
+    session, so they stay fast as the history grows.
+    """
+
+    def __init__(self, path: str = LOG_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, user_id TEXT, "
+                "category TEXT, record TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions (timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_timestamp ON sessions (user_id, timestamp)")
+        return self._conn
+
+    @staticmethod
+    def _row(log: Dict[str, Any]) -> tuple:
+        return (log["id"], log["timestamp"], log.get("user_id"), log.get("category"), json.dumps(log))
+
+    def append(self, log: Dict[str, Any]):
+        """Store one session log"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)", self._row(log))
+            conn.commit()
+
+    def import_logs(self, logs: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """Bulk-insert session logs, skipping ids already present; returns the number added"""
+        added = 0
+        batch = []
+        with self._lock:
+            conn = self._connect()
+            for log in logs:
+                batch.append(self._row(log))
+                if len(batch) >= batch_size:
+                    added += self._insert_batch(conn, batch)
+                    batch = []
+            if batch:
+                added += self._insert_batch(conn, batch)
+        return added
+
+    @staticmethod
+    def _insert_batch(conn: sqlite3.Connection, batch: List[tuple]) -> int:
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, ?)", batch)
+        conn.commit()
+        return conn.total_changes - before
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Yield every session log in timestamp order"""
+        with self._lock:
+            rows = self._connect().execute("SELECT record FROM sessions ORDER BY timestamp").fetchall()
+        for (record,) in rows:
+            yield json.loads(record)
+
+    def latest(self, limit: int = 10, user_id: str = None) -> List[Dict[str, Any]]:
+        """Return the most recent session logs, optionally for one user"""
+        with self._lock:
+            conn = self._connect()
+            if user_id is None:
+                rows = conn.execute(
+                    "SELECT record FROM sessions ORDER BY timestamp DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT record FROM sessions WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+                    (user_id, limit)
+                ).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def count(self) -> int:
+        """Return the number of stored sessions"""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+LOG_BACKENDS = {
+    "json": lambda: JSONDirectoryLogStore(LOG_DIR),
+    "sqlite": lambda: SQLiteLogStore(LOG_DB_PATH)
+}
+
+_log_store = None
+_log_store_lock = threading.Lock()
+
+def get_log_store():
+    """Return the configured session log store, creating it on first use"""
+    global _log_store
+    if _log_store is None:
+        with _log_store_lock:
+            if _log_store is None:
+                _log_store = LOG_BACKENDS[LOG_BACKEND]()
+    return _log_store
+
+def set_log_store(store: Optional[Any]):
+    """Replace the shared log store; None re-creates the configured backend on next use"""
+    global _log_store
+    with _log_store_lock:
+        _log_store = store
+
+def migrate_json_logs(source: str = LOG_DIR, target: str = LOG_DB_PATH) -> Dict[str, int]:
+    """Import JSON session files into a SQLite log store"""
+    store = SQLiteLogStore(target)
+    added = store.import_logs(JSONDirectoryLogStore(source).iter_all())
+    return {"imported": added, "total": store.count()}
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="EcoAgent session log store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="import energy_logs/*.json into SQLite")
+    migrate.add_argument("--source", default=LOG_DIR, help="directory of session_*.json files")
+    migrate.add_argument("--target", default=LOG_DB_PATH, help="SQLite database to create or extend")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        result = migrate_json_logs(args.source, args.target)
+        print(f"Imported {result['imported']} sessions into {args.target} ({result['total']} total)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
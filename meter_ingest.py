@@ -0,0 +1,158 @@
+import os
+import csv
+import json
+import threading
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Any, Optional, TextIO
+
+import numpy as np
+
+from energy_data import APPLIANCE_POWER, ENERGY_COST_PER_KWH, EnergyData
+
+# Meter Ingestion Configuration
+# Days of daily aggregates kept per user; older days are dropped as new ones arrive
+METER_MAX_DAYS = int(os.getenv("ECOAGENT_METER_MAX_DAYS", "365"))
+
+def iter_csv_readings(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield readings from CSV text with a user_id,timestamp,appliance,kwh header"""
+    return csv.DictReader(lines)
+
+def iter_ndjson_readings(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield readings from newline-delimited JSON, one object per line"""
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Counted as a rejected reading rather than aborting the stream
+                yield None
+
+READING_FORMATS = {
+    "csv": iter_csv_readings,
+    "ndjson": iter_ndjson_readings
+}
+
+def reading_date(timestamp: Any) -> str:
+    """ISO date of an ISO 8601 timestamp string or a Unix epoch in seconds (UTC)
+
+    Timestamps are taken in the meter's local time; only the date is kept.
+    """
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+    text = str(timestamp).strip()
+    if len(text) > 10 and text[10] not in "T ":
+        return datetime.fromisoformat(text).strftime("%Y-%m-%d")
+    return date.fromisoformat(text[:10]).isoformat()
+
+class MeterAggregator:
+    """Running per-user, per-appliance daily kWh totals folded from interval readings
+
+    Each reading is added to its user's day and then discarded, so memory
+    depends on users x retained days x appliances, not on the number of
+    readings. Appliance hours are derived from kWh and the rated power,
+    matching how EnergyData relates the two.
+    """
+
+    def __init__(self, max_days: int = METER_MAX_DAYS):
+        self.max_days = max_days
+        self.appliances = list(APPLIANCE_POWER)
+        self._columns = {appliance: column for column, appliance in enumerate(self.appliances)}
+        self._days: Dict[str, Dict[str, List[float]]] = {}
+        self._lock = threading.Lock()
+        self.readings = 0
+        self.rejected = 0
+        self.stale = 0
+        self.dropped_days = 0
+
+    def add(self, reading: Dict[str, Any]) -> bool:
+        """Fold one reading into the daily totals; returns False if it was rejected or predates the retained days"""
+        try:
+            user_id = str(reading["user_id"] or "")
+            column = self._columns[reading["appliance"]]
+            kwh = float(reading["kwh"])
+            day_key = reading_date(reading["timestamp"])
+            if not user_id or not kwh >= 0:
+                raise ValueError("invalid reading")
+        except (KeyError, TypeError, ValueError):
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            days = self._days.setdefault(user_id, {})
+            day = days.get(day_key)
+            if day is None:
+                if len(days) >= self.max_days:
+                    oldest = min(days)
+                    if day_key < oldest:
+                        # A late reading for a day already outside the window
+                        self.stale += 1
+                        return False
+                    del days[oldest]
+                    self.dropped_days += 1
+                day = days[day_key] = [0.0] * len(self.appliances)
+            day[column] += kwh
+            self.readings += 1
+        return True
+
+    def ingest(self, readings: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Fold a stream of readings; returns how many were accepted and rejected"""
+        accepted = rejected = 0
+        for reading in readings:
+            if self.add(reading):
+                accepted += 1
+            else:
+                rejected += 1
+        return {"accepted": accepted, "rejected": rejected}
+
+    def users(self) -> List[str]:
+        """Return the users with aggregated readings"""
+        with self._lock:
+            return list(self._days)
+
+    def energy_data(self, user_id: str, days: Optional[int] = None) -> Optional[EnergyData]:
+        """Return a user's daily aggregates as EnergyData, optionally only the latest days
+
+        Only days with readings are included, oldest first, and only the
+        appliances that reported any. Returns None for an unknown user.
+        """
+        if days is not None and days < 1:
+            raise ValueError("days must be at least 1")
+        with self._lock:
+            user_days = self._days.get(user_id)
+            if not user_days:
+                return None
+            dates = sorted(user_days)[-days:] if days is not None else sorted(user_days)
+            kwh = np.array([user_days[day_key] for day_key in dates], dtype=np.float64)
+
+        reported = kwh.any(axis=0)
+        appliances = [appliance for appliance, used in zip(self.appliances, reported) if used]
+        kwh = kwh[:, reported]
+        power = np.array([APPLIANCE_POWER[appliance] for appliance in appliances], dtype=np.float64)
+        return EnergyData(
+            user_id, dates, appliances, kwh * 1000 / power, kwh, kwh * ENERGY_COST_PER_KWH,
+            period=f"{len(dates)} days"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return reading counts and the size of the aggregates held"""
+        with self._lock:
+            return {
+                "users": len(self._days),
+                "user_days": sum(len(days) for days in self._days.values()),
+                "readings": self.readings,
+                "rejected": self.rejected,
+                "stale": self.stale,
+                "dropped_days": self.dropped_days,
+                "max_days": self.max_days
+            }
+
+# Shared aggregator for uploaded meter readings
+meter_aggregator = MeterAggregator()
+
+def ingest_stream(stream: TextIO, reading_format: str, aggregator: MeterAggregator = None) -> Dict[str, int]:
+    """Parse readings from a text stream ("csv" or "ndjson") and fold them into an aggregator"""
+    if reading_format not in READING_FORMATS:
+        raise ValueError(f"Unsupported reading format: {reading_format}")
+    return (aggregator or meter_aggregator).ingest(READING_FORMATS[reading_format](stream))
@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import math
+import hashlib
+from typing import Dict, List, Any
+
+from llm_cache import ResponseCache
+
+# Profile Bucket Configuration
+PROFILE_CACHE_ENABLED = os.getenv("ECOAGENT_PROFILE_CACHE", "off").lower() in ("1", "on", "true", "yes")
+PROFILE_CACHE_PATH = os.getenv("ECOAGENT_PROFILE_CACHE_PATH", "energy_cache/profile_buckets.db")
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("ECOAGENT_PROFILE_CACHE_MAX_ENTRIES", "1000"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("ECOAGENT_PROFILE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Bin width for average daily consumption (kWh)
+PROFILE_KWH_STEP = float(os.getenv("ECOAGENT_PROFILE_KWH_STEP", "0.5"))
+
+# Bin width for average daily hours, per appliance. Short-running, high-power
+# appliances get finer bins because small changes move their share of the bill.
+PROFILE_HOUR_STEPS = {
+    "default": float(os.getenv("ECOAGENT_PROFILE_HOURS_STEP", "1.0")),
+    "refrigerator": 24.0,
+    "washing_machine": 0.5,
+    "water_heater": 0.5,
+    "microwave": 0.5
+}
+
+# LLM-written sections shared by every household in a bucket
+CACHED_SECTIONS = ["pattern_analysis", "recommendation", "smart_suggestions", "action_plan"]
+
+# Summary figures that are templated out of cached text and filled back in
+TEMPLATED_FIELDS = ["total_kwh", "total_cost", "avg_daily_kwh", "avg_daily_cost"]
+
+def _bin(value: float, step: float) -> int:
+    return int(math.floor(value / step)) if step > 0 else 0
+
+def profile_bucket_key(summary: Dict[str, Any], appliance_totals: Dict[str, Dict[str, Any]],
+                       category: str, wastage_issues: List[str]) -> str:
+    """Return the bucket key for a household profile
+
+    Households in the same category, with the same wastage issues and the same
+    binned daily kWh and per-appliance hours share a bucket.
+    """
+    hours = {
+        appliance: _bin(totals["avg_hours"], PROFILE_HOUR_STEPS.get(appliance, PROFILE_HOUR_STEPS["default"]))
+        for appliance, totals in sorted(appliance_totals.items())
+    }
+    # Wastage issues embed exact hours; compare only which issues fired
+    issues = sorted(re.sub(r"\d+(?:\.\d+)?", "#", issue) for issue in wastage_issues)
+    bucket = {
+        "category": category,
+        "days": summary["days_analyzed"],
+        "avg_daily_kwh": _bin(summary["avg_daily_kwh"], PROFILE_KWH_STEP),
+        "hours": hours,
+        "wastage": issues
+    }
+    return hashlib.sha256(json.dumps(bucket, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _number_pattern(value: Any) -> str:
+    return r"(?<![\d.])" + re.escape(str(value)) + r"(?![\d])"
+
+def templatize_sections(sections: Dict[str, str], summary: Dict[str, Any]) -> Dict[str, str]:
+    """Replace this household's exact summary figures in LLM text with placeholders"""
+    templated = {}
+    for name, text in sections.items():
+        for field in TEMPLATED_FIELDS:
+            value = summary.get(field)
+            # Whole numbers are too likely to collide with unrelated text
+            if isinstance(value, float) and not value.is_integer():
+                text = re.sub(_number_pattern(value), "{{" + field + "}}", text)
+        templated[name] = text
+    return templated
+
+def fill_sections(sections: Dict[str, str], summary: Dict[str, Any]) -> Dict[str, str]:
+    """Fill placeholders in cached LLM text with another household's exact figures"""
+    filled = {}
+    for name, text in sections.items():
+        for field in TEMPLATED_FIELDS:
+            text = text.replace("{{" + field + "}}", str(summary.get(field, "")))
+        filled[name] = text
+    return filled
+
+# Shared profile bucket cache
+profile_cache = ResponseCache(
+    PROFILE_CACHE_PATH,
+    max_entries=PROFILE_CACHE_MAX_ENTRIES,
+    ttl_seconds=PROFILE_CACHE_TTL_SECONDS,
+    enabled=PROFILE_CACHE_ENABLED
+)
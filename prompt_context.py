@@ -0,0 +1,129 @@
+import os
+import re
+from typing import Callable, Dict, List, Any, Optional
+
+from tracing import metrics
+
+# Prompt Compaction Configuration
+# With compaction on, prompts quote rounded figures, a short appliance list
+# and a digest of the pattern analysis instead of raw state; off restores
+# the verbose context
+PROMPT_COMPACTION = os.getenv("ECOAGENT_PROMPT_COMPACTION", "on").lower() not in ("0", "off", "false", "no")
+
+# Estimated input tokens allowed per node. A prompt over budget is rebuilt at
+# the next compaction level (fewer appliance rows, a shorter digest); one still
+# over at the last level is sent anyway and counted in the metrics.
+PROMPT_TOKEN_BUDGET = {
+    "usage_pattern_analyzer": 220,
+    "efficient_user": 180,
+    "moderate_user": 180,
+    "excessive_user": 180,
+    "smart_suggestions": 130,
+    "action_plan": 90,
+    "single_call_advisor": 340
+}
+
+# Per compaction level: appliance rows listed (the rest are summed into one
+# row), digest length in tokens and wastage issues quoted
+COMPACTION_LEVELS = [
+    {"appliances": None, "digest_tokens": 60, "wastage_issues": None},
+    {"appliances": 5, "digest_tokens": 35, "wastage_issues": 5},
+    {"appliances": 3, "digest_tokens": 15, "wastage_issues": 3}
+]
+
+_MARKDOWN = re.compile(r"[*_`#>]+")
+_LIST_MARKER = re.compile(r"^\s*(?:[-•]|\d+[.)])\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_RATING = re.compile(r"\b(?:Excellent|Good|Average|Poor)\b")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English prose)"""
+    return max(1, len(text) // 4)
+
+def _level(level: Optional[int]) -> Optional[Dict[str, Any]]:
+    return None if level is None else COMPACTION_LEVELS[level]
+
+def appliance_lines(appliance_totals: Dict[str, Dict[str, float]], level: Optional[int]) -> str:
+    """The per-appliance block: every appliance in state order when verbose, else largest first and rounded"""
+    if level is None:
+        return "\n".join(
+            f"- {appliance.title()}: {totals['total_kwh']} kWh, ₹{totals['total_cost']}, avg {totals['avg_hours']} hours/day"
+            for appliance, totals in appliance_totals.items()
+        )
+    ranked = sorted(appliance_totals.items(), key=lambda item: item[1]["total_kwh"], reverse=True)
+    limit = _level(level)["appliances"]
+    shown, rest = (ranked, []) if limit is None or len(ranked) <= limit + 1 else (ranked[:limit], ranked[limit:])
+    lines = [
+        f"- {appliance}: {totals['total_kwh']:.1f} kWh, ₹{totals['total_cost']:.0f}, {totals['avg_hours']:.1f}h/day"
+        for appliance, totals in shown
+    ]
+    if rest:
+        lines.append(f"- {len(rest)} others: {sum(totals['total_kwh'] for _, totals in rest):.1f} kWh, "
+                     f"₹{sum(totals['total_cost'] for _, totals in rest):.0f}")
+    return "\n".join(lines)
+
+def top_consumers(appliance_totals: Dict[str, Dict[str, float]], level: Optional[int], count: int = 3) -> str:
+    """The largest consumers: raw (name, totals) pairs when verbose, else names with kWh and share of the total"""
+    ranked = sorted(appliance_totals.items(), key=lambda item: item[1]["total_kwh"], reverse=True)[:count]
+    if level is None:
+        return str(ranked)
+    total_kwh = sum(totals["total_kwh"] for totals in appliance_totals.values()) or 1.0
+    return ", ".join(
+        f"{appliance} {totals['total_kwh']:.1f} kWh ({totals['total_kwh'] * 100 / total_kwh:.0f}%)"
+        for appliance, totals in ranked
+    )
+
+def wastage_context(wastage_issues: List[str], level: Optional[int]) -> str:
+    """The wastage issues: the raw list when verbose, else joined, capped per level"""
+    if level is None:
+        return str(wastage_issues)
+    if not wastage_issues:
+        return "none"
+    limit = _level(level)["wastage_issues"]
+    if limit is None or len(wastage_issues) <= limit:
+        return "; ".join(wastage_issues)
+    return "; ".join(wastage_issues[:limit]) + f" (+{len(wastage_issues) - limit} more)"
+
+def analysis_digest(text: str, max_tokens: int) -> str:
+    """Shorten a free-text analysis to its leading sentences, keeping the efficiency rating
+
+    Markdown emphasis, headings and list markers are dropped. Sentences are
+    taken in order, skipping any that no longer fit in max_tokens; the first
+    sentence that states a rating is always kept.
+    """
+    lines = [_LIST_MARKER.sub("", _MARKDOWN.sub("", line)).strip() for line in text.splitlines()]
+    sentences = [sentence for line in lines if line and not line.endswith(":")
+                 for sentence in _SENTENCE_END.split(line) if sentence]
+    rating = next((sentence for sentence in sentences if "rating" in sentence.lower() and _RATING.search(sentence)), None)
+    budget = max_tokens * 4 - (len(rating) + 1 if rating else 0)
+    digest = []
+    for sentence in sentences:
+        if sentence is rating:
+            continue
+        if len(sentence) + 1 > budget:
+            continue
+        digest.append(sentence)
+        budget -= len(sentence) + 1
+    if rating:
+        digest.append(rating)
+    return " ".join(digest)
+
+def analysis_context(text: str, level: Optional[int]) -> str:
+    """The pattern analysis quoted by later prompts: the full text when verbose, else a digest"""
+    return text if level is None else analysis_digest(text, _level(level)["digest_tokens"])
+
+def build_prompt(node: str, render: Callable[[Optional[int]], str]) -> str:
+    """Render a node's prompt, compacting further until it fits the node's token budget
+
+    render(level) builds the prompt with context at a compaction level, or
+    verbose context for None, which is used when compaction is off.
+    """
+    if not PROMPT_COMPACTION:
+        return render(None)
+    budget = PROMPT_TOKEN_BUDGET.get(node)
+    for level in range(len(COMPACTION_LEVELS)):
+        prompt = render(level).strip()
+        if budget is None or estimate_tokens(prompt) <= budget:
+            return prompt
+    metrics.inc("ecoagent_prompt_over_budget_total", {"node": node})
+    return prompt
@@ -0,0 +1,294 @@
+import os
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+
+# Tracing Configuration
+TRACING_ENABLED = os.getenv("ECOAGENT_TRACING", "on").lower() not in ("0", "off", "false", "no")
+
+# LLM prices in US dollars per million tokens, used for the cost estimates
+# (defaults are Gemini 1.5 Flash list prices)
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("ECOAGENT_LLM_INPUT_COST_PER_MTOK", "0.075"))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("ECOAGENT_LLM_OUTPUT_COST_PER_MTOK", "0.30"))
+
+# Histogram bucket upper bounds in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Exported metrics: name -> (type, help)
+METRICS = {
+    "ecoagent_sessions_total": ("counter", "Analysis sessions run, by mode and outcome"),
+    "ecoagent_session_duration_seconds": ("histogram", "Wall time of an analysis session"),
+    "ecoagent_node_duration_seconds": ("histogram", "Wall time of a graph node"),
+    "ecoagent_node_queue_wait_seconds": ("histogram", "Time between the previous node finishing and a node starting"),
+    "ecoagent_node_errors_total": ("counter", "Graph nodes that raised or recorded an error"),
+    "ecoagent_job_queue_wait_seconds": ("histogram", "Time an analysis job waited in the job queue"),
+    "ecoagent_llm_calls_total": ("counter", "LLM calls by node and whether the response cache served them"),
+    "ecoagent_llm_duration_seconds": ("histogram", "Wall time of an LLM call, including cache lookups"),
+    "ecoagent_llm_errors_total": ("counter", "LLM calls that raised"),
+    "ecoagent_llm_retries_total": ("counter", "LLM attempts retried after a failure or timeout"),
+    "ecoagent_llm_hedges_total": ("counter", "Hedged second requests sent for slow LLM attempts"),
+    "ecoagent_llm_timeouts_total": ("counter", "LLM attempts abandoned at their timeout"),
+    "ecoagent_llm_tokens_total": ("counter", "Tokens sent to and received from the LLM"),
+    "ecoagent_llm_cost_usd_total": ("counter", "Estimated LLM spend in US dollars"),
+    "ecoagent_prompt_over_budget_total": ("counter", "Prompts still over their node's token budget at full compaction")
+}
+
+_current_trace = contextvars.ContextVar("ecoagent_trace", default=None)
+_current_span = contextvars.ContextVar("ecoagent_span", default=None)
+
+# Set by the job queue worker around a job so the session can report its wait
+job_queue_wait = contextvars.ContextVar("ecoagent_job_queue_wait", default=None)
+
+def llm_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated US dollar cost of a call's tokens"""
+    return (prompt_tokens * LLM_INPUT_COST_PER_MTOK + completion_tokens * LLM_OUTPUT_COST_PER_MTOK) / 1e6
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text exposition format"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float):
+        """Record one histogram observation"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format"""
+        def label_text(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, description) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{label_text(labels)} {value:g}")
+                continue
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, (('le', f'{bound:g}'),))} {cumulative:g}")
+                lines.append(f"{name}_bucket{label_text(labels, (('le', '+Inf'),))} {values[-1]:g}")
+                lines.append(f"{name}_sum{label_text(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{label_text(labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+# Shared metrics registry exported by /metrics
+metrics = Metrics()
+
+class Span:
+    """Timing and LLM usage for one node execution"""
+
+    __slots__ = ("node", "start", "end", "queue_wait", "llm_calls", "cache_hits", "llm_seconds",
+                 "prompt_tokens", "completion_tokens", "error")
+
+    def __init__(self, node: str, start: float, queue_wait: float):
+        self.node = node
+        self.start = start
+        self.end = None
+        self.queue_wait = queue_wait
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.error = None
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        span = {
+            "node": self.node,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "wall_ms": round(((self.end or time.perf_counter()) - self.start) * 1000, 2),
+            "queue_wait_ms": round(self.queue_wait * 1000, 2)
+        }
+        if self.llm_calls:
+            span.update({
+                "llm_calls": self.llm_calls,
+                "cache_hits": self.cache_hits,
+                "llm_ms": round(self.llm_seconds * 1000, 2),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost_usd": round(llm_cost(self.prompt_tokens, self.completion_tokens), 8)
+            })
+        if self.error:
+            span["error"] = self.error
+        return span
+
+class SessionTrace:
+    """Spans of every node run during one analysis session"""
+
+    def __init__(self, mode: str, queue_wait: Optional[float] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.mode = mode
+        self.queue_wait = queue_wait
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def _add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def _last_end(self, before: float) -> float:
+        with self._lock:
+            ends = [span.end for span in self.spans if span.end is not None and span.end <= before]
+        return max(ends, default=self.start)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the trace so far, with per-node spans in start order and session totals"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        prompt_tokens = sum(span.prompt_tokens for span in spans)
+        completion_tokens = sum(span.completion_tokens for span in spans)
+        trace = {
+            "trace_id": self.id,
+            "mode": self.mode,
+            "wall_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "llm_calls": sum(span.llm_calls for span in spans),
+            "cache_hits": sum(span.cache_hits for span in spans),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": round(llm_cost(prompt_tokens, completion_tokens), 8),
+            "errors": sum(1 for span in spans if span.error),
+            "nodes": [span.to_dict(self.start) for span in spans]
+        }
+        if self.queue_wait is not None:
+            trace["queue_wait_ms"] = round(self.queue_wait * 1000, 2)
+        return trace
+
+def current_trace() -> Optional[SessionTrace]:
+    """Return the trace of the session running in this context, if any"""
+    return _current_trace.get()
+
+@contextmanager
+def session_trace(mode: str) -> Iterator[Optional[SessionTrace]]:
+    """Trace an analysis session; nested sessions (such as a fallback run) join the outer one"""
+    outer = _current_trace.get()
+    if outer is not None or not TRACING_ENABLED:
+        yield outer
+        return
+    trace = SessionTrace(mode, job_queue_wait.get())
+    # Restored with set() rather than reset(): a streaming generator can be
+    # closed from a different context than the one it started in
+    _current_trace.set(trace)
+    outcome = "error"
+    try:
+        yield trace
+        outcome = "ok"
+    finally:
+        _current_trace.set(None)
+        metrics.inc("ecoagent_sessions_total", {"mode": mode, "outcome": outcome})
+        metrics.observe("ecoagent_session_duration_seconds", {"mode": mode}, time.perf_counter() - trace.start)
+
+@contextmanager
+def node_span(node: str) -> Iterator[Optional[Span]]:
+    """Time a node and collect the LLM calls it makes; errors raised inside are recorded and re-raised"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    span = Span(node, start, start - trace._last_end(start) if trace else 0.0)
+    outer = _current_span.get()
+    _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end = time.perf_counter()
+        _current_span.set(outer)
+        if trace is not None:
+            trace._add(span)
+        metrics.observe("ecoagent_node_duration_seconds", {"node": node}, span.end - span.start)
+        metrics.observe("ecoagent_node_queue_wait_seconds", {"node": node}, span.queue_wait)
+        if span.error:
+            metrics.inc("ecoagent_node_errors_total", {"node": node})
+
+def traced_node(node: str, fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+    """Wrap a graph node so each run is recorded as a span
+
+    Nodes that catch their own exceptions and set state["error"] are
+    recorded as failed too.
+    """
+    @functools.wraps(fn)
+    def run(state: dict) -> dict:
+        with node_span(node) as span:
+            error = state.get("error")
+            result = fn(state)
+            if span is not None and isinstance(result, dict) and result.get("error") and result.get("error") != error:
+                span.error = result["error"]
+            return result
+    return run
+
+def record_llm_call(node: str, seconds: float, cached: bool, response: Any = None, error: Exception = None):
+    """Record one LLM call against the current span and the metrics
+
+    Token counts come from the response's usage_metadata, as LangChain
+    reports them; cached responses spend no tokens.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = int(usage.get("input_tokens", 0)) if not cached else 0
+    completion_tokens = int(usage.get("output_tokens", 0)) if not cached else 0
+
+    span = _current_span.get()
+    if span is not None:
+        span.llm_calls += 1
+        span.cache_hits += cached
+        span.llm_seconds += seconds
+        span.prompt_tokens += prompt_tokens
+        span.completion_tokens += completion_tokens
+
+    metrics.inc("ecoagent_llm_calls_total", {"node": node, "cache": "hit" if cached else "miss"})
+    metrics.observe("ecoagent_llm_duration_seconds", {"node": node}, seconds)
+    if error is not None:
+        metrics.inc("ecoagent_llm_errors_total", {"node": node})
+    if prompt_tokens or completion_tokens:
+        metrics.inc("ecoagent_llm_tokens_total", {"node": node, "type": "prompt"}, prompt_tokens)
+        metrics.inc("ecoagent_llm_tokens_total", {"node": node, "type": "completion"}, completion_tokens)
+        metrics.inc("ecoagent_llm_cost_usd_total", {"node": node}, llm_cost(prompt_tokens, completion_tokens))
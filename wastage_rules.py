@@ -0,0 +1,339 @@
+import os
+import json
+import threading
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+import numpy as np
+
+from energy_data import EnergyData
+
+# Wastage Rule Configuration
+# Optional JSON or YAML rule file replacing the built-in rules
+WASTAGE_RULES_PATH = os.getenv("ECOAGENT_WASTAGE_RULES", "")
+
+METRICS = ("hours", "energy_kwh", "cost_rupees", "kwh_share")
+AGGREGATES = ("mean", "day", "rolling")
+OPERATORS = {">": (1, True), ">=": (1, False), "<": (-1, True), "<=": (-1, False)}
+
+# Pseudo-appliance for the household's combined usage
+TOTAL = "total"
+
+# Built-in rules: average hours/day above which an appliance is flagged
+DEFAULT_WASTAGE_RULES = [
+    {"id": "ac_hours", "appliance": "ac", "threshold": 10,
+     "message": "AC running {value} hours/day - consider using timer/thermostat"},
+    {"id": "lights_hours", "appliance": "lights", "threshold": 6,
+     "message": "Lights on {value} hours/day - check for unnecessary usage"},
+    {"id": "fan_hours", "appliance": "fan", "threshold": 14,
+     "message": "Fan running {value} hours/day - optimize based on occupancy"},
+    {"id": "tv_hours", "appliance": "tv", "threshold": 5,
+     "message": "TV on {value} hours/day - consider reducing screen time"},
+    {"id": "water_heater_hours", "appliance": "water_heater", "threshold": 2.5,
+     "message": "Water heater on {value} hours/day - check for leaks/insulation"}
+]
+
+def _normalize_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill defaults and validate one rule definition"""
+    rule_id = rule.get("id")
+    if not rule_id:
+        raise ValueError(f"Wastage rule has no id: {rule}")
+    normalized = {
+        "id": str(rule_id),
+        "appliance": rule.get("appliance"),
+        "metric": rule.get("metric", "hours"),
+        "aggregate": rule.get("aggregate", "mean"),
+        "window": int(rule.get("window", 1)),
+        "op": rule.get("op", ">"),
+        "threshold": rule.get("threshold"),
+        "min_days": int(rule.get("min_days", 1)),
+        "message": rule.get("message")
+    }
+    if not normalized["appliance"]:
+        raise ValueError(f"Wastage rule {rule_id} has no appliance")
+    if normalized["metric"] not in METRICS:
+        raise ValueError(f"Wastage rule {rule_id} has unknown metric {normalized['metric']!r}")
+    if normalized["aggregate"] not in AGGREGATES:
+        raise ValueError(f"Wastage rule {rule_id} has unknown aggregate {normalized['aggregate']!r}")
+    if normalized["op"] not in OPERATORS:
+        raise ValueError(f"Wastage rule {rule_id} has unknown operator {normalized['op']!r}")
+    if not isinstance(normalized["threshold"], (int, float)):
+        raise ValueError(f"Wastage rule {rule_id} needs a numeric threshold")
+    if not isinstance(normalized["message"], str):
+        raise ValueError(f"Wastage rule {rule_id} has no message")
+    if normalized["window"] < 1 or normalized["min_days"] < 1:
+        raise ValueError(f"Wastage rule {rule_id} needs window and min_days of at least 1")
+    if normalized["aggregate"] != "rolling":
+        normalized["window"] = 1
+    return normalized
+
+def _day_sums(values: np.ndarray) -> np.ndarray:
+    """Sum a households x days x columns array over days
+
+    Rows repeated by broadcasting have a zero stride and are multiplied
+    instead, as EnergyData does for its own totals.
+    """
+    if values.shape[1] and values.strides[1] == 0:
+        return values[:, 0] * values.shape[1]
+    return values.sum(axis=1)
+
+def _with_total(values: np.ndarray) -> np.ndarray:
+    """Append the sum over appliances as a last column"""
+    return np.concatenate([values, values.sum(axis=-1, keepdims=True)], axis=-1)
+
+def _share(energy: np.ndarray) -> np.ndarray:
+    """Each column's share of the last (total) column, 0 where the total is 0"""
+    total = energy[..., -1:]
+    return np.divide(energy, total, out=np.zeros(energy.shape), where=total > 0)
+
+class WastageRules:
+    """Declarative wastage rules compiled into vectorized checks
+
+    Each rule compares one metric of one appliance (or the household "total")
+    against a threshold:
+
+    - metric: "hours", "energy_kwh", "cost_rupees" or "kwh_share" (the
+      appliance's fraction of the household's kWh)
+    - aggregate: "mean" over the period, "day" for individual days, or
+      "rolling" for means over `window` consecutive days; "day" and
+      "rolling" rules fire once at least `min_days` days or windows match
+    - op: ">", ">=", "<" or "<="
+
+    Values are rounded to two decimals, as displayed, before comparing.
+    Rules sharing a metric, aggregate and window are evaluated together as
+    one array operation over households x days x appliances. Messages may
+    use {value} (the period mean, or the worst matching day or window),
+    {days}, {appliance} and {threshold}.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = [_normalize_rule(rule) for rule in rules]
+        ids = [rule["id"] for rule in self.rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Wastage rule ids must be unique")
+        self._groups: Dict[Tuple[str, str, int], List[int]] = {}
+        for index, rule in enumerate(self.rules):
+            self._groups.setdefault((rule["metric"], rule["aggregate"], rule["window"]), []).append(index)
+        self._sign = np.array([OPERATORS[rule["op"]][0] for rule in self.rules], dtype=np.float64)
+        self._strict = np.array([OPERATORS[rule["op"]][1] for rule in self.rules])
+        self._threshold = np.array([rule["threshold"] for rule in self.rules], dtype=np.float64)
+        self._min_days = np.array([rule["min_days"] for rule in self.rules])
+        self._daily = np.array([rule["aggregate"] != "mean" for rule in self.rules], dtype=bool)
+        self._mean_metrics = {
+            "energy_kwh" if rule["metric"] == "kwh_share" else rule["metric"]
+            for rule in self.rules if rule["aggregate"] == "mean"
+        }
+        self._tail_days = max([rule["window"] - 1 for rule in self.rules if rule["aggregate"] == "rolling"], default=0)
+
+    def _compare(self, values: np.ndarray, indices: List[int]) -> np.ndarray:
+        sign = self._sign[indices]
+        signed, limit = values * sign, self._threshold[indices] * sign
+        return np.where(self._strict[indices], signed > limit, signed >= limit)
+
+    def _empty(self, households: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        shape = (households, len(self.rules))
+        # Day and rolling values start at the least severe extreme so a max() merges them
+        return np.zeros(shape, dtype=bool), np.tile(-np.inf * self._sign, (households, 1)), np.zeros(shape, dtype=np.int64)
+
+    def _groups_for(self, aggregates: Tuple[str, ...], columns: Dict[str, int]) -> Iterator[Tuple[str, int, List[int], List[int], str]]:
+        for (metric, aggregate, window), group in self._groups.items():
+            indices = [index for index in group if self.rules[index]["appliance"] in columns]
+            if aggregate in aggregates and indices:
+                yield metric, window, indices, [columns[self.rules[index]["appliance"]] for index in indices], aggregate
+
+    def _evaluate_means(self, sums: Dict[str, np.ndarray], days: int, columns: Dict[str, int],
+                        fired: np.ndarray, value: np.ndarray, matched_days: np.ndarray):
+        """Evaluate "mean" rules from households x appliances sums over a period of `days`"""
+        for metric, _, indices, selected, _ in self._groups_for(("mean",), columns):
+            # Totals are rounded well below display precision first, so running
+            # totals and a full recompute agree despite different summation order
+            period = _with_total(np.round(sums["energy_kwh" if metric == "kwh_share" else metric], 6))
+            period = _share(period) if metric == "kwh_share" else period / days
+            result = np.round(period[:, selected], 2)
+            matched = self._compare(result, indices)
+            fired[:, indices] = matched
+            value[:, indices] = result
+            matched_days[:, indices] = np.where(matched, days, 0)
+
+    def _evaluate_daily(self, metrics: Dict[str, np.ndarray], columns: Dict[str, int], counted_days: int,
+                        fired: np.ndarray, value: np.ndarray, matched_days: np.ndarray):
+        """Evaluate "day" and "rolling" rules, skipping days and windows within the first `counted_days`"""
+        days = metrics["hours"].shape[1]
+        for metric, window, indices, selected, aggregate in self._groups_for(("day", "rolling"), columns):
+            # First day, or first window, not already counted
+            first = max(counted_days - window + 1, 0) if aggregate == "rolling" else counted_days
+            if days - window + 1 <= first:
+                continue
+            daily = metrics["energy_kwh" if metric == "kwh_share" else metric]
+            if metric == "kwh_share" or columns[TOTAL] in selected:
+                daily = _with_total(daily)
+            if metric == "kwh_share":
+                daily = _share(daily)
+            daily = daily[:, :, selected]
+            if aggregate == "rolling":
+                cumulative = np.cumsum(daily, axis=1)
+                cumulative = np.concatenate([np.zeros_like(cumulative[:, :1]), cumulative], axis=1)
+                daily = (cumulative[:, window:] - cumulative[:, :-window]) / window
+            daily = np.round(daily[:, first:], 2)
+
+            matched = self._compare(daily, indices)
+            count = matched.sum(axis=1)
+            sign = self._sign[indices]
+            fired[:, indices] = count >= self._min_days[indices]
+            value[:, indices] = (daily * sign).max(axis=1) * sign
+            matched_days[:, indices] = count
+
+    def evaluate(self, hours: np.ndarray, energy_kwh: np.ndarray, cost_rupees: np.ndarray,
+                 appliances: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Evaluate every rule over households x days x appliances arrays
+
+        Returns (fired, value, days) arrays of shape households x rules.
+        Rules for appliances missing from `appliances` never fire.
+        """
+        households, days = hours.shape[:2]
+        columns = {appliance: column for column, appliance in enumerate(appliances)}
+        columns[TOTAL] = len(appliances)
+        fired, value, matched_days = self._empty(households)
+        if not days:
+            return fired, value, matched_days
+
+        metrics = {"hours": hours, "energy_kwh": energy_kwh, "cost_rupees": cost_rupees}
+        sums = {metric: _day_sums(metrics[metric]) for metric in self._mean_metrics}
+        self._evaluate_means(sums, days, columns, fired, value, matched_days)
+        self._evaluate_daily(metrics, columns, 0, fired, value, matched_days)
+        return fired, value, matched_days
+
+    def accumulate(self, state: Optional[Dict[str, Any]], appliances: List[str], hours: np.ndarray,
+                   energy_kwh: np.ndarray, cost_rupees: np.ndarray) -> Dict[str, Any]:
+        """Fold newly appended days into a rule state for incremental detection
+
+        The matrices hold only the new days, as days x appliances aligned to
+        `appliances`; appliances may be added at the end between calls. The
+        returned state is JSON serializable and carries each "day" and
+        "rolling" rule's match count and worst value, plus the last days that
+        rolling windows spanning the next append will need. A state built
+        for a different rule set starts over.
+        """
+        ids = [rule["id"] for rule in self.rules]
+        if state is None or state["rules"] != ids:
+            state = {"rules": ids, "counts": [0] * len(ids), "values": [None] * len(ids),
+                     "tail": {"hours": [], "energy_kwh": [], "cost_rupees": []}}
+        tail_days = len(state["tail"]["hours"])
+
+        metrics = {}
+        for name, new in (("hours", hours), ("energy_kwh", energy_kwh), ("cost_rupees", cost_rupees)):
+            tail = np.zeros((tail_days, len(appliances)))
+            for row, values in enumerate(state["tail"][name]):
+                tail[row, :len(values)] = values
+            metrics[name] = np.vstack([tail, np.asarray(new, dtype=np.float64)])
+
+        columns = {appliance: column for column, appliance in enumerate(appliances)}
+        columns[TOTAL] = len(appliances)
+        fired, value, matched_days = self._empty(1)
+        self._evaluate_daily({name: matrix[None] for name, matrix in metrics.items()}, columns, tail_days,
+                             fired, value, matched_days)
+
+        previous = np.array([-np.inf * sign if stored is None else stored
+                             for stored, sign in zip(state["values"], self._sign)])
+        worst = np.maximum(previous * self._sign, value[0] * self._sign) * self._sign
+        keep = self._tail_days
+        return {
+            "rules": ids,
+            "counts": (np.array(state["counts"]) + matched_days[0]).tolist(),
+            "values": [None if np.isinf(stored) else stored for stored in worst.tolist()],
+            "tail": {name: matrix[max(len(matrix) - keep, 0):].tolist() if keep else [] for name, matrix in metrics.items()}
+        }
+
+    def detect_accumulated(self, state: Dict[str, Any], appliances: List[str], hours_totals: np.ndarray,
+                           energy_totals: np.ndarray, cost_totals: np.ndarray, days: int) -> Tuple[List[str], List[str]]:
+        """detect() from per-appliance totals over `days` and a state built by accumulate()"""
+        columns = {appliance: column for column, appliance in enumerate(appliances)}
+        columns[TOTAL] = len(appliances)
+        fired, value, matched_days = self._empty(1)
+        sums = {"hours": hours_totals, "energy_kwh": energy_totals, "cost_rupees": cost_totals}
+        self._evaluate_means({name: np.asarray(totals, dtype=np.float64)[None] for name, totals in sums.items()},
+                             days, columns, fired, value, matched_days)
+
+        daily = self._daily
+        counts = np.array(state["counts"])
+        fired[0, daily] = counts[daily] >= self._min_days[daily]
+        value[0, daily] = np.array([np.nan if stored is None else stored for stored in state["values"]])[daily]
+        matched_days[0, daily] = counts[daily]
+        return self._findings(fired[0], value[0], matched_days[0], appliances)
+
+    def _findings(self, fired: np.ndarray, value: np.ndarray, matched_days: np.ndarray,
+                  appliances: List[str]) -> Tuple[List[str], List[str]]:
+        # Report in the household's appliance order, then rule order, with household totals last
+        order = {appliance: position for position, appliance in enumerate(appliances)}
+        indices = sorted(np.flatnonzero(fired).tolist(),
+                         key=lambda index: (order.get(self.rules[index]["appliance"], len(order)), index))
+        issues, rule_ids = [], []
+        for index in indices:
+            rule = self.rules[index]
+            issues.append(rule["message"].format(
+                value=float(value[index]), days=int(matched_days[index]),
+                appliance=rule["appliance"], threshold=rule["threshold"]
+            ))
+            rule_ids.append(rule["id"])
+        return issues, rule_ids
+
+    def detect(self, energy_data: EnergyData) -> Tuple[List[str], List[str]]:
+        """Return the issue messages and ids of the rules one household triggers"""
+        fired, value, matched_days = self.evaluate(
+            energy_data.hours[None], energy_data.energy_kwh[None], energy_data.cost_rupees[None],
+            energy_data.appliances
+        )
+        return self._findings(fired[0], value[0], matched_days[0], energy_data.appliances)
+
+    def detect_many(self, energy_datas: List[EnergyData]) -> List[Tuple[List[str], List[str]]]:
+        """detect() for many households, evaluating households of the same shape together"""
+        groups: Dict[Tuple[int, Tuple[str, ...], bool], List[int]] = {}
+        for row, energy_data in enumerate(energy_datas):
+            matrices = (energy_data.hours, energy_data.energy_kwh, energy_data.cost_rupees)
+            broadcast = energy_data.days > 0 and all(matrix.strides[0] == 0 for matrix in matrices)
+            groups.setdefault((energy_data.days, tuple(energy_data.appliances), broadcast), []).append(row)
+
+        findings = [None] * len(energy_datas)
+        for (days, appliances, broadcast), rows in groups.items():
+            def stack(name):
+                if broadcast:
+                    # Keep single-profile households as a zero-stride view
+                    profiles = np.stack([getattr(energy_datas[row], name)[0] for row in rows])
+                    return np.broadcast_to(profiles[:, None, :], (len(rows), days, len(appliances)))
+                return np.stack([getattr(energy_datas[row], name) for row in rows])
+            fired, value, matched_days = self.evaluate(
+                stack("hours"), stack("energy_kwh"), stack("cost_rupees"), list(appliances)
+            )
+            for position, row in enumerate(rows):
+                findings[row] = self._findings(fired[position], value[position], matched_days[position], appliances)
+        return findings
+
+def load_wastage_rules(path: str) -> WastageRules:
+    """Load rules from a JSON or YAML file holding a list of rules or {"rules": [...]}"""
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to load YAML wastage rules (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return WastageRules(data["rules"] if isinstance(data, dict) else data)
+
+_wastage_rules = None
+_wastage_rules_lock = threading.Lock()
+
+def get_wastage_rules() -> WastageRules:
+    """Return the configured rules, loading them on first use"""
+    global _wastage_rules
+    if _wastage_rules is None:
+        with _wastage_rules_lock:
+            if _wastage_rules is None:
+                _wastage_rules = load_wastage_rules(WASTAGE_RULES_PATH) if WASTAGE_RULES_PATH else WastageRules(DEFAULT_WASTAGE_RULES)
+    return _wastage_rules
+
+def set_wastage_rules(rules: Optional[WastageRules]):
+    """Replace the shared rules; None reloads the configured rules on next use"""
+    global _wastage_rules
+    with _wastage_rules_lock:
+        _wastage_rules = rules